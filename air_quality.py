@@ -0,0 +1,420 @@
+"""
+Актуальные данные о качестве воздуха и погоде из OpenWeather.
+
+Значения PM2.5, температуры и влажности хранятся в кеше с ограниченным
+временем жизни (AIR_QUALITY_TTL). Фоновый поток обновляет их до истечения
+срока, поэтому обработчики бота берут данные только из кеша и никогда
+не ждут ответа OpenWeather. Одновременные запросы одного города
+объединяются в одно обращение к API.
+
+Все запросы идут через одну requests.Session с пулом keep-alive соединений,
+а число одновременных запросов ограничено AIR_QUALITY_CONCURRENCY. Ошибки
+сети, 5xx и 429 повторяются с экспоненциальной задержкой со случайным
+разбросом; заголовок Retry-After приостанавливает все запросы к API.
+
+Адрес API задается переменной OPENWEATHER_BASE_URL, что позволяет
+проверять модуль на локальной заглушке (см. benchmarks/mock_openweather.py).
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# Адрес API OpenWeather
+OPENWEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org")
+
+# Время жизни данных в кеше и запас, с которым они обновляются заранее (в секундах)
+CACHE_TTL = int(os.getenv("AIR_QUALITY_TTL", "900"))
+REFRESH_MARGIN = int(os.getenv("AIR_QUALITY_REFRESH_MARGIN", "120"))
+
+# Таймаут одного HTTP-запроса и пауза перед повтором после ошибки (в секундах)
+REQUEST_TIMEOUT = 5
+RETRY_DELAY = 30
+
+# Одновременные запросы к API и ограничение частоты (запросов в секунду, 0 — без ограничения).
+# По умолчанию 1 запрос/с — лимит бесплатного тарифа OpenWeather (60 запросов в минуту)
+MAX_CONCURRENCY = int(os.getenv("AIR_QUALITY_CONCURRENCY", "8"))
+RATE_LIMIT = float(os.getenv("AIR_QUALITY_RATE_LIMIT", "1"))
+
+# Повторы запроса: количество и базовая/максимальная задержка (в секундах)
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+# Ответы, после которых запрос повторяется
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Пороги PM2.5 (мкг/м³) для текстовой оценки качества воздуха
+PM25_GOOD = 25
+PM25_MODERATE = 50
+
+def air_quality_label(pm25):
+    """
+    Текстовая оценка качества воздуха по PM2.5.
+
+    Args:
+        pm25 (float): Концентрация PM2.5, мкг/м³
+
+    Returns:
+        str: "Хороший", "Средний" или "Плохой"
+    """
+    if pm25 <= PM25_GOOD:
+        return "Хороший"
+    elif pm25 <= PM25_MODERATE:
+        return "Средний"
+    else:
+        return "Плохой"
+
+class AirQualityProvider:
+    """
+    Кеш данных OpenWeather по городам с фоновым обновлением.
+
+    Args:
+        api_key (str): Ключ API OpenWeather
+        base_url (str): Адрес API
+        ttl (float): Время жизни данных в кеше, с
+        refresh_margin (float): За сколько секунд до истечения обновлять данные
+        timeout (float): Таймаут HTTP-запроса, с
+        concurrency (int): Максимум одновременных запросов к API
+        rate_limit (float): Максимум запросов в секунду (0 — без ограничения)
+        max_retries (int): Количество повторов запроса после ошибки
+    """
+
+    def __init__(self, api_key, base_url=OPENWEATHER_BASE_URL, ttl=CACHE_TTL,
+                 refresh_margin=REFRESH_MARGIN, timeout=REQUEST_TIMEOUT,
+                 concurrency=MAX_CONCURRENCY, rate_limit=RATE_LIMIT, max_retries=MAX_RETRIES):
+        # requests загружается только при включенных живых данных
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl / 2)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._request_errors = (requests.ConnectionError, requests.Timeout)
+
+        # Одна сессия на все запросы: соединения с API переиспользуются
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Ограничение частоты: время, раньше которого нельзя начать следующий запрос
+        self._interval = 1.0 / rate_limit if rate_limit else 0.0
+        self._next_request_at = 0.0
+        self._rate_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0}
+
+        self._cache = {}     # город -> (срок годности, значения)
+        self._inflight = {}  # город -> Future текущего запроса
+        self._cities = {}    # город -> (lat, lon) для фонового обновления
+        self._retry_at = {}  # город -> время, до которого не повторять после ошибки
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="air-quality")
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._scheduler = None
+        self._listeners = []
+
+    def _throttle(self):
+        """Ожидание очереди на запрос с учетом ограничения частоты и Retry-After"""
+        with self._rate_lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_request_at)
+            self._next_request_at = start_at + self._interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
+    def _pause(self, seconds):
+        """Приостановка всех запросов к API (после ответа 429)"""
+        with self._rate_lock:
+            self._next_request_at = max(self._next_request_at, time.monotonic() + seconds)
+
+    def _count(self, key):
+        """Увеличение счетчика статистики запросов"""
+        with self._rate_lock:
+            self.stats[key] += 1
+
+    def _backoff(self, attempt):
+        """Задержка перед повтором: экспонента со случайным разбросом"""
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def _get_json(self, path, lat, lon, **params):
+        """GET-запрос к API с координатами и ключом (с повторами)"""
+        params = dict(params, lat=lat, lon=lon, appid=self.api_key)
+        for attempt in range(self.max_retries + 1):
+            self._throttle()
+            self._count("requests")
+            try:
+                response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+            except self._request_errors:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                self._count("retries")
+                continue
+
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                response.raise_for_status()
+                return response.json()
+
+            delay = self._backoff(attempt)
+            if response.status_code == 429:
+                self._count("rate_limited")
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = int(retry_after) + random.uniform(0, BACKOFF_BASE)
+                self._pause(delay)
+            response.close()
+            time.sleep(delay)
+            self._count("retries")
+
+    def _request(self, lat, lon):
+        """Загрузка текущих значений для точки из OpenWeather"""
+        pollution = self._get_json("/data/2.5/air_pollution", lat, lon)
+        weather = self._get_json("/data/2.5/weather", lat, lon, units="metric")
+        pm25 = pollution["list"][0]["components"]["pm2_5"]
+        return {
+            "pm25": round(pm25),
+            "air_quality": air_quality_label(pm25),
+            "temperature": round(weather["main"]["temp"]),
+            "humidity": weather["main"]["humidity"],
+            "updated_at": time.time(),
+        }
+
+    def fetch(self, city, lat, lon):
+        """
+        Загрузка данных города с сохранением в кеш.
+
+        Если данные этого города уже запрашиваются, вызов дожидается
+        результата текущего запроса вместо отправки нового.
+
+        Returns:
+            dict: Значения pm25, air_quality, temperature, humidity, updated_at
+        """
+        with self._lock:
+            future = self._inflight.get(city)
+            owner = future is None
+            if owner:
+                future = self._inflight[city] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            values = self._request(lat, lon)
+        except Exception as e:
+            with self._lock:
+                self._retry_at[city] = time.monotonic() + RETRY_DELAY
+                del self._inflight[city]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            previous = self._cache.get(city)
+            self._cache[city] = (time.monotonic() + self.ttl, values)
+            self._retry_at.pop(city, None)
+            del self._inflight[city]
+        future.set_result(values)
+        for listener in self._listeners:
+            try:
+                listener(city, values, previous[1] if previous else None)
+            except Exception:
+                logger.exception("Ошибка обработки обновления данных OpenWeather для %s", city)
+        # Планировщик пересчитывает время следующего обновления
+        self._wakeup.set()
+        return values
+
+    def _fetch_in_background(self, city):
+        """Асинхронное обновление города (если оно еще не выполняется)"""
+        with self._lock:
+            if city in self._inflight or self._stopped:
+                return
+            if self._retry_at.get(city, 0) > time.monotonic():
+                return
+            lat, lon = self._cities[city]
+        self._executor.submit(self._fetch_logged, city, lat, lon)
+
+    def _fetch_logged(self, city, lat, lon):
+        """Обновление города с записью ошибки в лог"""
+        try:
+            self.fetch(city, lat, lon)
+        except Exception as e:
+            logger.warning("Не удалось обновить данные OpenWeather для %s: %s", city, e)
+
+    def get(self, city, base):
+        """
+        Данные города из кеша; не ждет обращения к API.
+
+        Если данных в кеше нет или срок их жизни истек, в пуле потоков
+        запускается загрузка этого города, а пока возвращаются исходные
+        данные. Планировщик здесь не запускается (только в watch): в вебхуке
+        процесс замораживается между вызовами. Если же планировщик запущен,
+        город обновляется вместе с остальными.
+
+        Args:
+            city (str): Название города
+            base (dict): Исходные данные города (как в config.ECO_DATA)
+
+        Returns:
+            dict: Исходные данные, дополненные актуальными значениями
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._cities.setdefault(city, (base["lat"], base["lon"]))
+            entry = self._cache.get(city)
+
+        if entry is None or entry[0] - self.refresh_margin <= now:
+            self._fetch_in_background(city)
+        if entry is None or entry[0] <= now:
+            return base
+        return dict(base, **entry[1])
+
+    def add_listener(self, callback):
+        """
+        Подписка на обновления данных городов.
+
+        Args:
+            callback: Функция callback(city, values, previous), вызывается
+                в потоке загрузки после каждого обновления; previous —
+                прежние значения города или None
+        """
+        self._listeners.append(callback)
+
+    def watch(self, cities):
+        """
+        Добавление городов для фонового обновления.
+
+        Args:
+            cities (dict): Город -> данные с полями lat и lon
+        """
+        with self._lock:
+            for city, data in cities.items():
+                self._cities.setdefault(city, (data["lat"], data["lon"]))
+        self._ensure_scheduler()
+        self._wakeup.set()
+
+    def _due(self, now):
+        """Города, которые пора обновить, и время до следующего обновления"""
+        due = []
+        next_due = self.ttl
+        with self._lock:
+            for city in self._cities:
+                entry = self._cache.get(city)
+                refresh_at = entry[0] - self.refresh_margin if entry else now
+                if refresh_at <= now:
+                    due.append(city)
+                else:
+                    next_due = min(next_due, refresh_at - now)
+        return due, next_due
+
+    def refresh_due(self):
+        """
+        Обновление городов, данные которых скоро устареют.
+
+        Returns:
+            float: Через сколько секунд понадобится следующее обновление
+        """
+        due, next_due = self._due(time.monotonic())
+        for city in due:
+            self._fetch_in_background(city)
+        # Города с ошибкой загрузки повторяются через RETRY_DELAY
+        return min(next_due, RETRY_DELAY) if due else next_due
+
+    def refresh_all(self, cities=None, budget=None):
+        """
+        Загрузка данных многих городов сразу.
+
+        Запросы выполняются параллельно (не больше concurrency одновременно).
+
+        Args:
+            cities (dict): Город -> данные с полями lat и lon
+                (по умолчанию все отслеживаемые города)
+            budget (float): Сколько секунд ждать завершения (None — без ограничения)
+
+        Returns:
+            dict: Количество городов: updated, failed, pending (не успели за budget)
+        """
+        with self._lock:
+            for city, data in (cities or {}).items():
+                self._cities.setdefault(city, (data["lat"], data["lon"]))
+            targets = {city: self._cities[city] for city in cities} if cities else dict(self._cities)
+        futures = [self._executor.submit(self.fetch, city, lat, lon) for city, (lat, lon) in targets.items()]
+        done, pending = wait(futures, timeout=budget)
+        failed = sum(1 for future in done if future.exception() is not None)
+        return {"updated": len(done) - failed, "failed": failed, "pending": len(pending)}
+
+    def _run_scheduler(self):
+        """Цикл фонового обновления"""
+        while not self._stopped:
+            delay = self.refresh_due()
+            self._wakeup.wait(max(delay, 1.0))
+            self._wakeup.clear()
+
+    def _ensure_scheduler(self):
+        """Запуск фонового потока при первом обращении"""
+        if self._scheduler is None:
+            with self._lock:
+                if self._scheduler is None and not self._stopped:
+                    self._scheduler = threading.Thread(target=self._run_scheduler,
+                                                       name="air-quality-scheduler", daemon=True)
+                    self._scheduler.start()
+
+    def stop(self):
+        """Остановка фонового обновления"""
+        self._stopped = True
+        self._wakeup.set()
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def get_api_key():
+    """Ключ API OpenWeather или None, если он не задан"""
+    api_key = os.getenv("OPENWEATHER_API_KEY")
+    if not api_key:
+        try:
+            import config
+            api_key = config.OPENWEATHER_API_KEY
+        except ImportError:
+            return None
+    # Заглушки из .env.example и config.py не являются ключами
+    if not api_key or api_key.startswith("YOUR_"):
+        return None
+    return api_key
+
+def get_provider():
+    """Общий экземпляр AirQualityProvider или None, если ключ API не задан"""
+    global _provider
+    if _provider is None:
+        api_key = get_api_key()
+        if api_key is None:
+            return None
+        with _provider_lock:
+            if _provider is None:
+                _provider = AirQualityProvider(api_key)
+    return _provider
+
+def current(city, base):
+    """
+    Экологические данные города с актуальными значениями из OpenWeather.
+    Без ключа API возвращает исходные данные без изменений.
+
+    Args:
+        city (str): Название города
+        base (dict): Исходные данные города (как в config.ECO_DATA)
+
+    Returns:
+        dict: Данные города
+    """
+    provider = get_provider()
+    if provider is None:
+        return base
+    return provider.get(city, base)
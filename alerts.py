@@ -0,0 +1,131 @@
+"""
+Оповещения о превышении порога PM2.5 (/subscribe <город> <порог>).
+
+Пороги хранятся в базе с индексом по городу и порогу. При каждом
+обновлении данных OpenWeather (AirQualityProvider.add_listener) из индекса
+выбираются только пороги, которые PM2.5 пересек снизу вверх, то есть
+лежащие в интервале [прежнее значение, новое значение). Стоимость
+обновления зависит от числа сработавших оповещений, а не от числа
+подписчиков. Пока значение остается выше порога, повторных оповещений нет.
+
+Колебания около порога не превращаются в поток сообщений: пользователь
+получает не больше одного оповещения за ALERT_COOLDOWN секунд. Сработавшие
+оповещения города ставятся в очередь рассылки (notifications.py) одним
+заданием со списком адресатов.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import db_async
+
+logger = logging.getLogger(__name__)
+
+# Минимальный интервал между оповещениями одному пользователю, с
+ALERT_COOLDOWN = int(os.getenv("AIR_ALERT_COOLDOWN", "3600"))
+
+# Допустимый порог PM2.5, мкг/м³
+MAX_THRESHOLD = 1000
+
+# Сколько записей о последних оповещениях хранить без очистки устаревших
+PRUNE_THRESHOLD = 10000
+
+class AlertEvaluator:
+    """
+    Проверка порогов оповещений при обновлении данных о качестве воздуха.
+
+    Args:
+        backend: Модуль бэкенда базы данных (по умолчанию выбранный в db_async)
+        cooldown (float): Минимальный интервал между оповещениями пользователю, с
+    """
+
+    def __init__(self, backend=None, cooldown=ALERT_COOLDOWN):
+        self.backend = backend
+        self.cooldown = cooldown
+        self._last_sent = {}  # user_id -> time.monotonic() последнего оповещения
+        self._prune_at = PRUNE_THRESHOLD
+        self._lock = threading.Lock()
+        self.stats = {"updates": 0, "matched": 0, "fired": 0, "suppressed": 0}
+
+    def _backend(self):
+        return self.backend or db_async.get_backend()
+
+    def _take_allowed(self, user_ids, now):
+        """Пользователи, которым можно отправить оповещение (с отметкой времени)"""
+        with self._lock:
+            allowed = [user_id for user_id in user_ids
+                       if now - self._last_sent.get(user_id, -self.cooldown) >= self.cooldown]
+            for user_id in allowed:
+                self._last_sent[user_id] = now
+            if len(self._last_sent) > self._prune_at:
+                self._last_sent = {user_id: sent_at for user_id, sent_at in self._last_sent.items()
+                                   if now - sent_at < self.cooldown}
+                self._prune_at = max(PRUNE_THRESHOLD, 2 * len(self._last_sent))
+            self.stats["matched"] += len(user_ids)
+            self.stats["suppressed"] += len(user_ids) - len(allowed)
+        return allowed
+
+    def _release(self, user_ids, now):
+        """Отмена отметок времени, если оповещение не удалось поставить в очередь"""
+        with self._lock:
+            for user_id in user_ids:
+                if self._last_sent.get(user_id) == now:
+                    del self._last_sent[user_id]
+
+    def evaluate(self, city, values, previous):
+        """
+        Проверка порогов города после обновления данных.
+
+        Args:
+            city (str): Город
+            values (dict): Новые значения (pm25, air_quality, ...)
+            previous (dict): Прежние значения или None
+
+        Returns:
+            list: user_id, которым поставлено в очередь оповещение
+        """
+        self.stats["updates"] += 1
+        # Первое значение после запуска: пересечение порога не наблюдалось
+        if previous is None or values.get("pm25") is None or previous.get("pm25") is None:
+            return []
+        low, high = previous["pm25"], values["pm25"]
+        if high <= low:
+            return []
+
+        now = time.monotonic()
+        recipients = self._take_allowed(self._backend().get_alert_subscribers(city, low, high), now)
+        if not recipients:
+            return []
+        recipients.sort()
+        try:
+            self._backend().add_alert_notification(city, {
+                "city": city,
+                "pm25": high,
+                "previous": low,
+                "air_quality": values.get("air_quality"),
+                "recipients": recipients,
+            })
+        except Exception:
+            self._release(recipients, now)
+            raise
+        with self._lock:
+            self.stats["fired"] += len(recipients)
+        logger.info("PM2.5 в %s: %s -> %s, оповещений: %s", city, low, high, len(recipients))
+        return recipients
+
+def attach(provider, backend=None):
+    """
+    Проверка порогов при каждом обновлении данных провайдера.
+
+    Args:
+        provider (air_quality.AirQualityProvider): Провайдер данных OpenWeather
+        backend: Модуль бэкенда базы данных (по умолчанию выбранный в db_async)
+
+    Returns:
+        AlertEvaluator: Обработчик обновлений
+    """
+    evaluator = AlertEvaluator(backend)
+    provider.add_listener(evaluator.evaluate)
+    return evaluator
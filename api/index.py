@@ -1,5 +1,91 @@
+"""
+Точка входа вебхука EcoMap KZ для Vercel.
+
+Telegram отправляет обновления POST-запросами. Обновление декодируется
+и передается тем же обработчикам, что и при запуске через long polling
+(см. bot.build_application). Приложение бота, цикл событий и клиент базы
+данных создаются один раз на процесс и переиспользуются между «теплыми»
+вызовами функции.
+
+Ответ Telegram отправляется сразу, а обработка обновления продолжается
+в фоновом цикле событий. Платформы, которые замораживают процесс после
+ответа (например, Vercel), должны задать WEBHOOK_PROCESS_TIMEOUT — тогда
+ответ отправляется после завершения обработки или по истечении этого
+времени.
+"""
+
 from http.server import BaseHTTPRequestHandler
+import asyncio
+import concurrent.futures
 import json
+import logging
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+logger = logging.getLogger(__name__)
+
+# Секрет, который Telegram передает в заголовке (см. setWebhook secret_token)
+WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+
+# Сколько секунд ждать завершения обработки перед ответом (0 — не ждать)
+WEBHOOK_PROCESS_TIMEOUT = float(os.getenv("WEBHOOK_PROCESS_TIMEOUT", "0"))
+
+_application = None
+_loop = None
+_init_lock = threading.Lock()
+
+def get_application(**builder_options):
+    """
+    Приложение бота и фоновый цикл событий (создаются при первом вызове).
+
+    Args:
+        **builder_options: Дополнительные параметры ApplicationBuilder
+            (используются только при первом вызове)
+
+    Returns:
+        tuple: (application, loop)
+    """
+    global _application, _loop
+    if _application is None:
+        with _init_lock:
+            if _application is None:
+                import bot
+                import persistence
+
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="webhook-loop", daemon=True).start()
+
+                # Обновления одного пользователя могут обрабатывать разные экземпляры функции;
+                # JobQueue в вебхуке не запускается (устаревшие черновики удаляет persistence)
+                if persistence.PERSISTENCE_ENABLED:
+                    builder_options.setdefault("persistence", persistence.DatabasePersistence(shared=True))
+                builder_options.setdefault("job_queue", None)
+                application = bot.build_application(updater=None, **builder_options)
+                asyncio.run_coroutine_threadsafe(application.initialize(), loop).result()
+                _loop = loop
+                _application = application
+    return _application, _loop
+
+async def _process_update(application, update):
+    """Обработка обновления и запись измененного состояния разговоров"""
+    import persistence
+
+    # Предыдущее сообщение пользователя мог обработать другой экземпляр
+    if isinstance(application.persistence, persistence.DatabasePersistence):
+        await application.persistence.refresh(application, update)
+    await application.process_update(update)
+    # Фоновая запись состояния (Application.start) в вебхуке не запускается,
+    # а процесс может быть заморожен после ответа: сохраняем сразу
+    if application.persistence:
+        await application.update_persistence()
+
+def _log_failure(future):
+    """Логирование ошибок фоновой обработки обновления"""
+    if not future.cancelled() and future.exception():
+        logger.error("Ошибка обработки обновления", exc_info=future.exception())
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
@@ -7,13 +93,45 @@ class handler(BaseHTTPRequestHandler):
         self.send_header('Content-type', 'application/json')
         self.end_headers()
         self.wfile.write(json.dumps({
-            "status": "active", 
+            "status": "active",
             "message": "EcoMap KZ Bot is running",
             "version": "1.0.2"
         }).encode('utf-8'))
-    
+
     def do_POST(self):
-        self.send_response(200)
+        if WEBHOOK_SECRET and self.headers.get('X-Telegram-Bot-Api-Secret-Token') != WEBHOOK_SECRET:
+            self._reply(403, {"status": "forbidden"})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            data = json.loads(self.rfile.read(length))
+        except ValueError:
+            self._reply(400, {"status": "bad request"})
+            return
+
+        from telegram import Update
+
+        application, loop = get_application()
+        update = Update.de_json(data, application.bot)
+        future = asyncio.run_coroutine_threadsafe(_process_update(application, update), loop)
+        future.add_done_callback(_log_failure)
+
+        if WEBHOOK_PROCESS_TIMEOUT > 0:
+            try:
+                future.result(timeout=WEBHOOK_PROCESS_TIMEOUT)
+            except concurrent.futures.TimeoutError:
+                logger.warning("Обработка обновления %s не уложилась в %s с", update.update_id, WEBHOOK_PROCESS_TIMEOUT)
+            except Exception:
+                pass  # Ошибка уже залогирована в _log_failure
+
+        self._reply(200, {"status": "success"})
+
+    def _reply(self, status, body):
+        self.send_response(status)
         self.send_header('Content-type', 'application/json')
         self.end_headers()
-        self.wfile.write(json.dumps({"status": "success"}).encode('utf-8')) 
\ No newline at end of file
+        self.wfile.write(json.dumps(body).encode('utf-8'))
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
@@ -0,0 +1,82 @@
+"""
+Бенчмарк кеша данных OpenWeather (air_quality.py) на локальной заглушке.
+
+Проверяет три свойства:
+- чтение данных города не ждет API: время get() при пустом и при полном кеше;
+- одновременные запросы одного города объединяются в одно обращение к API;
+- фоновое обновление заменяет данные до истечения их срока.
+
+Запуск:
+    python benchmarks/bench_air_quality.py [--latency 0.2] [--threads 50]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import config
+from air_quality import AirQualityProvider
+from mock_openweather import MockOpenWeather
+
+def percentile(values, p):
+    """Процентиль по списку значений"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def timed_get(provider, city):
+    start = time.perf_counter()
+    provider.get(city, config.ECO_DATA[city])
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк кеша OpenWeather")
+    parser.add_argument("--latency", type=float, default=0.2, help="задержка ответа заглушки, с")
+    parser.add_argument("--threads", type=int, default=50, help="одновременных запросов одного города")
+    args = parser.parse_args()
+
+    server = MockOpenWeather(latency=args.latency).start()
+    city = "Алматы"
+
+    # Чтение при пустом кеше: данные загружаются в фоне, запросы не ждут
+    provider = AirQualityProvider("test", base_url=server.url, ttl=3, refresh_margin=1)
+    with ThreadPoolExecutor(args.threads) as pool:
+        cold = list(pool.map(lambda _: timed_get(provider, city), range(args.threads)))
+    while "updated_at" not in provider.get(city, config.ECO_DATA[city]):
+        time.sleep(0.01)
+    pollution_calls = server.calls.get("/data/2.5/air_pollution", 0)
+    print(f"Пустой кеш, {args.threads} параллельных get(): p50 {percentile(cold, 0.5) * 1000:.3f} мс, "
+          f"p99 {percentile(cold, 0.99) * 1000:.3f} мс (задержка API {args.latency * 1000:.0f} мс)")
+    print(f"Обращений к API air_pollution: {pollution_calls}")
+
+    # Одновременные блокирующие загрузки одного города
+    data = config.ECO_DATA[city]
+    server.calls.clear()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(lambda _: provider.fetch(city, data["lat"], data["lon"]), range(args.threads)))
+    print(f"{args.threads} параллельных fetch(): обращений к API "
+          f"{server.calls.get('/data/2.5/air_pollution', 0)}")
+
+    # Чтение при заполненном кеше
+    warm = [timed_get(provider, city) for _ in range(10000)]
+    print(f"Заполненный кеш: p50 {percentile(warm, 0.5) * 1e6:.1f} мкс, p99 {percentile(warm, 0.99) * 1e6:.1f} мкс")
+
+    # Фоновое обновление: за 5 с при ttl 3 с данные не должны устареть
+    first = provider.get(city, data)["updated_at"]
+    stale = 0
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if "updated_at" not in provider.get(city, data):
+            stale += 1
+        time.sleep(0.05)
+    print(f"Фоновое обновление: последние данные получены через {provider.get(city, data)['updated_at'] - first:.1f} с, "
+          f"устаревших чтений: {stale}")
+
+    provider.stop()
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Бенчмарк обновления данных OpenWeather для многих городов.
+
+Сравнивает последовательные запросы requests.get (новое соединение
+на каждый запрос) с AirQualityProvider.refresh_all: общая сессия с пулом
+соединений, ограниченный параллелизм, повторы с задержкой и соблюдение
+лимита частоты заглушки. Выводит время обновления, число TCP-соединений,
+повторов и ответов 429, а также уложилось ли обновление в бюджет времени.
+
+Запуск:
+    python benchmarks/bench_air_quality_batch.py [--cities 120] [--latency 0.05]
+        [--concurrency 8,16] [--rate-limit 0] [--error-rate 0.02] [--budget 10]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import requests
+
+from air_quality import AirQualityProvider
+from mock_openweather import MockOpenWeather
+
+def synthetic_cities(count):
+    """Города со случайными координатами в пределах Казахстана"""
+    rng = random.Random(42)
+    return {f"Город {i}": {"lat": rng.uniform(41.0, 55.0), "lon": rng.uniform(47.0, 87.0)}
+            for i in range(count)}
+
+def sequential(server, cities):
+    """Прежний способ: requests.get для каждого запроса по очереди"""
+    for data in cities.values():
+        params = {"lat": data["lat"], "lon": data["lon"], "appid": "test"}
+        requests.get(f"{server.url}/data/2.5/air_pollution", params=params, timeout=5).json()
+        requests.get(f"{server.url}/data/2.5/weather", params=dict(params, units="metric"), timeout=5).json()
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пакетного обновления OpenWeather")
+    parser.add_argument("--cities", type=int, default=120)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа заглушки, с")
+    parser.add_argument("--concurrency", default="8,16")
+    parser.add_argument("--rate-limit", type=float, default=0, help="лимит заглушки, запросов/с")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="доля ответов 503")
+    parser.add_argument("--budget", type=float, default=10.0, help="бюджет времени обновления, с")
+    args = parser.parse_args()
+
+    cities = synthetic_cities(args.cities)
+    print(f"Городов: {args.cities}, запросов на город: 2, задержка API: {args.latency * 1000:.0f} мс, "
+          f"лимит: {args.rate_limit or 'нет'}, ошибок: {args.error_rate:.0%}")
+    print(f"{'способ':<22} {'время, с':>9} {'соединений':>11} {'повторов':>9} {'429':>5} "
+          f"{'готово':>7} {'ошибок':>7} {'в бюджете':>10}")
+
+    server = MockOpenWeather(latency=args.latency, rate_limit=args.rate_limit).start()
+    start = time.perf_counter()
+    try:
+        sequential(server, cities)
+        status = "да"
+    except requests.RequestException as e:
+        status = f"ошибка: {type(e).__name__}"
+    elapsed = time.perf_counter() - start
+    print(f"{'последовательно':<22} {elapsed:>9.2f} {server.connections:>11} {0:>9} {'-':>5} "
+          f"{'-':>7} {'-':>7} {status if elapsed <= args.budget else 'нет':>10}")
+    server.shutdown()
+
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        server = MockOpenWeather(latency=args.latency, rate_limit=args.rate_limit,
+                                 error_rate=args.error_rate).start()
+        # Без собственного ограничения частоты: лимит задает заглушка (--rate-limit)
+        provider = AirQualityProvider("test", base_url=server.url, concurrency=concurrency, rate_limit=0)
+        start = time.perf_counter()
+        result = provider.refresh_all(cities, budget=args.budget)
+        elapsed = time.perf_counter() - start
+        stats = provider.stats
+        print(f"{'пул, параллельно ' + str(concurrency):<22} {elapsed:>9.2f} {server.connections:>11} "
+              f"{stats['retries']:>9} {stats['rate_limited']:>5} {result['updated']:>7} {result['failed']:>7} "
+              f"{'да' if not result['pending'] else 'нет':>10}")
+        provider.stop()
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
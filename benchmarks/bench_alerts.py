@@ -0,0 +1,133 @@
+"""
+Бенчмарк проверки порогов оповещений о качестве воздуха (alerts.py).
+
+В базе --subscribers подписок на --cities городов со случайными порогами
+PM2.5. Для каждого города моделируется --updates обновлений данных
+OpenWeather (случайное блуждание PM2.5), и после каждого вызывается
+AlertEvaluator.evaluate. Сравниваются выборка по индексу порогов
+и полный перебор подписчиков города. Для каждого режима выводятся
+время обновления (среднее отдельно для обновлений без оповещений и
+с оповещениями) и время на одно сработавшее оповещение.
+
+Запуск:
+    python benchmarks/bench_alerts.py [--subscribers 1000000] [--cities 100] [--updates 50] [--backends sqlite,json]
+"""
+
+import argparse
+import copy
+import importlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import alerts
+
+BACKENDS = {"json": "database", "sqlite": "database_sqlite"}
+
+def seed(name, backend, tmp, args):
+    """Временная база с подписками; возвращает список городов"""
+    rng = random.Random(5)
+    cities = [f"Город {i}" for i in range(args.cities)]
+    subscriptions = {city: [] for city in cities}
+    for user_id in range(1, args.subscribers + 1):
+        # Пороги ближе к типичным значениям встречаются чаще
+        threshold = round(min(alerts.MAX_THRESHOLD, rng.lognormvariate(3.9, 0.5)))
+        subscriptions[rng.choice(cities)].append([threshold, user_id])
+    backend.close_db()
+    if name == "json":
+        backend.DATA_FILE = os.path.join(tmp, "reports.json")
+        backend.LOG_FILE = os.path.join(tmp, "reports.log")
+        data = copy.deepcopy(backend.default_data)
+        data["air_alerts"] = {city: sorted(pairs) for city, pairs in subscriptions.items()}
+        backend.save_data(data)
+    else:
+        backend.DB_FILE = os.path.join(tmp, "reports.db")
+        conn = backend.get_connection()
+        with conn:
+            conn.executemany("INSERT INTO air_alerts (user_id, city, threshold) VALUES (?, ?, ?)",
+                             ((user_id, city, threshold) for city, pairs in subscriptions.items()
+                              for threshold, user_id in pairs))
+    return cities
+
+class FullScan(alerts.AlertEvaluator):
+    """Проверка перебором всех подписчиков города (для сравнения)"""
+
+    def __init__(self, name, backend, **options):
+        super().__init__(backend, **options)
+        self.name = name
+
+    def _subscriptions(self, city):
+        if self.name == "json":
+            return self.backend.get_data()["air_alerts"].get(city, [])
+        return self.backend.get_connection().execute(
+            "SELECT threshold, user_id FROM air_alerts WHERE city = ?", (city,)).fetchall()
+
+    def evaluate(self, city, values, previous):
+        low, high = previous["pm25"], values["pm25"]
+        matched = [user_id for threshold, user_id in self._subscriptions(city) if low <= threshold < high]
+        recipients = self._take_allowed(matched, time.monotonic())
+        if recipients:
+            self.backend.add_alert_notification(city, {"city": city, "pm25": high, "previous": low,
+                                                       "recipients": sorted(recipients)})
+        return recipients
+
+def walk(cities, updates, seed_value=9):
+    """Последовательность обновлений: (город, прежнее PM2.5, новое PM2.5)"""
+    rng = random.Random(seed_value)
+    levels = {city: rng.randint(20, 60) for city in cities}
+    for _ in range(updates):
+        for city in cities:
+            previous = levels[city]
+            levels[city] = max(1, min(300, previous + round(rng.gauss(0, 6))))
+            yield city, previous, levels[city]
+
+def run_mode(name, backend, mode, cities, args):
+    """Метрики режима"""
+    options = {"cooldown": args.cooldown}
+    evaluator = alerts.AlertEvaluator(backend, **options) if mode == "индекс" else FullScan(name, backend, **options)
+    quiet, firing = [], []
+    fired = 0
+    for city, previous, current in walk(cities, args.updates):
+        start = time.perf_counter()
+        recipients = evaluator.evaluate(city, {"pm25": current}, {"pm25": previous})
+        elapsed = time.perf_counter() - start
+        (firing if recipients else quiet).append(elapsed)
+        fired += len(recipients)
+    total = sum(quiet) + sum(firing)
+    return {
+        "updates": len(quiet) + len(firing),
+        "fired": fired,
+        "quiet": sum(quiet) / len(quiet) if quiet else 0.0,
+        "firing": sum(firing) / len(firing) if firing else 0.0,
+        "per_alert": total / fired if fired else 0.0,
+        "total": total,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк проверки порогов оповещений")
+    parser.add_argument("--subscribers", type=int, default=1000000)
+    parser.add_argument("--cities", type=int, default=100)
+    parser.add_argument("--updates", type=int, default=50, help="обновлений данных на город")
+    parser.add_argument("--cooldown", type=float, default=0, help="интервал между оповещениями пользователю, с")
+    parser.add_argument("--backends", default="sqlite,json")
+    args = parser.parse_args()
+
+    print(f"Подписок: {args.subscribers}, городов: {args.cities}, обновлений на город: {args.updates}")
+    print(f"{'бэкенд':<8} {'режим':<8} {'обновлений':>10} {'оповещений':>10} {'без опов., мс':>13} "
+          f"{'с опов., мс':>11} {'на опов., мкс':>13} {'всего, с':>9}")
+    for name in args.backends.split(","):
+        backend = importlib.import_module(BACKENDS[name])
+        for mode in ("индекс", "перебор"):
+            with tempfile.TemporaryDirectory() as tmp:
+                cities = seed(name, backend, tmp, args)
+                r = run_mode(name, backend, mode, cities, args)
+                backend.close_db()
+            print(f"{name:<8} {mode:<8} {r['updates']:>10} {r['fired']:>10} {r['quiet'] * 1000:>13.3f} "
+                  f"{r['firing'] * 1000:>11.3f} {r['per_alert'] * 1e6:>13.1f} {r['total']:>9.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Бенчмарк справочника городов (cities.py).
+
+Измеряет загрузку справочника, выдачу готовой клавиатуры в сравнении
+с построением клавиатуры на каждый запрос (как раньше в eco_info)
+и поиск по названиям: по началу, по псевдонимам и с опечатками.
+
+Запуск:
+    python benchmarks/bench_cities.py [--repeat 20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import cities
+
+QUERIES = {
+    "префикс": ["ал", "кара", "пет", "усть", "т", "шым"],
+    "псевдоним": ["астана", "семипалатинск", "оскемен", "капшагай", "гурьев", "джамбул"],
+    "опечатка": ["шымкнет", "караганды", "экибастус", "кокшетав", "павладар", "таразз"],
+}
+
+def percentile(values, p):
+    """Процентиль по списку значений"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def measure(func, repeat):
+    """p50 и p99 времени вызова в микросекундах"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return percentile(timings, 0.5) * 1e6, percentile(timings, 0.99) * 1e6
+
+def rebuild_keyboard(registry):
+    """Прежний способ: кнопка на каждый город при каждом вызове"""
+    return InlineKeyboardMarkup([[InlineKeyboardButton(name, callback_data=f"city_{name}")]
+                                 for name in registry.names])
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк справочника городов")
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    registry = cities.get_registry()
+    print(f"Загрузка справочника ({len(registry)} городов, {registry.page_count} страниц): "
+          f"{(time.perf_counter() - start) * 1000:.1f} мс")
+
+    print(f"{'операция':<34} {'p50, мкс':>9} {'p99, мкс':>9}")
+    p50, p99 = measure(lambda: rebuild_keyboard(registry), args.repeat // 10)
+    print(f"{'клавиатура: построение':<34} {p50:>9.1f} {p99:>9.1f}")
+    p50, p99 = measure(lambda: registry.keyboard(3), args.repeat)
+    print(f"{'клавиатура: готовая страница':<34} {p50:>9.2f} {p99:>9.2f}")
+
+    for kind, queries in QUERIES.items():
+        timings = [measure(lambda q=q: registry.search(q), args.repeat // len(queries)) for q in queries]
+        p50 = max(t[0] for t in timings)
+        p99 = max(t[1] for t in timings)
+        print(f"{'поиск: ' + kind:<34} {p50:>9.1f} {p99:>9.1f}")
+        for q in queries:
+            print(f"    {q!r} -> {registry.search(q, limit=3)}")
+
+if __name__ == '__main__':
+    main()
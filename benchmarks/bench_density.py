@@ -0,0 +1,101 @@
+"""
+Бенчмарк сетки плотности отчетов и карт плотности (map_utils.py).
+
+Сравнивает раскладку отчетов по сетке в цикле Python и векторно
+(NumPy bincount), а также время получения тепловой карты
+и картограммы: первое построение (раскладка и отрисовка), другой
+тип проблемы или окно (сетка из кеша) и повторный запрос (файл из кеша).
+
+Запуск:
+    python benchmarks/bench_density.py [--sizes 10000,100000]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import config
+import map_cache
+import map_utils
+
+PROBLEM_TYPES = ["Незаконная свалка", "Загрязнение воды", "Выбросы предприятий", "Транспорт", "Другое"]
+
+def synthetic_reports(data, count):
+    """Отчеты вокруг центра города за последние 90 дней"""
+    rng = random.Random(5)
+    now = datetime.now()
+    return [{
+        "lat": rng.gauss(data["lat"], 0.05),
+        "lon": rng.gauss(data["lon"], 0.07),
+        "problem_type": rng.choice(PROBLEM_TYPES),
+        "timestamp": (now - timedelta(days=rng.uniform(0, 90))).isoformat(),
+    } for _ in range(count)]
+
+def python_binning(data, reports):
+    """Раскладка по сетке в цикле: {(тип, окно, строка, столбец): количество}"""
+    now = datetime.now()
+    lat0 = data["lat"] - map_utils.DENSITY_RADIUS_DEG
+    lon0 = data["lon"] - map_utils.DENSITY_RADIUS_DEG
+    size = int(round(2 * map_utils.DENSITY_RADIUS_DEG / map_utils.DENSITY_CELL_DEG))
+    counts = {}
+    for report in reports:
+        row = math.floor((report["lat"] - lat0) / map_utils.DENSITY_CELL_DEG)
+        col = math.floor((report["lon"] - lon0) / map_utils.DENSITY_CELL_DEG)
+        if not (0 <= row < size and 0 <= col < size):
+            continue
+        age = (now - datetime.fromisoformat(report["timestamp"])).total_seconds() / 86400
+        for window in map_utils.DENSITY_WINDOWS:
+            if window is None or age <= window:
+                key = (report["problem_type"], window, row, col)
+                counts[key] = counts.get(key, 0) + 1
+    return counts
+
+def timed(func):
+    """Время выполнения функции в миллисекундах"""
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк карт плотности отчетов")
+    parser.add_argument("--sizes", default="10000,100000")
+    args = parser.parse_args()
+
+    city = "Алматы"
+    data = config.ECO_DATA[city]
+    # Первое построение загружает folium и шаблоны: не учитываем его
+    map_utils.create_density_map(city, data, map_utils.DensityGrid(data["lat"], data["lon"], []),
+                                 os.devnull, "choropleth")
+
+    print(f"{'отчетов':>8} {'операция':<40} {'мс':>9}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        reports = synthetic_reports(data, size)
+        print(f"{size:>8} {'раскладка: цикл Python':<40} {timed(lambda: python_binning(data, reports)):>9.1f}")
+        print(f"{size:>8} {'раскладка: NumPy bincount':<40} "
+              f"{timed(lambda: map_utils.DensityGrid(data['lat'], data['lon'], reports)):>9.1f}")
+
+        map_cache.density_grids.invalidate()
+        loads = []
+
+        def load():
+            loads.append(1)
+            return reports
+
+        for title, kind, problem_type, window in [
+            ("тепловая карта: первое построение", "heatmap", None, None),
+            ("тепловая карта: тип и окно 30 дней", "heatmap", "Загрязнение воды", 30),
+            ("картограмма по районам: окно 7 дней", "choropleth", None, 7),
+            ("тепловая карта: повторный запрос", "heatmap", None, None),
+        ]:
+            elapsed = timed(lambda: map_utils.get_density_map(city, data, size, load, kind, problem_type, window))
+            print(f"{size:>8} {title:<40} {elapsed:>9.1f}")
+        print(f"{size:>8} {'перебор отчетов для всех карт':<40} {len(loads):>9}")
+
+if __name__ == '__main__':
+    main()
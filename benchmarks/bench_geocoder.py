@@ -0,0 +1,76 @@
+"""
+Бенчмарк офлайн-геокодера (geo.py) на корпусе описаний местоположения.
+
+Сравнивает прежний поиск подстрок названий трех городов из config.ECO_DATA
+с индексом справочника мест: долю распознанных строк и пропускную способность
+без кеша и с кешем (в потоке отчетов строки местоположения повторяются).
+Отдельно измеряется быстрый путь для координат из Telegram.
+
+Запуск:
+    python benchmarks/bench_geocoder.py [--corpus benchmarks/data/locations.txt] [--count 100000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import config
+import geo
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "locations.txt")
+
+def legacy_resolve_city(location_text):
+    """Прежний способ: поиск подстроки названия города"""
+    text = (location_text or "").lower()
+    for city in config.ECO_DATA:
+        if city.lower() in text:
+            return city
+    if "астана" in text:
+        return "Нур-Султан"
+    return None
+
+def throughput(func, texts):
+    """Строк в секунду"""
+    start = time.perf_counter()
+    for text in texts:
+        func(text)
+    return len(texts) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк офлайн-геокодера")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--count", type=int, default=100000, help="строк в потоке отчетов")
+    args = parser.parse_args()
+
+    with open(args.corpus, 'r', encoding='utf-8') as f:
+        corpus = [line.strip() for line in f if line.strip()]
+
+    start = time.perf_counter()
+    gazetteer = geo.get_gazetteer()
+    print(f"Загрузка справочника: {(time.perf_counter() - start) * 1000:.1f} мс")
+
+    legacy_found = sum(1 for text in corpus if legacy_resolve_city(text))
+    found = sum(1 for text in corpus if gazetteer.geocode(text))
+    print(f"Распознано строк корпуса ({len(corpus)}): прежний способ {legacy_found}, справочник {found}")
+
+    rng = random.Random(1)
+    stream = [rng.choice(corpus) for _ in range(args.count)]
+    # Уникальные строки (без повторов), чтобы измерить разбор без кеша
+    unique = [f"{text} {i}" for i, text in enumerate(stream)]
+    coordinates = [f"Координаты: {rng.uniform(41, 55):.6f}, {rng.uniform(47, 87):.6f}" for _ in range(args.count)]
+
+    print(f"{'способ':<32} {'строк/с':>12}")
+    print(f"{'прежний поиск подстрок':<32} {throughput(legacy_resolve_city, stream):>12.0f}")
+    print(f"{'справочник, без кеша':<32} {throughput(gazetteer.geocode, unique):>12.0f}")
+    geo.geocode.cache_clear()
+    print(f"{'справочник, с кешем':<32} {throughput(geo.resolve_city, stream):>12.0f}")
+    print(f"{'координаты (быстрый путь)':<32} {throughput(geo.location_coords, coordinates):>12.0f}")
+    info = geo.geocode.cache_info()
+    print(f"Кеш: попаданий {info.hits}, промахов {info.misses}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Бенчмарк записи в JSON-базу данных EcoMap KZ.
+
+Сравнивает задержку add_report в журналируемом хранилище с прежней схемой,
+при которой на каждую запись файл читался и перезаписывался целиком.
+Задержка журналируемой записи не должна расти вместе с количеством отчетов.
+
+Запуск:
+    python benchmarks/bench_journal.py [--sizes 1000,10000,50000] [--samples 200]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import database
+
+def make_report(i):
+    """Создание тестового отчета"""
+    return {
+        "id": i,
+        "user_id": i % 500,
+        "username": f"user{i % 500}",
+        "problem_type": "Незаконная свалка",
+        "description": "Мусор возле дороги",
+        "location": "Алматы, ул. Абая",
+        "photo_id": None,
+        "timestamp": "2025-06-01T12:00:00",
+        "status": "new"
+    }
+
+def percentile(values, p):
+    """Процентиль по отсортированному списку"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def bench_legacy(path, size, samples):
+    """Прежняя схема: чтение и полная перезапись файла на каждую запись"""
+    data = {"reports": [make_report(i) for i in range(1, size + 1)], "users": {}}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+    timings = []
+    for i in range(samples):
+        start = time.perf_counter()
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        data["reports"].append(make_report(size + i + 1))
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def bench_journal(path, size, samples):
+    """Журналируемая схема: дописывание операции в журнал"""
+    data = {"reports": [make_report(i) for i in range(1, size + 1)], "users": {}}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+    database.close_db()
+    database.DATA_FILE = path
+    database.LOG_FILE = path + ".log"
+    if os.path.exists(database.LOG_FILE):
+        os.remove(database.LOG_FILE)
+    database.get_data()
+
+    timings = []
+    for i in range(samples):
+        start = time.perf_counter()
+        database.add_report(i, f"user{i}", "Незаконная свалка", "Мусор", "Алматы")
+        timings.append(time.perf_counter() - start)
+    database.close_db()
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'отчетов':>10} {'схема':>10} {'p50, мс':>10} {'p99, мс':>10}")
+        for size in [int(s) for s in args.sizes.split(",")]:
+            for name, bench in (("legacy", bench_legacy), ("journal", bench_journal)):
+                path = os.path.join(tmp, f"{name}_{size}.json")
+                timings = bench(path, size, args.samples)
+                print(f"{size:>10} {name:>10} "
+                      f"{percentile(timings, 0.5) * 1000:>10.3f} "
+                      f"{percentile(timings, 0.99) * 1000:>10.3f}")
+
+if __name__ == '__main__':
+    main()
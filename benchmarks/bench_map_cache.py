@@ -0,0 +1,67 @@
+"""
+Бенчмарк кеша карт городов (map_cache.py).
+
+Сравнивает время получения карты при пустом кеше (генерация folium
+и запись HTML) и при повторном запросе (файл из кеша), а также время
+после изменения данных (инвалидация и повторная генерация).
+
+Запуск:
+    python benchmarks/bench_map_cache.py [--reports 1000] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import config
+import database
+import map_utils
+
+def timed(func):
+    """Время выполнения функции в миллисекундах"""
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк кеша карт городов")
+    parser.add_argument("--reports", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    city = "Алматы"
+    data = config.ECO_DATA[city]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.close_db()
+        database.DATA_FILE = os.path.join(tmp, "reports.json")
+        database.LOG_FILE = os.path.join(tmp, "reports.log")
+        for _ in range(args.reports):
+            lat = data["lat"] + random.uniform(-0.1, 0.1)
+            lon = data["lon"] + random.uniform(-0.1, 0.1)
+            database.add_report(1, "user", "Незаконная свалка", "Мусор", f"Координаты: {lat}, {lon}")
+
+        def request():
+            map_utils.get_city_map(
+                city, data, database.get_data_version(),
+                lambda: database.reports_near(data["lat"], data["lon"], 30)
+            )
+
+        cold = timed(request)
+        warm = sorted(timed(request) for _ in range(args.repeat))[args.repeat // 2]
+        database.add_report(1, "user", "Незаконная свалка", "Мусор", city)
+        invalidated = timed(request)
+        database.close_db()
+
+    print(f"Отчетов на карте: {args.reports}")
+    print(f"Холодный запрос:         {cold:10.3f} мс")
+    print(f"Повторный запрос (p50):  {warm:10.3f} мс")
+    print(f"После изменения данных:  {invalidated:10.3f} мс")
+
+if __name__ == '__main__':
+    main()
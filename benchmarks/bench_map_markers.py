@@ -0,0 +1,94 @@
+"""
+Бенчмарк HTML-карты города с большим количеством отчетов (map_utils.py).
+
+Сравнивает прежний способ (отдельный folium.Marker с всплывающим окном
+на каждый отчет) с кластеризацией на сервере по уровням масштаба:
+время построения карты, размер HTML-файла и количество маркеров.
+
+Запуск:
+    python benchmarks/bench_map_markers.py [--sizes 1000,10000,100000] [--legacy-max 10000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import folium
+
+import config
+import map_utils
+
+PROBLEM_TYPES = ["Незаконная свалка", "Загрязнение воды", "Выбросы предприятий", "Транспорт", "Другое"]
+
+def synthetic_reports(data, count):
+    """Отчеты, сгущающиеся к центру города"""
+    rng = random.Random(3)
+    return [{
+        "lat": rng.gauss(data["lat"], 0.05),
+        "lon": rng.gauss(data["lon"], 0.07),
+        "problem_type": rng.choice(PROBLEM_TYPES),
+        "description": "Описание проблемы " * rng.randint(1, 4),
+        "status": "new",
+    } for _ in range(count)]
+
+def legacy_markers(m, reports):
+    """Прежний способ: folium.Marker на каждый отчет"""
+    for report in reports:
+        popup_text = f"""
+        <b>Проблема: {report['problem_type']}</b><br>
+        Описание: {report['description']}<br>
+        Статус: {report['status']}<br>
+        """
+        color, icon_name = map_utils.get_problem_marker_style(report['problem_type'])
+        folium.Marker(
+            location=(report["lat"], report["lon"]),
+            popup=folium.Popup(popup_text, max_width=300),
+            icon=folium.Icon(color=color, icon=icon_name, prefix='fa')
+        ).add_to(m)
+
+def build(city, data, reports, add_markers, path):
+    """Время построения и сохранения карты (с) и размер файла (КБ)"""
+    start = time.perf_counter()
+    m = map_utils._build_eco_map(city, data['lat'], data['lon'], data['air_quality'],
+                                 data['pm25'], data['temperature'], data['humidity'])
+    add_markers(m, reports)
+    m.save(path)
+    return time.perf_counter() - start, os.path.getsize(path) / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк HTML-карты с отчетами")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--legacy-max", type=int, default=10000,
+                        help="наибольшее количество отчетов для прежнего способа")
+    args = parser.parse_args()
+
+    city = "Алматы"
+    data = config.ECO_DATA[city]
+    # Первое построение загружает шаблоны folium: не учитываем его
+    with tempfile.TemporaryDirectory() as tmp:
+        build(city, data, synthetic_reports(data, 10), map_utils.add_problem_markers_to_map,
+              os.path.join(tmp, "warmup.html"))
+
+        print(f"{'отчетов':>8} {'способ':<12} {'время, с':>9} {'HTML, КБ':>10} {'маркеров':>9} {'уровни (масштаб: маркеров)'}")
+        for size in [int(s) for s in args.sizes.split(",")]:
+            reports = synthetic_reports(data, size)
+            path = os.path.join(tmp, f"map_{size}.html")
+            if size <= args.legacy_max:
+                elapsed, kb = build(city, data, reports, legacy_markers, path)
+                print(f"{size:>8} {'прежний':<12} {elapsed:>9.2f} {kb:>10.0f} {size:>9}")
+            else:
+                print(f"{size:>8} {'прежний':<12} {'-':>9} {'-':>10} {size:>9}")
+
+            elapsed, kb = build(city, data, reports, map_utils.add_problem_markers_to_map, path)
+            levels = map_utils.cluster_reports(reports)
+            markers = sum(len(level["markers"]) for level in levels)
+            summary = ", ".join(f"{level['min_zoom']}-{level['max_zoom']}: {len(level['markers'])}" for level in levels)
+            print(f"{size:>8} {'кластеры':<12} {elapsed:>9.2f} {kb:>10.0f} {markers:>9} {summary}")
+
+if __name__ == '__main__':
+    main()
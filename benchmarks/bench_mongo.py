@@ -0,0 +1,80 @@
+"""
+Бенчмарк вставки отчетов в MongoDB-базу (database_mongo.py).
+
+Сравнивает прежнюю схему выдачи ID (поиск максимального id с сортировкой
+и вставка max+1) с атомарным счетчиком с блочным резервированием,
+а также пакетную запись отчетов через bulk_write.
+
+По умолчанию используется mongomock вместо реального сервера; для замеров
+на локальном mongod укажите --uri mongodb://localhost:27017.
+
+Запуск:
+    python benchmarks/bench_mongo.py [--uri URI] [--sizes 1000,10000] [--samples 500]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+def percentile(values, p):
+    """Процентиль по списку значений"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def legacy_add(db, i):
+    """Прежняя схема: max(id) + 1 без индекса по id"""
+    max_id_doc = db.legacy_reports.find_one(sort=[("id", -1)])
+    next_id = max_id_doc["id"] + 1 if max_id_doc else 1
+    db.legacy_reports.insert_one({"id": next_id, "user_id": i, "status": "new"})
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк вставки отчетов в MongoDB")
+    parser.add_argument("--uri", help="URI локального mongod (по умолчанию mongomock)")
+    parser.add_argument("--sizes", default="1000,10000")
+    parser.add_argument("--samples", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.uri:
+        os.environ["MONGODB_URI"] = args.uri
+    else:
+        import mongomock
+        import pymongo
+        os.environ["MONGODB_URI"] = "mongodb://localhost"
+        pymongo.MongoClient = mongomock.MongoClient
+
+    import database_mongo
+    db = database_mongo.get_db()
+
+    print(f"{'отчетов':>10} {'схема':>8} {'p50, мс':>9} {'p99, мс':>9}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        for name in ("legacy", "counter", "batched"):
+            db.legacy_reports.drop()
+            database_mongo.reports_collection.drop()
+            database_mongo.counters_collection.drop()
+            database_mongo._id_block.update(next=0, end=0)
+
+            seed = [{"id": i, "user_id": i, "status": "new"} for i in range(1, size + 1)]
+            if name == "legacy":
+                db.legacy_reports.insert_many(seed)
+                add = lambda i: legacy_add(db, i)
+            else:
+                database_mongo.reports_collection.insert_many(seed)
+                database_mongo.init_db()
+                if name == "batched":
+                    database_mongo.enable_batching(max_size=100)
+                add = lambda i: database_mongo.add_report(i, f"user{i}", "Незаконная свалка", "Мусор", "Алматы")
+
+            timings = []
+            for i in range(args.samples):
+                start = time.perf_counter()
+                add(i)
+                timings.append(time.perf_counter() - start)
+            if name == "batched":
+                database_mongo.disable_batching()
+            print(f"{size:>10} {name:>8} {percentile(timings, 0.5) * 1000:>9.3f} {percentile(timings, 0.99) * 1000:>9.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Бенчмарк рассылки уведомлений (notifications.py).
+
+Объявление о мероприятии рассылается --recipients подписчикам города
+через заглушку Bot API. Режимы:
+    без ограничений — заглушка без ограничений частоты и бот без очереди
+        (собственные затраты рассылки: чтение подписчиков порциями,
+        отправка, контрольные точки);
+    лимиты Telegram — заглушка с ограничениями частоты Telegram, бот
+        с очередью send_queue (ограничения умножены на --scale);
+    перезапуск — как предыдущий, но рассылка прерывается на середине
+        и продолжается новым экземпляром движка с контрольной точки.
+Для каждого режима выводятся время, скорость, ответы 429 и количество
+адресатов, получивших сообщение дважды.
+
+Запуск:
+    python benchmarks/bench_notifications.py [--recipients 100000] [--scale 50] [--backends sqlite,json]
+"""
+
+import argparse
+import asyncio
+import copy
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from telegram.ext import ExtBot
+
+import db_async
+import notifications
+import send_queue
+from stub_bot_api import FloodControlRequest, StubRequest
+
+BACKENDS = {"json": "database", "sqlite": "database_sqlite"}
+CITY = "Алматы"
+
+def seed(name, backend, tmp, recipients):
+    """Временная база с подписчиками города; возвращает задание рассылки"""
+    backend.close_db()
+    user_ids = list(range(100001, 100001 + recipients))
+    if name == "json":
+        backend.DATA_FILE = os.path.join(tmp, "reports.json")
+        backend.LOG_FILE = os.path.join(tmp, "reports.log")
+        data = copy.deepcopy(backend.default_data)
+        data["event_subscriptions"] = {CITY: user_ids}
+        backend.save_data(data)
+    else:
+        backend.DB_FILE = os.path.join(tmp, "reports.db")
+        conn = backend.get_connection()
+        with conn:
+            conn.executemany("INSERT INTO event_subscriptions (city, user_id) VALUES (?, ?)",
+                             ((CITY, user_id) for user_id in user_ids))
+    backend.add_event("Субботник", "1 мая", "Парк Горького, Алматы", "Уборка парка", CITY)
+    return backend.get_pending_notifications()[0]
+
+def make_bot(mode, args):
+    """Бот и заглушка Bot API для режима"""
+    if mode == "без ограничений":
+        request = StubRequest(args.api_latency)
+        return ExtBot("123456:TEST", request=request), request
+    request = FloodControlRequest(latency=args.api_latency, global_rate=30 * args.scale,
+                                  chat_rate=1 * args.scale)
+    scheduler = send_queue.SendScheduler(global_rate=30 * args.scale, chat_rate=1 * args.scale)
+    return ExtBot("123456:TEST", request=request, rate_limiter=scheduler), request
+
+async def deliver(bot, backend, window, stop_after=None):
+    """Выполнение заданий; stop_after — прервать через столько секунд"""
+    await bot.initialize()
+    engine = notifications.NotificationEngine(bot, backend=backend, window=window)
+    task = asyncio.ensure_future(engine.run_pending())
+    try:
+        if stop_after is None:
+            await task
+        else:
+            await asyncio.sleep(stop_after)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    finally:
+        await bot.shutdown()
+    return engine.stats
+
+async def run_mode(name, backend, mode, args):
+    """Метрики режима"""
+    bot, request = make_bot(mode, args)
+    window = args.window if mode == "без ограничений" else max(args.window, int(args.scale))
+    start = time.perf_counter()
+    if mode == "перезапуск":
+        expected = args.recipients / (30 * args.scale)
+        stats = await deliver(bot, backend, window, stop_after=expected / 2)
+        # Новый экземпляр бота продолжает по контрольной точке из базы
+        bot, second = make_bot(mode, args)
+        second.delivered = request.delivered
+        rejected = request.rejected
+        stats = await deliver(bot, backend, window)
+        request.rejected += rejected + second.rejected
+    else:
+        stats = await deliver(bot, backend, window)
+    elapsed = time.perf_counter() - start
+    pending = backend.get_pending_notifications()
+    delivered = getattr(request, "delivered", None)
+    return {
+        "time": elapsed,
+        "delivered": len(delivered) if delivered is not None else request.calls.get("sendMessage", 0),
+        "duplicates": sum(count > 1 for count in delivered.values()) if delivered is not None else "-",
+        "rejected": getattr(request, "rejected", 0),
+        "checkpoints": stats["checkpoints"],
+        "pending": len(pending),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк рассылки уведомлений")
+    parser.add_argument("--recipients", type=int, default=100000)
+    parser.add_argument("--scale", type=float, default=50, help="множитель ограничений частоты Telegram")
+    parser.add_argument("--window", type=int, default=notifications.SEND_WINDOW)
+    parser.add_argument("--api-latency", type=float, default=0.002)
+    parser.add_argument("--backends", default="sqlite,json")
+    args = parser.parse_args()
+
+    print(f"Подписчиков: {args.recipients}, ограничения Telegram x{args.scale:g} "
+          f"({30 * args.scale:g} сообщ./с)")
+    print(f"{'бэкенд':<8} {'режим':<16} {'время, с':>9} {'сообщ./с':>9} {'доставлено':>10} "
+          f"{'дважды':>7} {'429':>6} {'контр. точек':>12} {'не завершено':>12}")
+    for name in args.backends.split(","):
+        backend = importlib.import_module(BACKENDS[name])
+        db_async._backend = backend
+        for mode in ("без ограничений", "лимиты Telegram", "перезапуск"):
+            with tempfile.TemporaryDirectory() as tmp:
+                seed(name, backend, tmp, args.recipients)
+                r = asyncio.run(run_mode(name, backend, mode, args))
+                backend.close_db()
+            print(f"{name:<8} {mode:<16} {r['time']:>9.2f} {r['delivered'] / r['time']:>9.0f} "
+                  f"{r['delivered']:>10} {r['duplicates']:>7} {r['rejected']:>6} "
+                  f"{r['checkpoints']:>12} {r['pending']:>12}")
+
+if __name__ == '__main__':
+    main()
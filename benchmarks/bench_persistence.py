@@ -0,0 +1,126 @@
+"""
+Бенчмарк хранения состояния бота (persistence.py).
+
+Пользователи (не больше --concurrency одновременно) проходят сценарий отчета (/report, тип проблемы,
+/skip, описание, геолокация). Сравнивается время обработки обновления
+без хранения состояния, с записью изменений раз в интервал (long polling)
+и с чтением user_data пользователя перед сообщением и записью после
+него (вебхук с несколькими экземплярами, shared=True). Для каждого режима
+выводятся p50/p99 времени обработки, количество пакетов записи и записей
+и число чтений состояния из базы.
+
+Запуск:
+    python benchmarks/bench_persistence.py [--users 200] [--concurrency 10] [--backends json,sqlite]
+        [--interval 0.5]
+"""
+
+import argparse
+import asyncio
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from telegram import Update
+
+import bot
+import persistence
+from stub_bot_api import StubRequest, message_update
+
+BACKENDS = {"json": "database", "sqlite": "database_sqlite"}
+
+def percentile(values, p):
+    """Процентиль по списку значений"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def report_flow(user_id):
+    """Обновления сценария отчета одного пользователя"""
+    return [
+        message_update(user_id, "/report"),
+        message_update(user_id, "🗑️ Незаконная свалка"),
+        message_update(user_id, "/skip"),
+        message_update(user_id, "Мусор на берегу реки"),
+        message_update(user_id, location=(43.25, 76.92)),
+    ]
+
+async def run_mode(backend, mode, args):
+    """Время обработки обновлений (с) и статистика записи состояния"""
+    options = {"request": StubRequest(0), "rate_limiter": None, "job_queue": None}
+    store = None
+    if mode != "память":
+        store = persistence.DatabasePersistence(backend=backend, shared=mode == "вебхук")
+        options["persistence"] = store
+    application = bot.build_application("123456:TEST", **options)
+    await application.initialize()
+
+    flows = [[Update.de_json(data, application.bot) for data in report_flow(user_id)]
+             for user_id in range(1, args.users + 1)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    timings = []
+
+    async def user(updates):
+        async with semaphore:
+            for update in updates:
+                start = time.perf_counter()
+                if mode == "вебхук":
+                    await store.refresh(application, update)
+                await application.process_update(update)
+                if mode == "вебхук":
+                    await application.update_persistence()
+                timings.append(time.perf_counter() - start)
+
+    async def flush_periodically():
+        while True:
+            await asyncio.sleep(args.interval)
+            await application.update_persistence()
+
+    flusher = asyncio.create_task(flush_periodically()) if mode == "интервал" else None
+    start = time.perf_counter()
+    await asyncio.gather(*(user(updates) for updates in flows))
+    elapsed = time.perf_counter() - start
+    if flusher:
+        flusher.cancel()
+        # Как при остановке бота (Application.stop)
+        await application.update_persistence()
+    await application.shutdown()
+    return timings, elapsed, store.stats if store else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк хранения состояния бота")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--backends", default="json,sqlite")
+    parser.add_argument("--interval", type=float, default=0.5, help="интервал записи, с")
+    args = parser.parse_args()
+
+    print(f"Пользователей: {args.users}, одновременно: {args.concurrency}, обновлений: {args.users * 5}")
+    print(f"{'бэкенд':<8} {'режим':<10} {'p50, мс':>8} {'p99, мс':>8} {'обн./с':>8} {'пакетов':>8} {'записей':>8} "
+          f"{'чтений':>8}")
+    for name in args.backends.split(","):
+        backend = importlib.import_module(BACKENDS[name])
+        for mode in ("память", "интервал", "вебхук"):
+            with tempfile.TemporaryDirectory() as tmp:
+                if name == "json":
+                    backend.close_db()
+                    backend.DATA_FILE = os.path.join(tmp, "reports.json")
+                    backend.LOG_FILE = os.path.join(tmp, "reports.log")
+                else:
+                    backend.close_db()
+                    backend.DB_FILE = os.path.join(tmp, "reports.db")
+                os.environ["DB_BACKEND"] = name
+                importlib.import_module("db_async")._backend = backend
+                timings, elapsed, stats = asyncio.run(run_mode(backend, mode, args))
+                backend.close_db()
+            batches = stats["batches"] if stats else "-"
+            entries = stats["entries"] if stats else "-"
+            refreshes = stats["refreshes"] if stats else "-"
+            print(f"{name:<8} {mode:<10} {percentile(timings, 0.5) * 1000:>8.2f} "
+                  f"{percentile(timings, 0.99) * 1000:>8.2f} {len(timings) / elapsed:>8.0f} "
+                  f"{batches:>8} {entries:>8} {refreshes:>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Бенчмарк определения города по координатам из Telegram.
+
+Сравнивает перебор всех центров городов и районов с расчетом расстояния
+по формуле гаверсинуса, поиск по KD-дереву (как при записи отчета)
+и векторный расчет NumPy для массовой переклассификации
+(manage.py reclassify). Проверяет, что все способы дают одинаковый результат.
+
+Запуск:
+    python benchmarks/bench_reverse_geocode.py [--points 200000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import geo
+from spatial import haversine_km
+
+def synthetic_points(gazetteer, count):
+    """Точки: половина возле городов, половина по всей территории Казахстана"""
+    rng = random.Random(7)
+    cities = list(gazetteer.cities.values())
+    points = []
+    for i in range(count):
+        if i % 2:
+            city = rng.choice(cities)
+            points.append((rng.gauss(city.lat, 0.1), rng.gauss(city.lon, 0.1)))
+        else:
+            points.append((rng.uniform(41.0, 55.0), rng.uniform(47.0, 87.0)))
+    return points
+
+def brute_force(centers, lat, lon):
+    """Прежний способ: расстояние до каждого центра"""
+    distance, place = min((haversine_km(lat, lon, c.lat, c.lon), c) for c in centers)
+    return place.city if distance <= geo.MAX_CITY_DISTANCE_KM else None
+
+def kd_tree(gazetteer, lat, lon):
+    place = gazetteer.nearest(lat, lon)
+    return place.city if place else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк определения города по координатам")
+    parser.add_argument("--points", type=int, default=200000)
+    args = parser.parse_args()
+
+    gazetteer = geo.get_gazetteer()
+    centers = gazetteer._centers.values
+    points = synthetic_points(gazetteer, args.points)
+    sample = points[:args.points // 20]
+    print(f"Центров городов и районов: {len(centers)}, точек: {len(points)}")
+    print(f"{'способ':<28} {'точек/с':>12}")
+
+    start = time.perf_counter()
+    expected = [brute_force(centers, lat, lon) for lat, lon in sample]
+    print(f"{'перебор (гаверсинус)':<28} {len(sample) / (time.perf_counter() - start):>12.0f}")
+
+    start = time.perf_counter()
+    single = [kd_tree(gazetteer, lat, lon) for lat, lon in points]
+    print(f"{'KD-дерево, по одной':<28} {len(points) / (time.perf_counter() - start):>12.0f}")
+
+    start = time.perf_counter()
+    batch = gazetteer.nearest_cities(points)
+    print(f"{'NumPy, пакетом':<28} {len(points) / (time.perf_counter() - start):>12.0f}")
+
+    mismatches = sum(a != b for a, b in zip(expected, single)) + sum(a != b for a, b in zip(single, batch))
+    print(f"Отнесено к городам: {sum(city is not None for city in batch)}, расхождений: {mismatches}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Бенчмарк очереди исходящих сообщений (send_queue.py).
+
+Имитирует рассылку по --broadcast чатам, во время которой пользователи
+нажимают кнопки бота: каждый обработчик отвечает двумя сообщениями
+подряд, а часть пользователей нажимает три раза быстро (три обработчика
+одновременно). Bot API заменен заглушкой с ограничениями частоты
+Telegram (benchmarks/stub_bot_api.FloodControlRequest).
+
+Сравниваются отправка без очереди (ответы 429 приводят к потере
+сообщений), очередь без приоритетов и объединения сообщений и полная
+очередь. Для ускорения все ограничения (и Telegram, и очереди) умножены
+на --scale.
+
+Запуск:
+    python benchmarks/bench_send_queue.py [--broadcast 3000] [--taps 250] [--scale 10]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+
+import send_queue
+from stub_bot_api import FloodControlRequest
+
+def percentile(values, p):
+    """Процентиль по списку значений"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+async def run_mode(mode, args):
+    """Результаты одного режима: словарь метрик"""
+    request = FloodControlRequest(latency=args.api_latency, global_rate=30 * args.scale,
+                                  chat_rate=1 * args.scale, chat_burst=5)
+    scheduler = None
+    if mode != "без очереди":
+        scheduler = send_queue.SendScheduler(global_rate=30 * args.scale, chat_rate=1 * args.scale,
+                                             merge=mode == "очередь")
+    bot = ExtBot("123456:TEST", request=request, rate_limiter=scheduler)
+    await bot.initialize()
+    rng = random.Random(11)
+    lost = {"рассылка": 0, "ответы": 0}
+
+    async def send(text, chat_id, lane, **options):
+        try:
+            await bot.send_message(chat_id, text, **options)
+        except RetryAfter:
+            lost[lane] += 1
+
+    async def broadcast():
+        options = {}
+        if mode == "очередь":
+            options["rate_limit_args"] = {"priority": send_queue.BROADCAST}
+        start = time.perf_counter()
+        await asyncio.gather(*(send("Новости EcoMap KZ", chat_id, "рассылка", **options)
+                               for chat_id in range(1, args.broadcast + 1)))
+        return time.perf_counter() - start
+
+    latencies = []
+
+    async def handler(chat_id):
+        start = time.perf_counter()
+        await send("Качество воздуха: Средний", chat_id, "ответы")
+        await send("PM2.5: 35 мкг/м³", chat_id, "ответы")
+        latencies.append(time.perf_counter() - start)
+
+    async def users():
+        handlers = []
+        for _ in range(args.taps):
+            chat_id = rng.randint(1, args.users)
+            taps = 3 if rng.random() < 0.1 else 1
+            handlers.extend(asyncio.ensure_future(handler(chat_id)) for _ in range(taps))
+            await asyncio.sleep(rng.expovariate(args.tap_rate))
+        await asyncio.gather(*handlers)
+
+    broadcast_task = asyncio.ensure_future(broadcast())
+    await users()
+    broadcast_time = await broadcast_task
+    await bot.shutdown()
+    return {
+        "broadcast_time": broadcast_time,
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "lost_broadcast": lost["рассылка"],
+        "lost_replies": lost["ответы"],
+        "rejected": request.rejected,
+        "calls": request.calls.get("sendMessage", 0),
+        "merged": scheduler.stats["merged"] if scheduler else 0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк очереди исходящих сообщений")
+    parser.add_argument("--broadcast", type=int, default=3000, help="чатов в рассылке")
+    parser.add_argument("--users", type=int, default=200, help="пользователей, нажимающих кнопки")
+    parser.add_argument("--taps", type=int, default=250, help="нажатий за время рассылки")
+    parser.add_argument("--tap-rate", type=float, default=50, help="нажатий в секунду")
+    parser.add_argument("--scale", type=float, default=10, help="множитель ограничений частоты")
+    parser.add_argument("--api-latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    print(f"Рассылка: {args.broadcast} чатов, нажатий: {args.taps}, ограничения x{args.scale:g} "
+          f"({30 * args.scale:g} сообщ./с на бота, {args.scale:g} сообщ./с в чат)")
+    print(f"{'режим':<20} {'рассылка, с':>11} {'ответ p50, мс':>13} {'ответ p99, мс':>13} "
+          f"{'потеряно (рассылка/ответы)':>26} {'429':>6} {'вызовов API':>11} {'объединено':>10}")
+    for mode in ("без очереди", "очередь FIFO", "очередь"):
+        r = asyncio.run(run_mode(mode, args))
+        lost = f"{r['lost_broadcast']}/{r['lost_replies']}"
+        print(f"{mode:<20} {r['broadcast_time']:>11.2f} {r['p50'] * 1000:>13.1f} {r['p99'] * 1000:>13.1f} "
+              f"{lost:>26} {r['rejected']:>6} {r['calls']:>11} {r['merged']:>10}")
+
+if __name__ == '__main__':
+    main()
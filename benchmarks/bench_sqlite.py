@@ -0,0 +1,101 @@
+"""
+Сравнение JSON-базы (database.py) и SQLite-базы (database_sqlite.py).
+
+Для каждого размера базы измеряются время загрузки, задержка add_report,
+get_report_by_id и get_user_reports.
+
+Запуск:
+    python benchmarks/bench_sqlite.py [--sizes 1000,100000,1000000] [--samples 200]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import database
+import database_sqlite
+
+USERS = 1000
+
+def make_report(i):
+    """Создание тестового отчета"""
+    return {
+        "id": i,
+        "user_id": i % USERS,
+        "username": f"user{i % USERS}",
+        "problem_type": "Незаконная свалка",
+        "description": "Мусор возле дороги",
+        "location": random.choice(["Алматы, ул. Абая", "Шымкент", "Нур-Султан, парк"]),
+        "photo_id": None,
+        "timestamp": "2025-06-01T12:00:00",
+        "status": "new"
+    }
+
+def make_data(size):
+    """Создание тестовых данных в формате JSON-базы"""
+    users = {
+        str(u): {"username": f"user{u}", "reports_count": 0, "joined_at": "2025-06-01T12:00:00"}
+        for u in range(USERS)
+    }
+    return {"reports": [make_report(i) for i in range(1, size + 1)], "users": users}
+
+def median_ms(func, samples):
+    """Медиана времени выполнения функции в миллисекундах"""
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+def open_json(tmp, data):
+    """Подготовка JSON-базы; возвращает время загрузки"""
+    path = os.path.join(tmp, f"reports_{len(data['reports'])}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    database.close_db()
+    database.DATA_FILE = path
+    database.LOG_FILE = path + ".log"
+    start = time.perf_counter()
+    database.get_data()
+    return time.perf_counter() - start
+
+def open_sqlite(tmp, data):
+    """Подготовка SQLite-базы; возвращает время открытия"""
+    database_sqlite.close_db()
+    database_sqlite.DB_FILE = os.path.join(tmp, f"reports_{len(data['reports'])}.db")
+    database_sqlite.init_db()
+    database_sqlite.migrate_from_json(data)
+    database_sqlite.close_db()
+    start = time.perf_counter()
+    database_sqlite.get_report_by_id(1)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение JSON и SQLite баз EcoMap KZ")
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'отчетов':>10} {'база':>8} {'загрузка, с':>12} {'add, мс':>9} {'by_id, мс':>10} {'by_user, мс':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            data = make_data(size)
+            for name, module, opener in (("json", database, open_json), ("sqlite", database_sqlite, open_sqlite)):
+                load = opener(tmp, data)
+                add = median_ms(lambda: module.add_report(7, "user7", "Незаконная свалка", "Мусор", "Алматы"), args.samples)
+                by_id = median_ms(lambda: module.get_report_by_id(random.randint(1, size)), args.samples)
+                by_user = median_ms(lambda: module.get_user_reports(random.randrange(USERS)), args.samples)
+                print(f"{size:>10} {name:>8} {load:>12.3f} {add:>9.3f} {by_id:>10.4f} {by_user:>12.3f}")
+            database.close_db()
+            database_sqlite.close_db()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Бенчмарк холодного старта.
+
+Для каждой точки входа запускается новый интерпретатор с -X importtime,
+из его вывода берется суммарное время импорта и самые тяжелые пакеты.
+Так видно, какие зависимости загружаются при запуске, а какие — только
+при первом использовании. Также выводится полное время работы процесса.
+
+Запуск:
+    python benchmarks/bench_startup.py [--runs 5] [--top 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Точки входа: бот (long polling) и вебхук для Vercel
+ENTRY_POINTS = {
+    "bot": "import bot",
+    "api.index": "import api.index",
+    "bot + application": "import bot; bot.build_application('123456:TEST')",
+}
+
+def import_times(code):
+    """
+    Запуск кода в новом интерпретаторе с -X importtime.
+
+    Returns:
+        tuple: (время работы процесса в секундах,
+            словарь пакет -> накопленное время импорта в микросекундах)
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=tempfile.gettempdir(), env=env, capture_output=True, text=True, check=True
+    )
+    elapsed = time.perf_counter() - start
+
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Первый импорт пакета выводится выше его подмодулей и включает их время
+        package = name.strip().split(".")[0]
+        packages[package] = max(packages.get(package, 0), int(cumulative))
+    return elapsed, packages
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк холодного старта")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    for entry, code in ENTRY_POINTS.items():
+        runs = [import_times(code) for _ in range(args.runs)]
+        wall = statistics.median(elapsed for elapsed, _ in runs) * 1000
+        print(f"{entry}: процесс {wall:.1f} мс (медиана из {args.runs})")
+
+        packages = runs[-1][1]
+        heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for name, cumulative in heaviest:
+            print(f"    {cumulative / 1000:>8.1f} мс  {name}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Бенчмарк истории PM2.5 (timeseries.py).
+
+В историю добавляются минутные значения за --days дней для --cities
+городов (случайное блуждание PM2.5), затем выполняются типичные запросы:
+24 часа по минутам, 7 и 30 дней по часам, год по дням и тренд для
+city_info. Для сравнения «7 дней по часам» вычисляется также из минутных
+данных, как без часового уровня агрегации.
+
+Выводятся объем массивов по уровням, размер файла истории, рост памяти
+процесса и оценка памяти тех же значений в списке кортежей (время,
+значение), а также время запросов.
+
+Запуск:
+    python benchmarks/bench_timeseries.py [--cities 100] [--days 365] [--minute-retention 7]
+"""
+
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import timeseries
+
+def mib(size):
+    return size / 2 ** 20
+
+def max_rss():
+    """Пиковый объем памяти процесса, байт"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def naive_bytes_per_sample(count=100000):
+    """Память на значение в списке кортежей (время, значение)"""
+    tracemalloc.start()
+    start = 1.7e9
+    samples = [(start + i * 60, 40.0 + i % 7) for i in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del samples
+    return size / count
+
+def fill(store, cities, days, now):
+    """Минутные значения за days дней до now для каждого города"""
+    minutes = days * 1440
+    start = now - minutes * 60
+    for index, city in enumerate(cities):
+        rng = random.Random(index)
+        value = rng.uniform(15, 60)
+        for minute in range(minutes):
+            value = min(500.0, max(1.0, value + rng.gauss(0, 0.8)))
+            store.add(city, start + minute * 60, value)
+
+def hourly_from_minutes(store, city, now, days=7):
+    """Часовые средние из минутных данных (как без часового уровня)"""
+    hours = {}
+    for timestamp, mean, _, _ in store.last(city, days * 86400, "minute", now):
+        hour = hours.setdefault(int((timestamp + store.utc_offset) // 3600), [0.0, 0])
+        hour[0] += mean
+        hour[1] += 1
+    return [(hour * 3600 - store.utc_offset, total / count) for hour, (total, count) in sorted(hours.items())]
+
+def timed(function, cities, repeat):
+    """Среднее время вызова function(city) по всем городам, с; и число точек"""
+    points = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for city in cities:
+            result = function(city)
+            points = len(result["sparkline"] if isinstance(result, dict) else result) if result else 0
+    return (time.perf_counter() - start) / (repeat * len(cities)), points
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк истории PM2.5")
+    parser.add_argument("--cities", type=int, default=100)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--minute-retention", type=float, default=timeseries.MINUTE_RETENTION,
+                        help="сколько дней хранить минутные агрегаты")
+    parser.add_argument("--repeat", type=int, default=20, help="повторов каждого запроса")
+    args = parser.parse_args()
+
+    cities = [f"Город {i}" for i in range(args.cities)]
+    store = timeseries.TimeSeriesStore(minute_retention=args.minute_retention,
+                                       hour_retention=max(args.days + 1, timeseries.HOUR_RETENTION))
+    now = time.time()
+    samples = args.cities * args.days * 1440
+    print(f"Городов: {args.cities}, дней: {args.days}, минутных значений: {samples}, "
+          f"минутные агрегаты хранятся {args.minute_retention:g} дн.")
+
+    rss_before = max_rss()
+    start = time.perf_counter()
+    fill(store, cities, args.days, now)
+    elapsed = time.perf_counter() - start
+    rss_growth = max_rss() - rss_before
+    print(f"Добавление: {elapsed:.1f} с, {elapsed / samples * 1e6:.2f} мкс на значение")
+
+    usage = store.memory_usage()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.bin")
+        start = time.perf_counter()
+        store.save(path)
+        save_time = time.perf_counter() - start
+        file_size = os.path.getsize(path)
+        start = time.perf_counter()
+        timeseries.TimeSeriesStore().load(path)
+        load_time = time.perf_counter() - start
+    print("\nПамять:")
+    for name, size in usage.items():
+        print(f"  уровень {name:<7} {mib(size):>9.1f} МиБ")
+    print(f"  всего           {mib(sum(usage.values())):>9.1f} МиБ "
+          f"(рост памяти процесса {mib(rss_growth):.1f} МиБ)")
+    print(f"  файл истории    {mib(file_size):>9.1f} МиБ (сохранение {save_time:.2f} с, загрузка {load_time:.2f} с)")
+    naive = naive_bytes_per_sample()
+    print(f"  список кортежей (время, значение): {naive:.0f} байт на значение, "
+          f"{mib(naive * samples):.0f} МиБ для всех минутных значений")
+
+    queries = [
+        ("24 ч по минутам", lambda city: store.last(city, 86400, "minute", now)),
+        ("7 дней по часам", lambda city: store.last(city, 7 * 86400, "hour", now)),
+        ("7 дней по часам из минут", lambda city: hourly_from_minutes(store, city, now)),
+        ("30 дней по часам", lambda city: store.last(city, 30 * 86400, "hour", now)),
+        ("год по дням", lambda city: store.last(city, 365 * 86400, "day", now)),
+        ("тренд city_info (24 ч)", lambda city: timeseries.trend(city, store=store, now=now)),
+    ]
+    print(f"\n{'запрос':<26} {'точек':>6} {'мкс на запрос':>14}")
+    for name, function in queries:
+        mean, points = timed(function, cities, args.repeat)
+        print(f"{name:<26} {points:>6} {mean * 1e6:>14.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Нагрузочный тест обработчиков бота.
+
+Синтетические обновления передаются приложению (bot.build_application)
+параллельно, а Bot API заменен заглушкой с задержкой ответа. Для каждого
+обновления измеряется время обработки; выводятся p50/p99 по типам
+и общая пропускная способность.
+
+Запуск:
+    python benchmarks/load_test.py [--updates 2000] [--concurrency 100] [--api-latency 0.005]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from telegram import Update
+
+import bot
+from stub_bot_api import StubRequest, synthetic_updates
+
+def percentile(values, p):
+    """Процентиль по списку значений"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def update_kind(update):
+    """Тип обновления для группировки результатов"""
+    if update.inline_query:
+        return "inline_query"
+    if update.callback_query:
+        return "callback:" + update.callback_query.data.split("_")[0]
+    if update.message.location:
+        return "location"
+    return "message:" + (update.message.text or "")[:12]
+
+async def run(args):
+    # Ограничения частоты Telegram заглушка не имитирует (см. bench_send_queue.py)
+    application = bot.build_application("123456:TEST", request=StubRequest(args.api_latency),
+                                        rate_limiter=None)
+    await application.initialize()
+
+    updates = [Update.de_json(data, application.bot) for data in synthetic_updates(args.updates)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    timings = {}
+
+    async def process(update):
+        async with semaphore:
+            start = time.perf_counter()
+            await application.process_update(update)
+            timings.setdefault(update_kind(update), []).append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(process(update) for update in updates))
+    elapsed = time.perf_counter() - start
+    await application.shutdown()
+
+    print(f"{'тип обновления':<24} {'кол-во':>7} {'p50, мс':>9} {'p99, мс':>9}")
+    for kind, values in sorted(timings.items()):
+        print(f"{kind:<24} {len(values):>7} {percentile(values, 0.5) * 1000:>9.2f} {percentile(values, 0.99) * 1000:>9.2f}")
+    all_values = [v for values in timings.values() for v in values]
+    print(f"{'все':<24} {len(all_values):>7} {percentile(all_values, 0.5) * 1000:>9.2f} {percentile(all_values, 0.99) * 1000:>9.2f}")
+    print(f"Пропускная способность: {len(updates) / elapsed:.0f} обновлений/с")
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков бота")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--api-latency", type=float, default=0.005, help="задержка ответа Bot API, с")
+    args = parser.parse_args()
+
+    # Тест работает с временной базой, чтобы не трогать рабочие данные
+    os.chdir(tempfile.mkdtemp(prefix="ecomap_load_"))
+    asyncio.run(run(args))
+
+if __name__ == '__main__':
+    main()
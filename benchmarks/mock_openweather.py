@@ -0,0 +1,129 @@
+"""
+Локальная заглушка API OpenWeather.
+
+Отвечает на /data/2.5/air_pollution и /data/2.5/weather правдоподобными
+значениями, которые зависят от координат, с заданной задержкой.
+Считает обращения и TCP-соединения. Может ограничивать частоту запросов
+(ответ 429 с Retry-After) и случайно отвечать ошибкой 503.
+
+Запуск отдельно (для ручной проверки бота):
+    python benchmarks/mock_openweather.py [--port 8099] [--latency 0.2] [--rate-limit 50] [--error-rate 0.05]
+    OPENWEATHER_BASE_URL=http://127.0.0.1:8099 OPENWEATHER_API_KEY=test python bot.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class MockOpenWeather(ThreadingHTTPServer):
+    """
+    HTTP-сервер заглушки.
+
+    Args:
+        port (int): Порт (0 — выбрать свободный)
+        latency (float): Задержка ответа в секундах
+        rate_limit (float): Допустимо запросов в секунду (0 — без ограничения)
+        error_rate (float): Доля ответов с ошибкой 503
+    """
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, port=0, latency=0.05, rate_limit=0, error_rate=0.0):
+        super().__init__(("127.0.0.1", port), MockHandler)
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.calls = {}
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._window = (0, 0)  # (секунда, запросов в ней)
+
+    def over_limit(self):
+        """Превышен ли лимит запросов в текущую секунду"""
+        if not self.rate_limit:
+            return False
+        second = int(time.monotonic())
+        with self.lock:
+            window_second, count = self._window
+            count = count + 1 if window_second == second else 1
+            self._window = (second, count)
+        return count > self.rate_limit
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        """Запуск сервера в фоновом потоке"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with self.server.lock:
+            self.server.calls[url.path] = self.server.calls.get(url.path, 0) + 1
+
+        if self.server.over_limit():
+            self._send(429, {"cod": 429, "message": "rate limit"}, {"Retry-After": "1"})
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if random.random() < self.server.error_rate:
+            self._send(503, {"cod": 503, "message": "unavailable"})
+            return
+
+        lat = float(params.get("lat", 0))
+        lon = float(params.get("lon", 0))
+        if url.path == "/data/2.5/air_pollution":
+            body = {"coord": {"lat": lat, "lon": lon},
+                    "list": [{"main": {"aqi": 2}, "components": {"pm2_5": round(abs(lat + lon) % 90, 2)},
+                              "dt": int(time.time())}]}
+        elif url.path == "/data/2.5/weather":
+            body = {"coord": {"lat": lat, "lon": lon},
+                    "main": {"temp": round(lat % 30, 1), "humidity": int(lon) % 100}}
+        else:
+            self._send(404, {"cod": 404, "message": "not found"})
+            return
+        self._send(200, body)
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка API OpenWeather")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--rate-limit", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockOpenWeather(args.port, args.latency, args.rate_limit, args.error_rate)
+    print(f"Заглушка OpenWeather: {server.url}")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+Заглушка Telegram Bot API для бенчмарков.
+
+StubRequest подключается к приложению python-telegram-bot вместо HTTP-клиента
+и отвечает на вызовы методов Bot API правдоподобными ответами с заданной
+задержкой, не обращаясь к сети. FloodControlRequest дополнительно
+имитирует ограничения частоты Telegram (ответ 429 с retry_after).
+Также здесь собраны генераторы синтетических обновлений (сообщений
+и callback-запросов).
+"""
+
+import asyncio
+import itertools
+import json
+import time
+
+from telegram.request import BaseRequest
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "EcoMap KZ", "username": "ecomap_kz_bot"}
+
+class StubRequest(BaseRequest):
+    """
+    Имитация Bot API.
+
+    Args:
+        latency (float): Задержка ответа в секундах
+    """
+
+    def __init__(self, latency=0.005):
+        self.latency = latency
+        self.calls = {}
+        self._message_ids = itertools.count(1)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, chat_id):
+        """Ответ на отправку сообщения"""
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id or 0), "type": "private"},
+            "from": BOT_USER,
+            "text": "ok",
+        }
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit("/", 1)[-1]
+        self.calls[api_method] = self.calls.get(api_method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        params = request_data.parameters if request_data else {}
+        if api_method == "getMe":
+            result = BOT_USER
+        elif api_method == "sendPhoto":
+            result = self._message(params.get("chat_id"))
+            result["photo"] = [{"file_id": f"photo{result['message_id']}", "file_unique_id": "u",
+                                "width": 800, "height": 600}]
+        elif api_method.startswith("send") or api_method.startswith("edit"):
+            result = self._message(params.get("chat_id"))
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode("utf-8")
+
+class FloodControlRequest(StubRequest):
+    """
+    Имитация Bot API с ограничениями частоты отправки сообщений.
+
+    Ограничения моделируются корзинами токенов: общей на бота и своей
+    у каждого чата. Сообщение сверх ограничения не отправляется,
+    а в ответ возвращается ошибка 429 с retry_after.
+
+    Args:
+        latency (float): Задержка ответа в секундах
+        global_rate (float): Сообщений в секунду на бота
+        chat_rate (float): Сообщений в секунду в один чат
+        chat_burst (int): Допустимый всплеск в один чат
+    """
+
+    def __init__(self, latency=0.005, global_rate=30, chat_rate=1, chat_burst=5):
+        super().__init__(latency)
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._global = [float(global_rate), time.monotonic()]
+        self._chats = {}
+        self.rejected = 0
+        self.delivered = {}
+
+    @staticmethod
+    def _take(bucket, rate, capacity, now):
+        """Расход токена корзины [токены, время]; пауза до следующего токена, если их нет"""
+        bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return (1 - bucket[0]) / rate
+        bucket[0] -= 1
+        return 0
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        if api_method.startswith("send"):
+            now = time.monotonic()
+            chat_id = params.get("chat_id")
+            chat = self._chats.setdefault(chat_id, [float(self.chat_burst), now])
+            # Проверяем без расхода, чтобы отклоненный запрос не тратил токен другой корзины
+            wait = max(self._take(list(chat), self.chat_rate, self.chat_burst, now),
+                       self._take(list(self._global), self.global_rate, self.global_rate, now))
+            if wait:
+                self.rejected += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                body = {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                        "parameters": {"retry_after": max(round(wait, 3), 0.001)}}
+                return 429, json.dumps(body).encode("utf-8")
+            self._take(chat, self.chat_rate, self.chat_burst, now)
+            self._take(self._global, self.global_rate, self.global_rate, now)
+            self.delivered[chat_id] = self.delivered.get(chat_id, 0) + 1
+        return await super().do_request(url, method, request_data, read_timeout,
+                                        write_timeout, connect_timeout, pool_timeout)
+
+_update_ids = itertools.count(1)
+
+def _user(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+def message_update(user_id, text=None, location=None):
+    """Обновление с сообщением пользователя"""
+    message = {
+        "message_id": next(_update_ids),
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": _user(user_id),
+    }
+    if text is not None:
+        message["text"] = text
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    if location is not None:
+        message["location"] = {"latitude": location[0], "longitude": location[1]}
+    return {"update_id": next(_update_ids), "message": message}
+
+def callback_update(user_id, data):
+    """Обновление с нажатием inline-кнопки"""
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": next(_update_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": BOT_USER,
+                "text": "Выберите город",
+            },
+        },
+    }
+
+def inline_query_update(user_id, query):
+    """Обновление с inline-запросом"""
+    return {
+        "update_id": next(_update_ids),
+        "inline_query": {"id": str(next(_update_ids)), "from": _user(user_id), "query": query, "offset": ""},
+    }
+
+def synthetic_updates(count, users=100):
+    """Смесь типичных обновлений: команды, меню, города, карты, отчеты"""
+    scenarios = [
+        lambda u: message_update(u, "/start"),
+        lambda u: message_update(u, "📊 Экологическая информация"),
+        lambda u: callback_update(u, "city_Алматы"),
+        lambda u: callback_update(u, "map_Алматы"),
+        lambda u: message_update(u, "📋 Мои отчеты"),
+        lambda u: message_update(u, "🌿 Эко-советы"),
+        lambda u: message_update(u, location=(43.25, 76.92)),
+        lambda u: callback_update(u, "cities_page_3"),
+        lambda u: inline_query_update(u, "Усть"),
+    ]
+    for i in range(count):
+        yield scenarios[i % len(scenarios)](i % users + 1)
@@ -0,0 +1,125 @@
+"""
+Локальная проверка вебхука (api/index.py).
+
+Запускает HTTP-сервер с обработчиком вебхука, подменяет Bot API заглушкой
+и отправляет на него POST-запросы с обновлениями — записанными в файл
+(JSON-список или по одному обновлению на строку) или синтетическими.
+Выводит число запросов в секунду, время ответа вебхука (p50/p99)
+и время, за которое были обработаны все обновления.
+
+Запуск:
+    python benchmarks/webhook_harness.py [--updates 2000] [--concurrency 32] [--file updates.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api import index
+from stub_bot_api import StubRequest, synthetic_updates
+
+def percentile(values, p):
+    """Процентиль по списку значений"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+class Counter:
+    """Счетчик обработанных обновлений"""
+    count = 0
+
+class WebhookServer(ThreadingHTTPServer):
+    # Очередь соединений должна вмещать все параллельные запросы
+    request_queue_size = 256
+
+def load_updates(path):
+    """Записанные обновления из файла"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочная проверка вебхука")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--file", help="файл с записанными обновлениями")
+    parser.add_argument("--api-latency", type=float, default=0.005, help="задержка ответа Bot API, с")
+    args = parser.parse_args()
+
+    if args.file:
+        updates = load_updates(os.path.abspath(args.file))
+    else:
+        updates = list(synthetic_updates(args.updates))
+    bodies = [json.dumps(update).encode('utf-8') for update in updates]
+
+    # Проверка работает с временной базой, чтобы не трогать рабочие данные
+    os.chdir(tempfile.mkdtemp(prefix="ecomap_webhook_"))
+
+    stub = StubRequest(args.api_latency)
+    start = time.perf_counter()
+    # Ограничения частоты Telegram заглушка не имитирует (см. bench_send_queue.py)
+    application, _ = index.get_application(token="123456:TEST", request=stub, rate_limiter=None)
+    print(f"Инициализация приложения: {(time.perf_counter() - start) * 1000:.1f} мс")
+
+    # Считаем обновления, обработка которых завершилась
+    done = Counter()
+    process_update = application.process_update
+
+    async def counted_process_update(update):
+        try:
+            await process_update(update)
+        finally:
+            done.count += 1
+
+    application.process_update = counted_process_update
+
+    server = WebhookServer(("127.0.0.1", 0), index.handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    def post(body):
+        # Обработчик отвечает по HTTP/1.0, поэтому соединение на каждый запрос свое,
+        # как и при доставке вебхуков Telegram
+        conn = HTTPConnection("127.0.0.1", port)
+        headers = {"Content-Type": "application/json"}
+        if index.WEBHOOK_SECRET:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = index.WEBHOOK_SECRET
+        begin = time.perf_counter()
+        conn.request("POST", "/api", body, headers)
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+        return time.perf_counter() - begin
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        timings = list(pool.map(post, bodies))
+    acked = time.perf_counter() - start
+
+    # Ждем, пока фоновый цикл обработает все обновления
+    while done.count < len(bodies) and time.perf_counter() - start < 60:
+        time.sleep(0.01)
+    processed = time.perf_counter() - start
+    server.shutdown()
+
+    print(f"Запросов: {len(bodies)}, параллельно: {args.concurrency}")
+    print(f"Ответ вебхука: p50 {percentile(timings, 0.5) * 1000:.2f} мс, "
+          f"p99 {percentile(timings, 0.99) * 1000:.2f} мс")
+    print(f"Пропускная способность: {len(bodies) / acked:.0f} запросов/с")
+    print(f"Все обновления обработаны через {processed:.2f} с "
+          f"(вызовов Bot API: {sum(stub.calls.values())})")
+
+if __name__ == '__main__':
+    main()
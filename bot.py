@@ -1,17 +1,25 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import asyncio
+import functools
+import html
 import os
 import logging
-from telegram import Update, KeyboardButton, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
+from datetime import datetime
+from telegram import (Update, KeyboardButton, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup,
+                      InlineQueryResultArticle, InputTextMessageContent)
 from telegram.constants import ParseMode
-from telegram.ext import Updater, CommandHandler, MessageHandler, Filters, CallbackContext, CallbackQueryHandler, ConversationHandler
-import requests
-import json
-from PIL import Image
-from io import BytesIO
-import folium
-import database
+from telegram.ext import (Application, BaseHandler, CommandHandler, MessageHandler, filters, ContextTypes,
+                          CallbackQueryHandler, ConversationHandler, InlineQueryHandler, TypeHandler)
+import air_quality
+import alerts
+import cities
+import db_async
+import notifications
+import persistence
+import send_queue
+import timeseries
 
 # Пытаемся загрузить переменные из .env файла, если не получается, используем config.py
 try:
@@ -112,8 +120,17 @@ logger = logging.getLogger(__name__)
 # Состояния для разговора при отправке отчета о проблеме
 PHOTO, DESCRIPTION, LOCATION = range(3)
 
+# Ключ user_data с текущим шагом разговора отчета (продолжение отчета на другом экземпляре бота)
+REPORT_STATE = "report_state"
+
+# Радиус вокруг центра города, в котором отчеты показываются на карте (км)
+CITY_RADIUS_KM = 30
+
+# За сколько дней показывать график истории PM2.5
+HISTORY_DAYS = 7
+
 # Функция для обработки команды /start
-def start(update: Update, context: CallbackContext) -> None:
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     keyboard = [
         [KeyboardButton("📊 Экологическая информация")],
         [KeyboardButton("📸 Сообщить о проблеме")],
@@ -124,7 +141,7 @@ def start(update: Update, context: CallbackContext) -> None:
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     
     user = update.effective_user
-    update.message.reply_text(
+    await update.message.reply_text(
         f"Здравствуйте, {user.first_name}! 👋\n\n"
         f"Добро пожаловать в EcoMap KZ - бот для мониторинга экологической ситуации в Казахстане.\n\n"
         f"Что вы хотите узнать?",
@@ -132,17 +149,17 @@ def start(update: Update, context: CallbackContext) -> None:
     )
     
     # Проверяем статистику пользователя
-    user_stats = database.get_user_stats(user.id)
+    user_stats = await db_async.get_user_stats(user.id)
     if user_stats:
         reports_count = user_stats["reports_count"]
         if reports_count > 0:
-            update.message.reply_text(
+            await update.message.reply_text(
                 f"У вас уже есть {reports_count} отчетов о проблемах. Спасибо за вашу активность!"
             )
 
 # Функция для обработки команды /help
-def help_command(update: Update, context: CallbackContext) -> None:
-    update.message.reply_text(
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text(
         "Как пользоваться ботом EcoMap KZ:\n\n"
         "/start - запустить бота\n"
         "/help - получить помощь\n"
@@ -150,144 +167,222 @@ def help_command(update: Update, context: CallbackContext) -> None:
         "/report - сообщить о проблеме\n"
         "/tips - получить экологические советы\n"
         "/events - узнать о волонтерских мероприятиях\n"
+        "/events_subscribe <город> - получать объявления о новых мероприятиях\n"
+        "/events_unsubscribe - отписаться от объявлений\n"
+        "/subscribe <город> <порог> - оповещать, когда PM2.5 превысит порог\n"
+        "/unsubscribe - отписаться от оповещений о качестве воздуха\n"
         "/my_reports - просмотреть ваши отчеты о проблемах\n\n"
         "Также вы можете использовать кнопки меню для навигации."
     )
 
 # Функция для отображения экологической информации
-def eco_info(update: Update, context: CallbackContext) -> None:
-    keyboard = []
-    for city in eco_data.keys():
-        keyboard.append([InlineKeyboardButton(city, callback_data=f"city_{city}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text(
+async def eco_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text(
         "Выберите город для получения экологической информации:",
-        reply_markup=reply_markup
+        reply_markup=cities.get_registry().keyboard(0)
     )
 
+# Функция для получения данных о городе
+def get_city_data(city):
+    """
+    Экологические данные города: из eco_data, а для остальных городов
+    справочника — только координаты. Актуальные значения берутся
+    из кеша OpenWeather без ожидания API.
+    """
+    data = eco_data.get(city)
+    if data is None:
+        entry = cities.get_registry().get(city)
+        if entry is None:
+            return None
+        data = {
+            "air_quality": None,
+            "pm25": None,
+            "temperature": None,
+            "humidity": None,
+            "lat": entry["lat"],
+            "lon": entry["lon"],
+            "tips": []
+        }
+    return air_quality.current(city, data)
+
 # Функция для отображения информации о выбранном городе
-def city_info(update: Update, context: CallbackContext) -> None:
+async def city_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
     city = query.data.replace("city_", "")
-    data = eco_data.get(city)
+    data = get_city_data(city)
     
     if not data:
-        query.edit_message_text(text=f"Извините, данные для города {city} не найдены.")
+        await query.edit_message_text(text=f"Извините, данные для города {city} не найдены.")
         return
     
     # Цвет индикатора в зависимости от качества воздуха
-    air_quality = data["air_quality"]
-    if air_quality == "Хороший":
+    quality = data["air_quality"]
+    if quality == "Хороший":
         air_indicator = "🟢"
-    elif air_quality == "Средний":
+    elif quality == "Средний":
         air_indicator = "🟡"
     else:
         air_indicator = "🔴"
     
     # Формируем сообщение
-    message = (
-        f"📍 <b>{city}</b>\n\n"
-        f"Качество воздуха: {air_indicator} {air_quality}\n"
-        f"PM2.5: {data['pm25']} мкг/м³\n"
-        f"Температура: {data['temperature']}°C\n"
-        f"Влажность: {data['humidity']}%\n\n"
-        f"<b>Рекомендации:</b>\n"
-    )
+    if quality is None:
+        message = (
+            f"📍 <b>{city}</b>\n\n"
+            f"Данные о качестве воздуха пока не получены. Попробуйте позже.\n"
+        )
+    else:
+        message = (
+            f"📍 <b>{city}</b>\n\n"
+            f"Качество воздуха: {air_indicator} {quality}\n"
+            f"PM2.5: {data['pm25']} мкг/м³\n"
+            f"Температура: {data['temperature']}°C\n"
+            f"Влажность: {data['humidity']}%\n"
+        )
+    if "updated_at" in data:
+        message += f"Обновлено: {datetime.fromtimestamp(data['updated_at']).strftime('%H:%M')}\n"
+    # Тренд за сутки по часовым агрегатам истории PM2.5
+    trend = timeseries.trend(city)
+    if trend:
+        message += f"PM2.5 за 24 ч: {trend['sparkline']} ({trend['change']:+.0f} мкг/м³)\n"
+    if data["tips"]:
+        message += "\n<b>Рекомендации:</b>\n"
     
     for tip in data["tips"]:
         message += f"• {tip}\n"
     
+    # Сообщения, отправленные через inline-режим, принадлежат другому чату:
+    # карту туда отправить нельзя, а список городов не нужен
+    if query.message is None:
+        await query.edit_message_text(text=message, parse_mode=ParseMode.HTML)
+        return
+    
     keyboard = [
         [InlineKeyboardButton("Посмотреть на карте", callback_data=f"map_{city}")],
-        [InlineKeyboardButton("« Назад", callback_data="back_to_cities")]
+        [InlineKeyboardButton("📈 История PM2.5", callback_data=f"history_{city}")],
+        [InlineKeyboardButton("« Назад", callback_data=f"cities_page_{cities.get_registry().page_of(city)}")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    query.edit_message_text(text=message, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
+    await query.edit_message_text(text=message, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
 
 # Функция для отображения карты
-def show_map(update: Update, context: CallbackContext) -> None:
+async def show_map(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
     city = query.data.replace("map_", "")
-    data = eco_data.get(city)
+    data = get_city_data(city)
     
     if not data:
-        query.edit_message_text(text=f"Извините, данные для города {city} не найдены.")
+        await query.edit_message_text(text=f"Извините, данные для города {city} не найдены.")
         return
     
-    query.edit_message_text(text=f"Генерирую карту для {city}...")
-    
-    # Создаем карту
-    map_center = [data['lat'], data['lon']]
-    m = folium.Map(location=map_center, zoom_start=12)
-    
-    # Добавляем маркер с информацией о качестве воздуха
-    popup_text = f"""
-    <b>{city}</b><br>
-    Качество воздуха: {data['air_quality']}<br>
-    PM2.5: {data['pm25']} мкг/м³<br>
-    Температура: {data['temperature']}°C<br>
-    """
-    
-    # Определяем цвет маркера
-    if data['air_quality'] == "Хороший":
-        color = "green"
-    elif data['air_quality'] == "Средний":
-        color = "orange"
-    else:
-        color = "red"
-    
-    folium.Marker(
-        location=map_center,
-        popup=folium.Popup(popup_text, max_width=300),
-        icon=folium.Icon(color=color)
-    ).add_to(m)
-    
-    # Сохраняем карту во временный файл
-    map_path = f"map_{city.lower()}.html"
-    m.save(map_path)
+    await query.edit_message_text(text=f"Генерирую карту для {city}...")
+    
+    # Берем изображение карты из кеша; оно перерисовывается только при изменении данных.
+    # Отрисовка выполняется в отдельном потоке, чтобы не задерживать других пользователей.
+    # Модуль отрисовки (и Pillow) загружается при первом запросе карты, а не при запуске
+    import map_render
+    backend = db_async.get_backend()
+    map_key, photo = await asyncio.to_thread(
+        map_render.get_city_photo,
+        city, data, await db_async.get_data_version(),
+        lambda: backend.reports_near(data['lat'], data['lon'], CITY_RADIUS_KM)
+    )
     
-    # Отправляем сообщение с ссылкой на карту (в реальном проекте можно отправить изображение)
-    context.bot.send_message(
+    # Отправляем карту; после первой отправки фотография переиспользуется по file_id
+    message = await context.bot.send_photo(
         chat_id=query.message.chat_id,
-        text=f"К сожалению, отправка HTML-карты напрямую в Telegram невозможна. В реальном проекте здесь будет статическое изображение карты или ссылка на веб-версию."
+        photo=photo,
+        caption=f"Карта: {city}"
     )
+    map_render.remember_file_id(map_key, message.photo[-1].file_id)
     
-    # Загружаем отчеты о проблемах для этого города
-    reports = database.get_all_reports()
-    city_reports = [r for r in reports if city.lower() in r.get("location", "").lower()]
+    # Берем количество отчетов о проблемах из счетчиков города
+    city_reports_count = (await db_async.get_city_stats(city))["total"]
     
-    if city_reports:
-        context.bot.send_message(
+    if city_reports_count:
+        await context.bot.send_message(
             chat_id=query.message.chat_id,
-            text=f"В городе {city} пользователи сообщили о {len(city_reports)} экологических проблемах."
+            text=f"В городе {city} пользователи сообщили о {city_reports_count} экологических проблемах."
         )
     
     # Возвращаемся к информации о городе
-    city_info(update, context)
+    await city_info(update, context)
+
+# Функция для отображения графика PM2.5 за неделю
+async def show_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    city = query.data.replace("history_", "")
+    
+    # Часовые агрегаты: 168 точек за неделю без чтения минутных данных
+    points = timeseries.get_store().last(city, HISTORY_DAYS * 86400, "hour")
+    if len(points) < 2:
+        await query.answer("История PM2.5 для этого города пока не накоплена.", show_alert=True)
+        return
+    await query.answer()
+    
+    # Модуль отрисовки (и Pillow) загружается при первом запросе графика
+    import chart_render
+    photo = await asyncio.to_thread(chart_render.render_history_png, points, timeseries.RESOLUTIONS["hour"])
+    means = [mean for _, mean, _, _ in points]
+    await context.bot.send_photo(
+        chat_id=query.message.chat_id,
+        photo=photo,
+        caption=(f"PM2.5 в городе {city} за {HISTORY_DAYS} дней (по часам): "
+                 f"среднее {sum(means) / len(means):.0f}, "
+                 f"от {min(low for _, _, low, _ in points):.0f} до {max(high for _, _, _, high in points):.0f} мкг/м³")
+    )
 
 # Функция для возврата к списку городов
-def back_to_cities(update: Update, context: CallbackContext) -> None:
+async def back_to_cities(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    keyboard = []
-    for city in eco_data.keys():
-        keyboard.append([InlineKeyboardButton(city, callback_data=f"city_{city}")])
+    await query.edit_message_text(
+        text="Выберите город для получения экологической информации:",
+        reply_markup=cities.get_registry().keyboard(0)
+    )
+
+# Функция для перелистывания списка городов
+async def cities_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(
+    page = query.data.replace("cities_page_", "")
+    if not page.isdigit():
+        return
+    
+    await query.edit_message_text(
         text="Выберите город для получения экологической информации:",
-        reply_markup=reply_markup
+        reply_markup=cities.get_registry().keyboard(int(page))
     )
 
+# Функция для поиска города через inline-запрос
+async def inline_city_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.inline_query
+    registry = cities.get_registry()
+    
+    results = []
+    for name in registry.search(query.query, limit=20):
+        entry = registry.get(name)
+        results.append(InlineQueryResultArticle(
+            id=name,
+            title=name,
+            description=entry["region"],
+            input_message_content=InputTextMessageContent(f"📍 {name}"),
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("Экологическая информация", callback_data=f"city_{name}")]
+            ])
+        ))
+    
+    # Результаты одинаковы для всех пользователей, Telegram может их кешировать
+    await query.answer(results, cache_time=3600)
+
 # Функция для начала процесса сообщения о проблеме
-def report_problem(update: Update, context: CallbackContext) -> int:
+async def report_problem(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     keyboard = [
         [KeyboardButton("🗑️ Незаконная свалка")],
         [KeyboardButton("💧 Загрязнение воды")],
@@ -297,7 +392,7 @@ def report_problem(update: Update, context: CallbackContext) -> int:
     ]
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     
-    update.message.reply_text(
+    await update.message.reply_text(
         "Выберите тип экологической проблемы, о которой хотите сообщить:",
         reply_markup=reply_markup
     )
@@ -305,58 +400,56 @@ def report_problem(update: Update, context: CallbackContext) -> int:
     return PHOTO
 
 # Функция для обработки выбора проблемы и запроса фото
-def handle_problem_type(update: Update, context: CallbackContext) -> int:
+async def handle_problem_type(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     text = update.message.text
     
     if text == "🔙 Главное меню":
-        start(update, context)
+        await start(update, context)
         return ConversationHandler.END
     
     if text in ["🗑️ Незаконная свалка", "💧 Загрязнение воды", "🏭 Промышленные выбросы", "🚗 Транспортное загрязнение"]:
         problem_type = text.split(" ", 1)[1]
         context.user_data['problem_type'] = problem_type
         
-        update.message.reply_text(
+        await update.message.reply_text(
             f"Вы выбрали проблему: {problem_type}.\n\n"
             "Пожалуйста, отправьте фотографию проблемы. "
             "Или отправьте /skip, если у вас нет фотографии."
         )
         return DESCRIPTION
     else:
-        update.message.reply_text(
+        await update.message.reply_text(
             "Пожалуйста, выберите тип проблемы из предложенных вариантов."
         )
         return PHOTO
 
 # Функция для обработки фото и запроса описания
-def handle_photo(update: Update, context: CallbackContext) -> int:
-    user = update.effective_user
-    photo_file = update.message.photo[-1].get_file()
+async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     photo_id = update.message.photo[-1].file_id
     
     # В реальном проекте здесь будет загрузка фото на сервер
     context.user_data['photo_id'] = photo_id
     
-    update.message.reply_text(
+    await update.message.reply_text(
         "Спасибо за фотографию! Теперь пожалуйста отправьте описание проблемы."
     )
     
     return LOCATION
 
 # Функция для пропуска отправки фото
-def skip_photo(update: Update, context: CallbackContext) -> int:
-    update.message.reply_text(
+async def skip_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text(
         "Фотография не отправлена. Пожалуйста, опишите проблему текстом."
     )
     
     return LOCATION
 
 # Функция для обработки описания и запроса местоположения
-def handle_description(update: Update, context: CallbackContext) -> int:
+async def handle_description(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     description = update.message.text
     context.user_data['description'] = description
     
-    update.message.reply_text(
+    await update.message.reply_text(
         "Спасибо за описание! Пожалуйста, отправьте местоположение проблемы.\n\n"
         "Вы можете отправить текстовое описание места или отправить геолокацию через функцию Telegram."
     )
@@ -364,7 +457,7 @@ def handle_description(update: Update, context: CallbackContext) -> int:
     return ConversationHandler.END
 
 # Функция для обработки местоположения и завершения отчета
-def handle_location(update: Update, context: CallbackContext) -> int:
+async def handle_location(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user = update.effective_user
     
     if update.message.location:
@@ -380,7 +473,7 @@ def handle_location(update: Update, context: CallbackContext) -> int:
     photo_id = context.user_data.get('photo_id')
     
     # Сохраняем отчет в базу данных
-    report_id = database.add_report(
+    report_id = await db_async.add_report(
         user_id=user.id,
         username=user.username or user.first_name,
         problem_type=problem_type,
@@ -390,7 +483,7 @@ def handle_location(update: Update, context: CallbackContext) -> int:
     )
     
     # Отправляем сообщение с благодарностью
-    update.message.reply_text(
+    await update.message.reply_text(
         f"Спасибо за ваш отчет! Ему присвоен номер: {report_id}\n\n"
         f"Тип проблемы: {problem_type}\n"
         f"Описание: {description}\n"
@@ -402,13 +495,13 @@ def handle_location(update: Update, context: CallbackContext) -> int:
     context.user_data.clear()
     
     # Возвращаемся в главное меню
-    start(update, context)
+    await start(update, context)
     
     return ConversationHandler.END
 
 # Функция для отмены отчета
-def cancel(update: Update, context: CallbackContext) -> int:
-    update.message.reply_text(
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text(
         "Отчет о проблеме отменен. Вы вернулись в главное меню."
     )
     
@@ -416,12 +509,69 @@ def cancel(update: Update, context: CallbackContext) -> int:
     context.user_data.clear()
     
     # Возвращаемся в главное меню
-    start(update, context)
+    await start(update, context)
     
     return ConversationHandler.END
 
+# Функция для удаления незавершенного отчета, к которому пользователь не возвращался DRAFT_TTL секунд
+async def report_timeout(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    context.user_data.clear()
+
+# Запоминание шага разговора отчета в user_data
+def track_report_state(callback):
+    @functools.wraps(callback)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        state = await callback(update, context)
+        if state == ConversationHandler.END:
+            context.user_data.pop(REPORT_STATE, None)
+        elif state is not None:
+            context.user_data[REPORT_STATE] = state
+        return state
+    return wrapper
+
+class ReportResumeHandler(BaseHandler):
+    """
+    Продолжение отчета с шага, сохраненного в user_data (REPORT_STATE).
+
+    В вебхуке предыдущий шаг мог обработать другой экземпляр бота, и
+    состояние ConversationHandler в памяти этого экземпляра отсутствует
+    или устарело. Обновление передается обработчику сохраненного шага
+    (или fallbacks), если он его принимает.
+
+    Args:
+        application (Application): Приложение бота (источник user_data)
+        states (dict): Обработчики шагов разговора
+        fallbacks (list): Обработчики отмены разговора
+    """
+
+    def __init__(self, application, states, fallbacks):
+        super().__init__(self._resume)
+        self.application = application
+        self.states = states
+        self.fallbacks = fallbacks
+
+    async def _resume(self, update, context):
+        # Не вызывается: handle_update передает обновление обработчику шага
+        return None
+
+    def check_update(self, update):
+        if not isinstance(update, Update) or update.effective_user is None:
+            return None
+        state = self.application.user_data.get(update.effective_user.id, {}).get(REPORT_STATE)
+        if state is None:
+            return None
+        for handler in self.states.get(state, []) + self.fallbacks:
+            check = handler.check_update(update)
+            if check is not None and check is not False:
+                return handler, check
+        return None
+
+    async def handle_update(self, update, application, check_result, context):
+        handler, check = check_result
+        return await handler.handle_update(update, application, check, context)
+
 # Функция для отображения эко-советов
-def eco_tips(update: Update, context: CallbackContext) -> None:
+async def eco_tips(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     tip_index = 0
     if context.user_data and 'tip_index' in context.user_data:
         tip_index = (context.user_data['tip_index'] + 1) % len(tips)
@@ -432,16 +582,16 @@ def eco_tips(update: Update, context: CallbackContext) -> None:
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    update.message.reply_text(
+    await update.message.reply_text(
         f"Совет дня:\n\n{tips[tip_index]}",
         reply_markup=reply_markup,
         parse_mode=ParseMode.HTML
     )
 
 # Функция для отображения следующего совета
-def next_tip(update: Update, context: CallbackContext) -> None:
+async def next_tip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
     tip_index = 0
     if context.user_data and 'tip_index' in context.user_data:
@@ -453,26 +603,28 @@ def next_tip(update: Update, context: CallbackContext) -> None:
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    query.edit_message_text(
+    await query.edit_message_text(
         text=f"Совет дня:\n\n{tips[tip_index]}",
         reply_markup=reply_markup,
         parse_mode=ParseMode.HTML
     )
 
 # Функция для отображения волонтерских мероприятий
-def show_events(update: Update, context: CallbackContext) -> None:
-    if not eco_events:
-        update.message.reply_text("В настоящее время нет запланированных мероприятий.")
+async def show_events(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # Мероприятия из config.py и добавленные через manage.py add-event
+    events = eco_events + await db_async.get_events()
+    if not events:
+        await update.message.reply_text("В настоящее время нет запланированных мероприятий.")
         return
     
     message = "<b>📅 Предстоящие экологические мероприятия:</b>\n\n"
     
-    for i, event in enumerate(eco_events):
+    for i, event in enumerate(events):
         message += (
-            f"<b>{event['name']}</b>\n"
-            f"📆 {event['date']}\n"
-            f"📍 {event['location']}\n"
-            f"ℹ️ {event['description']}\n\n"
+            f"<b>{html.escape(event['name'])}</b>\n"
+            f"📆 {html.escape(event['date'])}\n"
+            f"📍 {html.escape(event['location'])}\n"
+            f"ℹ️ {html.escape(event['description'])}\n\n"
         )
     
     keyboard = [
@@ -480,30 +632,134 @@ def show_events(update: Update, context: CallbackContext) -> None:
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    update.message.reply_text(
+    await update.message.reply_text(
         message,
         reply_markup=reply_markup,
         parse_mode=ParseMode.HTML
     )
 
+# Поиск города справочника по названию, псевдониму или его части
+def find_city(query):
+    registry = cities.get_registry()
+    entry = registry.get(query)
+    if entry is None:
+        matches = registry.search(query, limit=1)
+        entry = registry.get(matches[0]) if matches else None
+    return entry["name"] if entry else None
+
+# Функция для подписки на объявления о новых мероприятиях города
+async def events_subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user = update.effective_user
+    query = " ".join(context.args)
+    
+    if not query:
+        subscribed = await db_async.get_event_subscriptions(user.id)
+        message = f"Вы подписаны на мероприятия: {', '.join(subscribed)}.\n\n" if subscribed else ""
+        await update.message.reply_text(
+            message + "Чтобы получать объявления о новых мероприятиях, отправьте "
+            "/events_subscribe и название города, например: /events_subscribe Алматы"
+        )
+        return
+    
+    city = find_city(query)
+    if city is None:
+        await update.message.reply_text("Город не найден. Попробуйте указать название иначе.")
+        return
+    
+    if await db_async.subscribe_events(user.id, city):
+        await update.message.reply_text(f"🔔 Вы будете получать объявления о новых мероприятиях: {city}.")
+    else:
+        await update.message.reply_text(f"Вы уже подписаны на мероприятия: {city}.")
+
+# Функция для отмены подписки на мероприятия (одного города или всех)
+async def events_unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user = update.effective_user
+    query = " ".join(context.args)
+    city = find_city(query) if query else None
+    
+    if query and city is None:
+        await update.message.reply_text("Город не найден. Попробуйте указать название иначе.")
+        return
+    
+    if await db_async.unsubscribe_events(user.id, city):
+        await update.message.reply_text("🔕 Подписка на мероприятия отменена.")
+    else:
+        await update.message.reply_text("У вас нет подписки на мероприятия.")
+
+# Функция для подписки на оповещения о превышении порога PM2.5 в городе
+async def air_subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user = update.effective_user
+    
+    threshold = None
+    if len(context.args) >= 2:
+        try:
+            threshold = float(context.args[-1].replace(",", "."))
+        except ValueError:
+            pass
+    if threshold is None:
+        subscriptions = await db_async.get_alert_subscriptions(user.id)
+        message = ""
+        if subscriptions:
+            message = "Ваши оповещения о качестве воздуха:\n" + "".join(
+                f"• {city}: PM2.5 выше {value:g} мкг/м³\n" for city, value in sorted(subscriptions.items())
+            ) + "\n"
+        await update.message.reply_text(
+            message + "Чтобы получить оповещение, когда PM2.5 в городе превысит порог, отправьте "
+            "/subscribe, название города и порог в мкг/м³, например: /subscribe Алматы 50"
+        )
+        return
+    
+    if not 0 < threshold <= alerts.MAX_THRESHOLD:
+        await update.message.reply_text(f"Порог PM2.5 должен быть от 0 до {alerts.MAX_THRESHOLD} мкг/м³.")
+        return
+    
+    city = find_city(" ".join(context.args[:-1]))
+    if city is None:
+        await update.message.reply_text("Город не найден. Попробуйте указать название иначе.")
+        return
+    
+    created = await db_async.subscribe_alerts(user.id, city, threshold)
+    message = (f"🔔 Оповещу вас, когда PM2.5 в городе {city} превысит {threshold:g} мкг/м³."
+               if created else f"Порог оповещения для города {city} изменен: {threshold:g} мкг/м³.")
+    # Оповещение приходит при пересечении порога; если он уже превышен, сообщаем сразу
+    pm25 = (get_city_data(city) or {}).get("pm25")
+    if pm25 is not None and pm25 > threshold:
+        message += f"\n\nСейчас PM2.5 уже выше порога: {pm25} мкг/м³."
+    await update.message.reply_text(message)
+
+# Функция для отмены оповещений о качестве воздуха (одного города или всех)
+async def air_unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user = update.effective_user
+    query = " ".join(context.args)
+    city = find_city(query) if query else None
+    
+    if query and city is None:
+        await update.message.reply_text("Город не найден. Попробуйте указать название иначе.")
+        return
+    
+    if await db_async.unsubscribe_alerts(user.id, city):
+        await update.message.reply_text("🔕 Оповещения о качестве воздуха отключены.")
+    else:
+        await update.message.reply_text("У вас нет оповещений о качестве воздуха.")
+
 # Функция для присоединения к мероприятию
-def join_event(update: Update, context: CallbackContext) -> None:
+async def join_event(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    query.edit_message_text(
+    await query.edit_message_text(
         text="Спасибо за интерес к мероприятию! В реальном проекте здесь будет форма для регистрации.\n\n"
              "Для получения дополнительной информации свяжитесь с организаторами или следите за обновлениями в нашем боте.",
         parse_mode=ParseMode.HTML
     )
 
 # Функция для просмотра своих отчетов
-def my_reports(update: Update, context: CallbackContext) -> None:
+async def my_reports(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
-    reports = database.get_user_reports(user.id)
+    reports = await db_async.get_user_reports(user.id)
     
     if not reports:
-        update.message.reply_text(
+        await update.message.reply_text(
             "У вас пока нет отчетов о проблемах. Вы можете создать новый отчет с помощью кнопки '📸 Сообщить о проблеме'."
         )
         return
@@ -529,84 +785,131 @@ def my_reports(update: Update, context: CallbackContext) -> None:
             f"Дата: {report['timestamp'].split('T')[0]}\n\n"
         )
     
-    update.message.reply_text(
+    await update.message.reply_text(
         message,
         parse_mode=ParseMode.HTML
     )
 
 # Функция для обработки текстовых сообщений
-def handle_message(update: Update, context: CallbackContext) -> None:
+async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     text = update.message.text
     
     if text == "📊 Экологическая информация":
-        eco_info(update, context)
+        await eco_info(update, context)
     elif text == "📸 Сообщить о проблеме":
-        report_problem(update, context)
+        await report_problem(update, context)
     elif text == "🌿 Эко-советы":
-        eco_tips(update, context)
+        await eco_tips(update, context)
     elif text == "📅 Волонтерские мероприятия":
-        show_events(update, context)
+        await show_events(update, context)
     elif text == "📋 Мои отчеты":
-        my_reports(update, context)
+        await my_reports(update, context)
     elif text == "🔙 Главное меню":
-        start(update, context)
+        await start(update, context)
     else:
-        update.message.reply_text(
+        await update.message.reply_text(
             "Извините, я не понимаю эту команду.\n"
             "Используйте кнопки меню для навигации или введите /help для справки."
         )
 
-# Основная функция
-def main() -> None:
-    # Создаем Updater и передаем ему токен бота
-    updater = Updater(TOKEN)
-    
-    # Получаем диспетчер для регистрации обработчиков
-    dispatcher = updater.dispatcher
+# Создание приложения бота с зарегистрированными обработчиками
+def build_application(token=TOKEN, **builder_options) -> Application:
+    builder = Application.builder().token(token).concurrent_updates(True)
+    # Разговоры и user_data хранятся в базе: незавершенный отчет переживает перезапуск
+    if persistence.PERSISTENCE_ENABLED and "persistence" not in builder_options:
+        builder.persistence(persistence.DatabasePersistence())
+    # Все запросы к Bot API проходят через очередь с ограничением частоты
+    if "rate_limiter" not in builder_options:
+        builder.rate_limiter(send_queue.SendScheduler())
+    for option, value in builder_options.items():
+        getattr(builder, option)(value)
+    application = builder.build()
     
     # Создаем обработчик разговора для отчетов о проблемах
+    # (шаг разговора сохраняется и в user_data, см. ReportResumeHandler)
+    states = {
+        PHOTO: [MessageHandler(filters.Regex("^(🗑️ Незаконная свалка|💧 Загрязнение воды|🏭 Промышленные выбросы|🚗 Транспортное загрязнение|🔙 Главное меню)$"), track_report_state(handle_problem_type))],
+        DESCRIPTION: [
+            MessageHandler(filters.PHOTO, track_report_state(handle_photo)),
+            CommandHandler("skip", track_report_state(skip_photo))
+        ],
+        LOCATION: [MessageHandler(filters.TEXT & ~filters.COMMAND, track_report_state(handle_description))]
+    }
+    fallbacks = [
+        CommandHandler("cancel", track_report_state(cancel)),
+        MessageHandler(filters.Regex("^🔙 Главное меню$"), track_report_state(cancel))
+    ]
+    # Черновик, к которому пользователь не возвращался DRAFT_TTL секунд, удаляется
+    # (нужна JobQueue; в вебхуке ее нет, и устаревшие черновики удаляет persistence)
+    states[ConversationHandler.TIMEOUT] = [TypeHandler(Update, report_timeout)]
     report_conv_handler = ConversationHandler(
         entry_points=[
-            CommandHandler("report", report_problem),
-            MessageHandler(Filters.regex("^📸 Сообщить о проблеме$"), report_problem)
+            CommandHandler("report", track_report_state(report_problem)),
+            MessageHandler(filters.Regex("^📸 Сообщить о проблеме$"), track_report_state(report_problem)),
+            ReportResumeHandler(application, states, fallbacks)
         ],
-        states={
-            PHOTO: [MessageHandler(Filters.regex("^(🗑️ Незаконная свалка|💧 Загрязнение воды|🏭 Промышленные выбросы|🚗 Транспортное загрязнение|🔙 Главное меню)$"), handle_problem_type)],
-            DESCRIPTION: [
-                MessageHandler(Filters.photo, handle_photo),
-                CommandHandler("skip", skip_photo)
-            ],
-            LOCATION: [MessageHandler(Filters.text & ~Filters.command, handle_description)]
-        },
-        fallbacks=[
-            CommandHandler("cancel", cancel),
-            MessageHandler(Filters.regex("^🔙 Главное меню$"), cancel)
-        ]
+        states=states,
+        fallbacks=fallbacks,
+        name="report",
+        persistent=application.persistence is not None,
+        # Сохраненный шаг отчета важнее состояния разговора в памяти экземпляра
+        allow_reentry=True,
+        conversation_timeout=persistence.DRAFT_TTL if application.job_queue else None
     )
     
     # Регистрируем обработчик разговора
-    dispatcher.add_handler(report_conv_handler)
+    application.add_handler(report_conv_handler)
     
     # Регистрируем обработчики команд
-    dispatcher.add_handler(CommandHandler("start", start))
-    dispatcher.add_handler(CommandHandler("help", help_command))
-    dispatcher.add_handler(CommandHandler("eco", eco_info))
-    dispatcher.add_handler(CommandHandler("tips", eco_tips))
-    dispatcher.add_handler(CommandHandler("events", show_events))
-    dispatcher.add_handler(CommandHandler("my_reports", my_reports))
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("eco", eco_info))
+    application.add_handler(CommandHandler("tips", eco_tips))
+    application.add_handler(CommandHandler("events", show_events))
+    application.add_handler(CommandHandler("events_subscribe", events_subscribe))
+    application.add_handler(CommandHandler("events_unsubscribe", events_unsubscribe))
+    application.add_handler(CommandHandler("subscribe", air_subscribe))
+    application.add_handler(CommandHandler("unsubscribe", air_unsubscribe))
+    application.add_handler(CommandHandler("my_reports", my_reports))
     
     # Регистрируем обработчики callback-запросов
-    dispatcher.add_handler(CallbackQueryHandler(city_info, pattern=r"^city_"))
-    dispatcher.add_handler(CallbackQueryHandler(show_map, pattern=r"^map_"))
-    dispatcher.add_handler(CallbackQueryHandler(back_to_cities, pattern=r"^back_to_cities"))
-    dispatcher.add_handler(CallbackQueryHandler(next_tip, pattern=r"^next_tip"))
-    dispatcher.add_handler(CallbackQueryHandler(join_event, pattern=r"^join_event"))
+    application.add_handler(CallbackQueryHandler(city_info, pattern=r"^city_"))
+    application.add_handler(CallbackQueryHandler(show_map, pattern=r"^map_"))
+    application.add_handler(CallbackQueryHandler(show_history, pattern=r"^history_"))
+    application.add_handler(CallbackQueryHandler(back_to_cities, pattern=r"^back_to_cities"))
+    application.add_handler(CallbackQueryHandler(cities_page, pattern=r"^cities_page_"))
+    application.add_handler(CallbackQueryHandler(next_tip, pattern=r"^next_tip"))
+    application.add_handler(CallbackQueryHandler(join_event, pattern=r"^join_event"))
+    
+    # Регистрируем обработчик поиска города в inline-режиме
+    application.add_handler(InlineQueryHandler(inline_city_search))
     
     # Регистрируем обработчик сообщений для всех остальных текстовых сообщений
-    dispatcher.add_handler(MessageHandler(Filters.text & ~Filters.command, handle_message))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     
     # Регистрируем обработчик местоположения
-    dispatcher.add_handler(MessageHandler(Filters.location, handle_location))
+    application.add_handler(MessageHandler(filters.LOCATION, handle_location))
+    
+    return application
+
+# Основная функция
+def main() -> None:
+    # Создаем приложение и передаем ему токен бота
+    application = build_application()
+    
+    # Уведомления о смене статуса отчетов и новых мероприятиях рассылаются в фоне
+    notifications.attach(application)
+    
+    # Фоновое обновление данных OpenWeather для всех городов справочника (если задан ключ API).
+    # Только в long polling: в вебхуке процесс может быть заморожен между вызовами,
+    # и данные загружаются при обращении к городу
+    provider = air_quality.get_provider()
+    if provider is not None:
+        # Пороги PM2.5 проверяются при каждом обновлении данных OpenWeather
+        alerts.attach(provider)
+        # История PM2.5 для трендов и графиков пополняется при тех же обновлениях
+        timeseries.attach(provider)
+        provider.watch(cities.get_registry().cities)
     
     # Выводим информацию о запуске
     print(f"EcoMap KZ Telegram бот запущен!")
@@ -615,8 +918,7 @@ def main() -> None:
     print(f"Для остановки бота нажмите Ctrl+C")
     
     # Запускаем бота
-    updater.start_polling()
-    updater.idle()
+    application.run_polling()
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
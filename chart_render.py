@@ -0,0 +1,102 @@
+"""
+Отрисовка графика PM2.5 в PNG для отправки в Telegram.
+
+Данные берутся из агрегатов истории (timeseries.py): линия среднего
+и полоса от минимума до максимума каждого слота. Подписи на изображении
+только цифрами и латиницей: шрифт Pillow по умолчанию не содержит
+кириллицы, поэтому название города передается в подписи к фотографии.
+"""
+
+from datetime import datetime
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont
+
+from air_quality import PM25_GOOD, PM25_MODERATE
+
+DEFAULT_WIDTH = 800
+DEFAULT_HEIGHT = 400
+
+# Поля вокруг области графика: слева, сверху, справа, снизу
+MARGINS = (48, 24, 16, 32)
+
+BACKGROUND_COLOR = (255, 255, 255)
+GRID_COLOR = (225, 225, 225)
+AXIS_COLOR = (90, 90, 90)
+LINE_COLOR = (56, 120, 200)
+BAND_COLOR = (200, 220, 245)
+# Линии порогов текстовой оценки качества воздуха
+GOOD_COLOR = (114, 176, 38)
+MODERATE_COLOR = (246, 151, 48)
+
+def render_history_png(points, step, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT):
+    """
+    Рисует график PM2.5 в PNG.
+
+    Args:
+        points (list): (начало слота (Unix), среднее, минимум, максимум)
+            по возрастанию времени, как возвращает TimeSeriesStore.series
+        step (int): Длительность слота, с (разрывы длиннее шага не соединяются)
+        width (int): Ширина изображения
+        height (int): Высота изображения
+
+    Returns:
+        bytes: Изображение в формате PNG
+    """
+    left, top, right, bottom = MARGINS[0], MARGINS[1], width - MARGINS[2], height - MARGINS[3]
+    image = Image.new("RGB", (width, height), BACKGROUND_COLOR)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+
+    start, end = points[0][0], points[-1][0] + step
+    y_max = max(max(high for _, _, _, high in points), PM25_MODERATE) * 1.1
+
+    def x_of(timestamp):
+        return left + (timestamp - start) / (end - start) * (right - left)
+
+    def y_of(value):
+        return bottom - value / y_max * (bottom - top)
+
+    # Сетка и подписи оси значений
+    grid_step = 10 if y_max <= 60 else 25 if y_max <= 150 else 50
+    for value in range(0, int(y_max) + 1, grid_step):
+        y = y_of(value)
+        draw.line((left, y, right, y), fill=GRID_COLOR)
+        draw.text((4, y - 6), str(value), fill=AXIS_COLOR, font=font)
+    for value, color in ((PM25_GOOD, GOOD_COLOR), (PM25_MODERATE, MODERATE_COLOR)):
+        draw.line((left, y_of(value), right, y_of(value)), fill=color, width=1)
+
+    # Подписи оси времени: не больше 8, по дням или по часам
+    time_format = "%d.%m" if end - start > 2 * 86400 else "%H:%M"
+    label_count = min(8, len(points))
+    for i in range(label_count):
+        timestamp = start + (end - start) * i / max(1, label_count - 1)
+        x = x_of(timestamp)
+        draw.line((x, bottom, x, bottom + 4), fill=AXIS_COLOR)
+        draw.text((x - 14, bottom + 8), datetime.fromtimestamp(timestamp).strftime(time_format),
+                  fill=AXIS_COLOR, font=font)
+
+    # Полоса минимум-максимум и линия среднего по непрерывным участкам
+    segments = [[]]
+    for point in points:
+        if segments[-1] and point[0] - segments[-1][-1][0] > step:
+            segments.append([])
+        segments[-1].append(point)
+    for segment in segments:
+        middle = [(x_of(t + step / 2), y_of(mean)) for t, mean, _, _ in segment]
+        if len(segment) == 1:
+            x, y = middle[0]
+            draw.ellipse((x - 2, y - 2, x + 2, y + 2), fill=LINE_COLOR)
+            continue
+        band = ([(x_of(t + step / 2), y_of(high)) for t, _, _, high in segment]
+                + [(x_of(t + step / 2), y_of(low)) for t, _, low, _ in reversed(segment)])
+        draw.polygon(band, fill=BAND_COLOR)
+        draw.line(middle, fill=LINE_COLOR, width=2)
+
+    draw.line((left, top, left, bottom), fill=AXIS_COLOR)
+    draw.line((left, bottom, right, bottom), fill=AXIS_COLOR)
+    draw.text((left + 6, 4), "PM2.5, ug/m3", fill=AXIS_COLOR, font=font)
+
+    buffer = BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
@@ -0,0 +1,167 @@
+"""
+Справочник городов Казахстана для выбора города в боте.
+
+Города и их альтернативные названия загружаются один раз из
+data/kz_cities.json. Клавиатуры выбора города строятся заранее
+и разбиты на страницы, а поиск по названиям (для inline-запросов)
+выполняется по индексу в памяти: префиксному (отсортированный список
+с бинарным поиском) и триграммному для неточных совпадений.
+"""
+
+import bisect
+import json
+import threading
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from geo import CITIES_FILE, fold
+
+# Количество городов на странице клавиатуры и кнопок в ряду
+PAGE_SIZE = 10
+ROW_SIZE = 2
+
+# Разделители, которые не учитываются при поиске
+_SEPARATORS = str.maketrans("", "", "- .")
+
+def normalize(text):
+    """Название в форме для поиска: нижний регистр, без дефисов и пробелов"""
+    return fold(text).translate(_SEPARATORS)
+
+def trigrams(text):
+    """Триграммы нормализованного названия (с границами слова)"""
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class CityRegistry:
+    """
+    Справочник городов с клавиатурами и поиском.
+
+    Args:
+        cities (list): Города: словари с полями name, aliases, region, lat, lon
+    """
+
+    def __init__(self, cities):
+        self.cities = {city["name"]: city for city in cities}
+        self.names = [city["name"] for city in cities]
+        self._pages = [self.names[i:i + PAGE_SIZE] for i in range(0, len(self.names), PAGE_SIZE)]
+        # Порядок городов в файле (крупные города первыми) используется для сортировки результатов
+        self._rank = {name: i for i, name in enumerate(self.names)}
+
+        # Название или псевдоним (нормализованные) -> город
+        self._keys = {}
+        for city in cities:
+            for key in [city["name"]] + city.get("aliases", []):
+                self._keys.setdefault(normalize(key), city["name"])
+        self._sorted_keys = sorted(self._keys)
+
+        # Триграмма -> нормализованные названия, в которых она встречается
+        self._trigrams = {}
+        for key in self._keys:
+            for trigram in trigrams(key):
+                self._trigrams.setdefault(trigram, []).append(key)
+
+        self._keyboards = [self._build_keyboard(page) for page in range(len(self._pages))]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.cities
+
+    def get(self, name):
+        """Город по названию или псевдониму (None, если не найден)"""
+        city = self.cities.get(name)
+        if city is None:
+            canonical = self._keys.get(normalize(name))
+            city = self.cities.get(canonical) if canonical else None
+        return city
+
+    @property
+    def page_count(self):
+        return len(self._pages)
+
+    def page_of(self, name):
+        """Номер страницы клавиатуры, на которой находится город"""
+        return self._rank.get(name, 0) // PAGE_SIZE
+
+    def _build_keyboard(self, page):
+        """Клавиатура страницы: кнопки городов, навигация и поиск"""
+        names = self._pages[page]
+        keyboard = [
+            [InlineKeyboardButton(name, callback_data=f"city_{name}") for name in names[i:i + ROW_SIZE]]
+            for i in range(0, len(names), ROW_SIZE)
+        ]
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton("«", callback_data=f"cities_page_{page - 1}"))
+        if self.page_count > 1:
+            navigation.append(InlineKeyboardButton(f"{page + 1}/{self.page_count}", callback_data="cities_page_noop"))
+        if page < self.page_count - 1:
+            navigation.append(InlineKeyboardButton("»", callback_data=f"cities_page_{page + 1}"))
+        if navigation:
+            keyboard.append(navigation)
+        keyboard.append([InlineKeyboardButton("🔍 Поиск города", switch_inline_query_current_chat="")])
+        return InlineKeyboardMarkup(keyboard)
+
+    def keyboard(self, page=0):
+        """Готовая клавиатура выбора города для страницы"""
+        return self._keyboards[max(0, min(page, self.page_count - 1))]
+
+    def search(self, query, limit=10):
+        """
+        Поиск городов по началу названия или псевдонима, а если таких
+        мало — по совпадению триграмм (опечатки, часть слова).
+
+        Args:
+            query (str): Строка поиска
+            limit (int): Максимальное количество результатов
+
+        Returns:
+            list: Названия городов в порядке релевантности
+        """
+        key = normalize(query)
+        if not key:
+            return self.names[:limit]
+
+        results = []
+        # Совпадения по началу: ключи с префиксом идут подряд в отсортированном списке
+        i = bisect.bisect_left(self._sorted_keys, key)
+        while i < len(self._sorted_keys) and self._sorted_keys[i].startswith(key):
+            name = self._keys[self._sorted_keys[i]]
+            if name not in results:
+                results.append(name)
+            i += 1
+        results.sort(key=self._rank.get)
+        if len(results) >= limit or len(key) < 3:
+            return results[:limit]
+
+        # Неточные совпадения: ключи с наибольшей долей общих триграмм
+        query_trigrams = trigrams(key)
+        scores = {}
+        for trigram in query_trigrams:
+            for candidate in self._trigrams.get(trigram, ()):
+                scores[candidate] = scores.get(candidate, 0) + 1
+        ranked = sorted(scores.items(), key=lambda item: -item[1] / (len(query_trigrams) + len(item[0])))
+        for candidate, score in ranked:
+            # Отбрасываем случайные совпадения: меньше трети триграмм запроса
+            if score * 3 < len(query_trigrams):
+                continue
+            name = self._keys[candidate]
+            if name not in results:
+                results.append(name)
+            if len(results) >= limit:
+                break
+        return results
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """Справочник городов (загружается при первом обращении)"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                with open(CITIES_FILE, 'r', encoding='utf-8') as f:
+                    _registry = CityRegistry(json.load(f))
+    return _registry
@@ -0,0 +1,81 @@
+"""
+Счетчики отчетов по городам: общее количество, по типам проблем и по статусам.
+
+Счетчики хранятся в базе данных и обновляются при каждом изменении отчета,
+поэтому статистика города читается без перебора отчетов. Функции модуля
+используются бэкендами для инкрементального обновления и для пересчета
+счетчиков с нуля.
+"""
+
+def empty_stats():
+    """Пустые счетчики города"""
+    return {"total": 0, "by_type": {}, "by_status": {}}
+
+def _inc(counts, key, delta):
+    """Изменение счетчика с удалением нулевых значений"""
+    value = counts.get(key, 0) + delta
+    if value:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
+
+def add_report_to_stats(stats, report, delta=1):
+    """
+    Учет отчета в счетчиках города.
+
+    Args:
+        stats (dict): Счетчики города (см. empty_stats)
+        report (dict): Отчет
+        delta (int): 1 для добавления отчета, -1 для исключения
+    """
+    stats["total"] += delta
+    _inc(stats["by_type"], report["problem_type"], delta)
+    _inc(stats["by_status"], report["status"], delta)
+
+def change_status_in_stats(stats, old_status, new_status):
+    """Перенос отчета между счетчиками статусов"""
+    if old_status != new_status:
+        _inc(stats["by_status"], old_status, -1)
+        _inc(stats["by_status"], new_status, 1)
+
+def compute_city_stats(reports):
+    """
+    Пересчет счетчиков с нуля.
+
+    Args:
+        reports (iterable): Отчеты с полем city
+
+    Returns:
+        dict: Счетчики по городам {city: stats}
+    """
+    result = {}
+    for report in reports:
+        if report.get("city"):
+            add_report_to_stats(result.setdefault(report["city"], empty_stats()), report)
+    return result
+
+def diff_city_stats(expected, actual):
+    """
+    Сравнение пересчитанных счетчиков с сохраненными.
+
+    Args:
+        expected (dict): Пересчитанные счетчики {city: stats}
+        actual (dict): Сохраненные счетчики {city: stats}
+
+    Returns:
+        list: Расхождения в виде строк "город: поле ожидалось X, было Y"
+    """
+    problems = []
+    for city in sorted(set(expected) | set(actual)):
+        exp = expected.get(city, empty_stats())
+        act = actual.get(city, empty_stats())
+        if exp["total"] != act.get("total", 0):
+            problems.append(f"{city}: total ожидалось {exp['total']}, было {act.get('total', 0)}")
+        for field in ("by_type", "by_status"):
+            act_counts = act.get(field, {})
+            for key in sorted(set(exp[field]) | set(act_counts)):
+                if exp[field].get(key, 0) != act_counts.get(key, 0):
+                    problems.append(
+                        f"{city}: {field}[{key}] ожидалось {exp[field].get(key, 0)}, было {act_counts.get(key, 0)}"
+                    )
+    return problems
@@ -2,21 +2,51 @@
 Модуль для работы с базой данных EcoMap KZ.
 В данном примере используется простая реализация на основе JSON-файла.
 В реальном проекте рекомендуется использовать SQLite или PostgreSQL.
+
+Данные загружаются в память один раз и индексируются по id, пользователю,
+статусу и координатам, а изменения дописываются в журнал операций (см. journal.py)
+вместо перезаписи всего файла.
 """
 
+import bisect
+import copy
 import json
+import math
 import os
+import threading
+import time
 from datetime import datetime
 
-# Путь к файлу с данными пользовательских отчетов
+from city_stats import (add_report_to_stats, change_status_in_stats, compute_city_stats,
+                        diff_city_stats, empty_stats)
+from geo import location_coords, nearest_cities, parse_coordinates, resolve_city
+from journal import Journal
+from spatial import GridIndex
+
+# Путь к файлу с данными пользовательских отчетов (снимок)
 DATA_FILE = "user_reports.json"
 
+# Путь к журналу операций, выполненных после снимка
+LOG_FILE = "user_reports.log"
+
 # Структура для хранения данных
 default_data = {
     "reports": [],
-    "users": {}
+    "users": {},
+    "city_stats": {},
+    "bot_state": {},
+    "events": [],
+    "event_subscriptions": {},
+    "air_alerts": {},
+    "notifications": [],
+    "notification_seq": 0
 }
 
+# Резидентное хранилище и журнал (инициализируются при первом обращении)
+_store = None
+_journal = None
+_lock = threading.RLock()
+
 def init_db():
     """Инициализация базы данных"""
     if not os.path.exists(DATA_FILE):
@@ -26,92 +56,683 @@ def init_db():
     else:
         print(f"База данных уже существует: {DATA_FILE}")
 
+class ReportStore:
+    """
+    Данные отчетов в памяти с индексами по id, user_id, статусу, городу
+    и пространственным индексом по координатам.
+
+    Все изменения проходят через apply(), который поддерживает индексы
+    и счетчики по городам (data["city_stats"]) в согласованном состоянии.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.by_id = {}
+        self.by_user = {}
+        self.by_status = {}
+        self.by_city = {}
+        self.grid = GridIndex()
+        # Пороги оповещений о качестве воздуха по пользователям: user_id -> {город: порог}
+        self.alerts_by_user = {}
+        for report in data["reports"]:
+            self._index(report)
+        if "city_stats" not in data:
+            data["city_stats"] = compute_city_stats(data["reports"])
+        data.setdefault("bot_state", {})
+        data.setdefault("events", [])
+        # Подписчики мероприятий города: отсортированный список user_id
+        data.setdefault("event_subscriptions", {})
+        # Оповещения о качестве воздуха: город -> отсортированный список [порог PM2.5, user_id]
+        data.setdefault("air_alerts", {})
+        for city, subscriptions in data["air_alerts"].items():
+            for threshold, user_id in subscriptions:
+                self.alerts_by_user.setdefault(user_id, {})[city] = threshold
+        # Задания рассылки: хранятся только незавершенные (завершенные удаляются),
+        # notification_seq — последний выданный ID задания
+        notifications = data.setdefault("notifications", [])
+        data.setdefault("notification_seq", max((n["id"] for n in notifications), default=0))
+        data["notifications"] = [n for n in notifications if n["done_at"] is None]
+        self.pending_notifications = {n["id"]: n for n in data["notifications"]}
+
+    def _index(self, report):
+        """Добавление отчета в индексы"""
+        # Отчеты, созданные до появления поля city, дополняем при загрузке
+        if "city" not in report:
+            report["city"] = resolve_city(report.get("location"))
+        if "lat" not in report:
+            report["lat"], report["lon"] = location_coords(report.get("location")) or (None, None)
+        self.by_id[report["id"]] = report
+        self.by_user.setdefault(report["user_id"], []).append(report)
+        self.by_status.setdefault(report["status"], {})[report["id"]] = report
+        if report["city"]:
+            self.by_city.setdefault(report["city"], {})[report["id"]] = report
+        if report["lat"] is not None:
+            self.grid.add(report)
+
+    def apply(self, op):
+        """Применение операции журнала к данным и индексам"""
+        if op["op"] == "add_report":
+            report = op["report"]
+            self.data["reports"].append(report)
+            self._index(report)
+            if report["city"]:
+                add_report_to_stats(self.data["city_stats"].setdefault(report["city"], empty_stats()), report)
+
+            user_key = str(report["user_id"])
+            if user_key not in self.data["users"]:
+                self.data["users"][user_key] = {
+                    "username": report["username"],
+                    "reports_count": 1,
+                    "joined_at": report["timestamp"]
+                }
+            else:
+                self.data["users"][user_key]["reports_count"] += 1
+        elif op["op"] == "update_status":
+            report = self.by_id.get(op["id"])
+            if report is None:
+                return
+            self.by_status[report["status"]].pop(report["id"], None)
+            if report["city"]:
+                change_status_in_stats(self.data["city_stats"].setdefault(report["city"], empty_stats()),
+                                       report["status"], op["status"])
+            report["status"] = op["status"]
+            self.by_status.setdefault(report["status"], {})[report["id"]] = report
+            if op.get("notification"):
+                self._add_notification(op["notification"])
+        elif op["op"] == "set_city":
+            for report_id, city in op["changes"]:
+                report = self.by_id.get(report_id)
+                if report is None or report["city"] == city:
+                    continue
+                if report["city"]:
+                    self.by_city[report["city"]].pop(report_id, None)
+                    add_report_to_stats(self.data["city_stats"][report["city"]], report, -1)
+                report["city"] = city
+                if city:
+                    self.by_city.setdefault(city, {})[report_id] = report
+                    add_report_to_stats(self.data["city_stats"].setdefault(city, empty_stats()), report)
+        elif op["op"] == "add_event":
+            self.data["events"].append(op["event"])
+            if op["notification"]:
+                self._add_notification(op["notification"])
+        elif op["op"] == "subscribe_events":
+            subscribers = self.data["event_subscriptions"].setdefault(op["city"], [])
+            position = bisect.bisect_left(subscribers, op["user_id"])
+            if position == len(subscribers) or subscribers[position] != op["user_id"]:
+                subscribers.insert(position, op["user_id"])
+        elif op["op"] == "unsubscribe_events":
+            for city, subscribers in self.data["event_subscriptions"].items():
+                position = bisect.bisect_left(subscribers, op["user_id"])
+                if (op["city"] in (None, city) and position < len(subscribers)
+                        and subscribers[position] == op["user_id"]):
+                    del subscribers[position]
+        elif op["op"] == "subscribe_alerts":
+            self._remove_alert(op["user_id"], op["city"])
+            bisect.insort(self.data["air_alerts"].setdefault(op["city"], []), [op["threshold"], op["user_id"]])
+            self.alerts_by_user.setdefault(op["user_id"], {})[op["city"]] = op["threshold"]
+        elif op["op"] == "unsubscribe_alerts":
+            cities = [op["city"]] if op["city"] else list(self.alerts_by_user.get(op["user_id"], {}))
+            for city in cities:
+                self._remove_alert(op["user_id"], city)
+        elif op["op"] == "add_notification":
+            self._add_notification(op["notification"])
+        elif op["op"] == "notification_progress":
+            notification = self.pending_notifications.get(op["id"])
+            if notification is None:
+                return
+            notification.update(cursor=op["cursor"], sent=op["sent"], failed=op["failed"])
+            if op["done_at"]:
+                del self.pending_notifications[op["id"]]
+                self.data["notifications"] = [n for n in self.data["notifications"] if n is not notification]
+        elif op["op"] == "save_state":
+            for kind, key, value in op["changes"]:
+                entries = self.data["bot_state"].setdefault(kind, {})
+                if value is None:
+                    entries.pop(key, None)
+                else:
+                    entries[key] = [value, op["updated_at"]]
+        elif op["op"] == "purge_state":
+            for entries in self.data["bot_state"].values():
+                for key in [key for key, (_, updated_at) in entries.items() if updated_at < op["before"]]:
+                    del entries[key]
+
+    def _add_notification(self, notification):
+        """Добавление задания рассылки в очередь незавершенных"""
+        self.data["notifications"].append(notification)
+        self.pending_notifications[notification["id"]] = notification
+        self.data["notification_seq"] = max(self.data["notification_seq"], notification["id"])
+
+    def _remove_alert(self, user_id, city):
+        """Удаление порога оповещения пользователя для города (если он есть)"""
+        thresholds = self.alerts_by_user.get(user_id, {})
+        if city not in thresholds:
+            return
+        subscriptions = self.data["air_alerts"][city]
+        del subscriptions[bisect.bisect_left(subscriptions, [thresholds.pop(city), user_id])]
+        if not thresholds:
+            del self.alerts_by_user[user_id]
+
+def _get_store():
+    """Получение хранилища (загружается с диска при первом обращении)"""
+    global _store, _journal
+    if _store is None:
+        with _lock:
+            if _store is None:
+                if not os.path.exists(DATA_FILE):
+                    init_db()
+                journal = Journal(DATA_FILE, LOG_FILE)
+                store = ReportStore(journal.load_snapshot(copy.deepcopy(default_data)))
+                journal.replay(store.apply)
+                _journal = journal
+                _store = store
+    return _store
+
+def _write(op):
+    """Запись операции в журнал и применение ее к данным в памяти"""
+    store = _get_store()
+    # Сначала журнал: если запись на диск не удалась, данные в памяти не меняются
+    compact = _journal.append(op)
+    store.apply(op)
+    if compact:
+        _journal.compact(store.data)
+
+def get_data_version():
+    """
+    Версия данных отчетов: увеличивается при каждом изменении.
+    Используется для инвалидации кешей, построенных по отчетам.
+    """
+    _get_store()
+    return _journal.seq
+
 def get_data():
-    """Получение всех данных из файла"""
-    if not os.path.exists(DATA_FILE):
-        init_db()
-    
-    try:
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        print(f"Ошибка чтения файла {DATA_FILE}. Создание новой структуры данных.")
-        return default_data
+    """
+    Получение всех данных.
+
+    Возвращаются сами данные хранилища, а не копия: их нельзя изменять
+    (только через функции модуля), а согласованное чтение нескольких
+    значений выполняется под _lock. Отдельные отчеты, события и т. п.
+    возвращают копии остальные функции модуля.
+    """
+    return _get_store().data
 
 def save_data(data):
-    """Сохранение данных в файл"""
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    """Сохранение полного снимка данных в файл"""
+    global _store
+    with _lock:
+        _get_store()
+        _store = ReportStore(data)
+        _journal.compact(data)
+
+def close_db():
+    """Закрытие журнала и выгрузка данных из памяти"""
+    global _store, _journal
+    with _lock:
+        if _journal:
+            _journal.close()
+        _store = None
+        _journal = None
 
 def add_report(user_id, username, problem_type, description, location, photo_id=None):
     """Добавление нового отчета о проблеме"""
-    data = get_data()
-    
-    # Создаем новый отчет
-    report = {
-        "id": len(data["reports"]) + 1,
-        "user_id": user_id,
-        "username": username,
-        "problem_type": problem_type,
-        "description": description,
-        "location": location,
-        "photo_id": photo_id,
-        "timestamp": datetime.now().isoformat(),
-        "status": "new"  # new, in-progress, resolved
-    }
-    
-    # Добавляем отчет в список
-    data["reports"].append(report)
-    
-    # Обновляем информацию о пользователе
-    if str(user_id) not in data["users"]:
-        data["users"][str(user_id)] = {
+    with _lock:
+        data = get_data()
+
+        # Создаем новый отчет
+        lat, lon = location_coords(location) or (None, None)
+        report = {
+            "id": len(data["reports"]) + 1,
+            "user_id": user_id,
             "username": username,
-            "reports_count": 1,
-            "joined_at": datetime.now().isoformat()
+            "problem_type": problem_type,
+            "description": description,
+            "location": location,
+            "city": resolve_city(location),
+            "lat": lat,
+            "lon": lon,
+            "photo_id": photo_id,
+            "timestamp": datetime.now().isoformat(),
+            "status": "new"  # new, in-progress, resolved
         }
-    else:
-        data["users"][str(user_id)]["reports_count"] += 1
-    
-    # Сохраняем изменения
-    save_data(data)
-    
+
+        # Добавляем отчет и обновляем информацию о пользователе
+        _write({"op": "add_report", "report": report})
+
     return report["id"]
 
 def get_user_reports(user_id):
-    """Получение отчетов пользователя"""
-    data = get_data()
-    return [report for report in data["reports"] if report["user_id"] == user_id]
+    """Получение отчетов пользователя (копии)"""
+    with _lock:
+        return [dict(report) for report in _get_store().by_user.get(user_id, [])]
+
+def _iso(value):
+    """Приведение даты к строке ISO для сравнения с timestamp"""
+    if value is None or isinstance(value, str):
+        return value
+    return value.isoformat()
+
+def _after(reports, after_id):
+    """Позиция первого отчета с id больше after_id в списке, упорядоченном по id"""
+    lo, hi = 0, len(reports)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if reports[mid]["id"] <= after_id:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def iter_reports(city=None, status=None, problem_type=None, date_from=None, date_to=None,
+                 fields=None, after_id=None, limit=None):
+    """
+    Потоковый перебор отчетов по фильтрам в порядке возрастания id.
+
+    Args:
+        city (str): Город
+        status (str): Статус отчета
+        problem_type (str): Тип проблемы
+        date_from (datetime|str): Начало периода (включительно)
+        date_to (datetime|str): Конец периода (не включительно)
+        fields (list): Возвращаемые поля (по умолчанию все)
+        after_id (int): Курсор: вернуть отчеты с id больше указанного
+        limit (int): Максимальное количество отчетов
+
+    Yields:
+        dict: Копия отчета (или его часть с полями fields)
+    """
+    store = _get_store()
+    with _lock:
+        if status is not None:
+            by_status = store.by_status.get(status, {})
+            reports = [by_status[report_id] for report_id in sorted(by_status)]
+        elif city is not None:
+            by_city = store.by_city.get(city, {})
+            reports = [by_city[report_id] for report_id in sorted(by_city)]
+        else:
+            # Список отчетов только дополняется: читаем отчеты, существовавшие на момент вызова
+            reports = store.data["reports"]
+        end = len(reports)
+    date_from, date_to = _iso(date_from), _iso(date_to)
+
+    start = _after(reports, after_id) if after_id is not None else 0
+    for i in range(start, end):
+        if limit is not None and limit <= 0:
+            return
+        report = reports[i]
+        if city is not None and report.get("city") != city:
+            continue
+        if problem_type is not None and report["problem_type"] != problem_type:
+            continue
+        if date_from is not None and report["timestamp"] < date_from:
+            continue
+        if date_to is not None and report["timestamp"] >= date_to:
+            continue
+        if limit is not None:
+            limit -= 1
+        yield {f: report.get(f) for f in fields} if fields else dict(report)
+
+def query_reports(limit=50, **filters):
+    """
+    Получение страницы отчетов.
+
+    Args:
+        limit (int): Размер страницы
+        **filters: Фильтры и курсор after_id, как у iter_reports
+
+    Returns:
+        dict: {"reports": [...], "next_cursor": id для следующей страницы или None}
+    """
+    fields = filters.pop("fields", None)
+    reports = list(iter_reports(limit=limit + 1, **filters))
+    next_cursor = reports[limit - 1]["id"] if len(reports) > limit else None
+    reports = reports[:limit]
+    if fields:
+        reports = [{f: report.get(f) for f in fields} for report in reports]
+    return {"reports": reports, "next_cursor": next_cursor}
+
+def count_reports(**filters):
+    """Подсчет отчетов по фильтрам без загрузки списка"""
+    if not filters:
+        return len(_get_store().data["reports"])
+    if list(filters) == ["status"]:
+        return len(_get_store().by_status.get(filters["status"], {}))
+    if list(filters) == ["city"]:
+        return get_data()["city_stats"].get(filters["city"], empty_stats())["total"]
+    return sum(1 for _ in iter_reports(**filters))
 
 def get_all_reports():
     """Получение всех отчетов"""
-    data = get_data()
-    return data["reports"]
+    return list(iter_reports())
 
 def get_report_by_id(report_id):
-    """Получение отчета по ID"""
-    data = get_data()
-    for report in data["reports"]:
-        if report["id"] == report_id:
-            return report
-    return None
+    """Получение отчета по ID (копия) или None"""
+    with _lock:
+        report = _get_store().by_id.get(report_id)
+        return dict(report) if report is not None else None
+
+def get_reports_by_status(status):
+    """Получение отчетов с указанным статусом (копии)"""
+    with _lock:
+        return [dict(report) for report in _get_store().by_status.get(status, {}).values()]
+
+def _notification(data, kind, payload, user_id=None, city=None):
+    """
+    Новое задание рассылки (см. notifications.py): личное уведомление
+    пользователю user_id или объявление подписчикам города city.
+    """
+    return {
+        "id": data["notification_seq"] + 1,
+        "kind": kind,
+        "user_id": user_id,
+        "city": city,
+        "payload": payload,
+        "cursor": 0,
+        "sent": 0,
+        "failed": 0,
+        "created_at": datetime.now().isoformat(),
+        "done_at": None
+    }
 
 def update_report_status(report_id, new_status):
-    """Обновление статуса отчета"""
-    data = get_data()
-    for report in data["reports"]:
-        if report["id"] == report_id:
-            report["status"] = new_status
-            save_data(data)
-            return True
-    return False
+    """Обновление статуса отчета (автору отчета ставится в очередь уведомление)"""
+    with _lock:
+        report = get_report_by_id(report_id)
+        if report is None:
+            return False
+        op = {"op": "update_status", "id": report_id, "status": new_status}
+        if report["status"] != new_status:
+            # Уведомление записывается той же операцией журнала, что и статус
+            op["notification"] = _notification(
+                get_data(), "status",
+                {"report_id": report_id, "status": new_status, "problem_type": report["problem_type"]},
+                user_id=report["user_id"]
+            )
+        _write(op)
+    return True
+
+def reports_near(lat, lon, radius_km, limit=None):
+    """
+    Отчеты в радиусе от точки, от ближайших к дальним.
+
+    Args:
+        lat (float): Широта
+        lon (float): Долгота
+        radius_km (float): Радиус поиска в километрах
+        limit (int): Максимальное количество отчетов
+
+    Returns:
+        list: Отчеты с дополнительным полем distance_km
+    """
+    with _lock:
+        found = _get_store().grid.near(lat, lon, radius_km)[:limit]
+        return [dict(report, distance_km=round(distance, 3)) for distance, report in found]
+
+def reports_in_bbox(min_lat, min_lon, max_lat, max_lon):
+    """Отчеты внутри прямоугольника координат (копии)"""
+    with _lock:
+        return [dict(report) for report in _get_store().grid.in_bbox(min_lat, min_lon, max_lat, max_lon)]
+
+def get_city_stats(city):
+    """
+    Получение счетчиков отчетов города.
+
+    Returns:
+        dict: {"total": n, "by_type": {...}, "by_status": {...}}
+    """
+    with _lock:
+        return copy.deepcopy(get_data()["city_stats"].get(city, empty_stats()))
+
+def rebuild_city_stats():
+    """
+    Пересчет счетчиков по городам с нуля и сверка с сохраненными.
+
+    Returns:
+        list: Найденные расхождения (пустой список, если счетчики верны)
+    """
+    with _lock:
+        data = get_data()
+        expected = compute_city_stats(data["reports"])
+        problems = diff_city_stats(expected, data["city_stats"])
+        data["city_stats"] = expected
+        _journal.compact(data)
+    return problems
+
+def reclassify_cities():
+    """
+    Повторное определение города у отчетов с координатами из Telegram
+    по ближайшему центру города или района (для всех отчетов сразу).
+
+    Returns:
+        tuple: (количество отчетов с координатами, количество отчетов, у которых изменился город)
+    """
+    with _lock:
+        reports = [report for report in get_data()["reports"]
+                   if report["lat"] is not None and parse_coordinates(report.get("location"))]
+        cities = nearest_cities([(report["lat"], report["lon"]) for report in reports])
+        changes = [[report["id"], city] for report, city in zip(reports, cities) if report["city"] != city]
+        if changes:
+            _write({"op": "set_city", "changes": changes})
+    return len(reports), len(changes)
+
+def add_event(name, date, location, description, city=None):
+    """
+    Добавление мероприятия и объявления о нем подписчикам города.
+
+    Returns:
+        dict: Мероприятие
+    """
+    with _lock:
+        data = get_data()
+        event = {
+            "id": len(data["events"]) + 1,
+            "name": name,
+            "date": date,
+            "location": location,
+            "description": description,
+            "city": city,
+            "created_at": datetime.now().isoformat()
+        }
+        notification = _notification(data, "event", event, city=city) if city else None
+        _write({"op": "add_event", "event": event, "notification": notification})
+    return event
+
+def get_events():
+    """Мероприятия, добавленные через add_event (копии)"""
+    with _lock:
+        return [dict(event) for event in get_data()["events"]]
+
+def subscribe_events(user_id, city):
+    """
+    Подписка пользователя на новые мероприятия города.
+
+    Returns:
+        bool: True, если подписки еще не было
+    """
+    with _lock:
+        if get_event_subscriptions(user_id, city):
+            return False
+        _write({"op": "subscribe_events", "user_id": user_id, "city": city})
+    return True
+
+def unsubscribe_events(user_id, city=None):
+    """
+    Отмена подписки на мероприятия города (city=None — всех городов).
+
+    Returns:
+        int: Количество отмененных подписок
+    """
+    with _lock:
+        count = len(get_event_subscriptions(user_id, city))
+        if count:
+            _write({"op": "unsubscribe_events", "user_id": user_id, "city": city})
+    return count
+
+def get_event_subscriptions(user_id, city=None):
+    """Города, на мероприятия которых подписан пользователь"""
+    result = []
+    with _lock:
+        for name, subscribers in get_data()["event_subscriptions"].items():
+            position = bisect.bisect_left(subscribers, user_id)
+            if city in (None, name) and position < len(subscribers) and subscribers[position] == user_id:
+                result.append(name)
+    return result
+
+def get_event_subscribers(city, after=0, limit=1000):
+    """
+    Очередная порция подписчиков мероприятий города.
+
+    Args:
+        city (str): Город
+        after (int): Вернуть подписчиков с user_id больше этого
+        limit (int): Размер порции
+
+    Returns:
+        list: user_id по возрастанию
+    """
+    with _lock:
+        subscribers = get_data()["event_subscriptions"].get(city, [])
+        position = bisect.bisect_right(subscribers, after)
+        return subscribers[position:position + limit]
+
+def subscribe_alerts(user_id, city, threshold):
+    """
+    Подписка на оповещения о превышении порога PM2.5 в городе
+    (прежний порог этого города заменяется).
+
+    Returns:
+        bool: True, если подписки на этот город еще не было
+    """
+    with _lock:
+        created = city not in get_alert_subscriptions(user_id)
+        _write({"op": "subscribe_alerts", "user_id": user_id, "city": city, "threshold": threshold})
+    return created
+
+def unsubscribe_alerts(user_id, city=None):
+    """
+    Отмена оповещений о качестве воздуха города (city=None — всех городов).
+
+    Returns:
+        int: Количество отмененных подписок
+    """
+    with _lock:
+        thresholds = get_alert_subscriptions(user_id)
+        count = len(thresholds) if city is None else int(city in thresholds)
+        if count:
+            _write({"op": "unsubscribe_alerts", "user_id": user_id, "city": city})
+    return count
+
+def get_alert_subscriptions(user_id):
+    """Пороги оповещений пользователя: {город: порог PM2.5}"""
+    with _lock:
+        return dict(_get_store().alerts_by_user.get(user_id, {}))
+
+def get_alert_subscribers(city, low, high):
+    """
+    Подписчики оповещений города с порогом в интервале [low, high):
+    те, для кого PM2.5, поднявшись с low до high, превысил порог.
+
+    Returns:
+        list: user_id
+    """
+    with _lock:
+        subscriptions = get_data()["air_alerts"].get(city, [])
+        start = bisect.bisect_left(subscriptions, [low, -math.inf])
+        end = bisect.bisect_left(subscriptions, [high, -math.inf])
+        return [user_id for _, user_id in subscriptions[start:end]]
+
+def add_alert_notification(city, payload):
+    """Постановка в очередь оповещения о качестве воздуха (адресаты — payload["recipients"])"""
+    with _lock:
+        _write({"op": "add_notification", "notification": _notification(get_data(), "air", payload, city=city)})
+
+def get_pending_notifications(limit=100):
+    """Незавершенные задания рассылки в порядке создания"""
+    with _lock:
+        # В data["notifications"] только незавершенные задания
+        return copy.deepcopy(get_data()["notifications"][:limit])
+
+def save_notification_progress(notification_id, cursor, sent, failed, done=False):
+    """
+    Сохранение прогресса задания рассылки (контрольная точка).
+
+    Args:
+        notification_id (int): ID задания
+        cursor (int): Наибольший user_id, до которого рассылка выполнена
+        sent (int): Отправлено сообщений
+        failed (int): Не доставлено сообщений
+        done (bool): Задание завершено
+    """
+    with _lock:
+        _write({"op": "notification_progress", "id": notification_id, "cursor": cursor, "sent": sent,
+                "failed": failed, "done_at": datetime.now().isoformat() if done else None})
+
+def load_bot_state(kind, since=None):
+    """
+    Загрузка состояния бота (см. persistence.py).
+
+    Args:
+        kind (str): Вид состояния, например "user_data" или "conversation:report"
+        since (float): Не возвращать записи, измененные раньше (время Unix)
+
+    Returns:
+        dict: {ключ: значение}
+    """
+    with _lock:
+        entries = get_data()["bot_state"].get(kind, {})
+        return {key: copy.deepcopy(value) for key, (value, updated_at) in entries.items()
+                if since is None or updated_at >= since}
+
+def get_bot_state(entries, since=None):
+    """
+    Загрузка отдельных записей состояния бота (обновление перед обработкой
+    обновления в вебхуке, см. persistence.py).
+
+    Args:
+        entries (list): Пары (вид, ключ)
+        since (float): Не возвращать записи, измененные раньше (время Unix)
+
+    Returns:
+        dict: {(вид, ключ): (значение, время изменения (Unix))} для найденных записей
+    """
+    result = {}
+    with _lock:
+        state = get_data()["bot_state"]
+        for kind, key in entries:
+            entry = state.get(kind, {}).get(key)
+            if entry and (since is None or entry[1] >= since):
+                result[(kind, key)] = (copy.deepcopy(entry[0]), entry[1])
+    return result
+
+def save_bot_state(changes):
+    """
+    Запись изменений состояния бота одной операцией.
+
+    Args:
+        changes (list): Тройки (вид, ключ, значение); значение None удаляет запись
+
+    Returns:
+        float: Время изменения записанных записей (Unix)
+    """
+    updated_at = time.time()
+    with _lock:
+        _write({"op": "save_state", "changes": [list(change) for change in changes], "updated_at": updated_at})
+    return updated_at
+
+def purge_bot_state(before):
+    """
+    Удаление записей состояния бота, измененных раньше указанного времени.
+
+    Returns:
+        int: Количество удаленных записей
+    """
+    with _lock:
+        count = sum(1 for entries in get_data()["bot_state"].values()
+                    for _, updated_at in entries.values() if updated_at < before)
+        if count:
+            _write({"op": "purge_state", "before": before})
+    return count
 
 def get_user_stats(user_id):
-    """Получение статистики пользователя"""
-    data = get_data()
-    if str(user_id) in data["users"]:
-        return data["users"][str(user_id)]
-    return None
-
-# Инициализация базы данных при импорте модуля
-init_db() 
\ No newline at end of file
+    """Получение статистики пользователя (копия) или None"""
+    with _lock:
+        stats = get_data()["users"].get(str(user_id))
+        return copy.deepcopy(stats) if stats is not None else None
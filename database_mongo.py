@@ -1,45 +1,162 @@
 """
 Модуль для работы с базой данных EcoMap KZ, адаптированный для работы с MongoDB Atlas.
 Это позволит хранить данные в облачной базе данных, что необходимо для работы на Vercel.
+
+Клиент MongoDB создается при первом обращении к базе, а не при импорте.
+Индексы создаются отдельной командой (python manage.py migrate --backend mongo),
+чтобы холодный старт не ждал обращений к серверу.
 """
 
+import atexit
 import os
+import threading
+import time
 import pymongo
 from datetime import datetime
 from dotenv import load_dotenv
 
+from city_stats import compute_city_stats, diff_city_stats, empty_stats
+from geo import location_coords, nearest_cities, resolve_city
+
 # Загружаем переменные окружения
 load_dotenv()
 
-# Получаем URI для подключения к MongoDB Atlas из переменных окружения
-MONGODB_URI = os.environ.get("MONGODB_URI")
-if not MONGODB_URI:
-    raise ValueError("MONGODB_URI не указан в переменных окружения")
+# Клиент MongoDB и база данных (создаются при первом обращении)
+_client = None
+_db = None
+_client_lock = threading.Lock()
+
+def get_db():
+    """База данных 'ecomap_kz' (клиент создается при первом вызове)"""
+    global _client, _db
+    if _db is None:
+        with _client_lock:
+            if _db is None:
+                # Получаем URI для подключения к MongoDB Atlas из переменных окружения
+                uri = os.environ.get("MONGODB_URI")
+                if not uri:
+                    raise ValueError("MONGODB_URI не указан в переменных окружения")
+                _client = pymongo.MongoClient(uri)
+                _db = _client.ecomap_kz
+    return _db
+
+class LazyCollection:
+    """Коллекция MongoDB, которая подключается к базе при первом использовании"""
 
-# Создаем клиента MongoDB
-client = pymongo.MongoClient(MONGODB_URI)
-db = client.ecomap_kz  # Используем базу данных 'ecomap_kz'
+    def __init__(self, name):
+        self._name = name
+        self._collection = None
+
+    def __getattr__(self, attr):
+        if self._collection is None:
+            self._collection = get_db()[self._name]
+        return getattr(self._collection, attr)
 
 # Коллекции для хранения данных
-reports_collection = db.reports
-users_collection = db.users
+reports_collection = LazyCollection("reports")
+users_collection = LazyCollection("users")
+counters_collection = LazyCollection("counters")
+city_stats_collection = LazyCollection("city_stats")
+bot_state_collection = LazyCollection("bot_state")
+events_collection = LazyCollection("events")
+event_subscriptions_collection = LazyCollection("event_subscriptions")
+notifications_collection = LazyCollection("notifications")
+air_alerts_collection = LazyCollection("air_alerts")
+
+# Количество ID, резервируемых процессом за одно обращение к счетчику
+ID_BLOCK_SIZE = int(os.environ.get("REPORT_ID_BLOCK_SIZE", "20"))
+
+# Зарезервированный, но еще не выданный диапазон ID: [next, end)
+_id_block = {"next": 0, "end": 0}
+_id_lock = threading.Lock()
+
+# Пакетная запись отчетов (включается через enable_batching)
+_batch = {"enabled": False, "max_size": 100, "max_delay": 1.0, "reports": [], "timer": None}
+_batch_lock = threading.Lock()
 
 def init_db():
-    """Инициализация индексов базы данных"""
+    """
+    Инициализация индексов базы данных.
+    Выполняется один раз при развертывании: python manage.py migrate --backend mongo
+    """
     # Создаем индексы для более быстрого поиска
+    reports_collection.create_index("id", unique=True)
     reports_collection.create_index("user_id")
     reports_collection.create_index("status")
+    reports_collection.create_index("city")
+    reports_collection.create_index([("geo", pymongo.GEOSPHERE)])
+    users_collection.create_index("user_id", unique=True)
+    bot_state_collection.create_index([("kind", pymongo.ASCENDING), ("updated_at", pymongo.ASCENDING)])
+    events_collection.create_index("id", unique=True)
+    event_subscriptions_collection.create_index([("city", pymongo.ASCENDING), ("user_id", pymongo.ASCENDING)],
+                                                unique=True)
+    event_subscriptions_collection.create_index("user_id")
+    notifications_collection.create_index([("done_at", pymongo.ASCENDING), ("id", pymongo.ASCENDING)])
+    air_alerts_collection.create_index([("user_id", pymongo.ASCENDING), ("city", pymongo.ASCENDING)], unique=True)
+    air_alerts_collection.create_index([("city", pymongo.ASCENDING), ("threshold", pymongo.ASCENDING)])
+
+    _seed_report_counter()
     print("База данных MongoDB инициализирована")
 
+def _seed_report_counter():
+    """Счетчик ID не должен отставать от уже существующих отчетов"""
+    max_id_doc = reports_collection.find_one(sort=[("id", pymongo.DESCENDING)])
+    update = {"$max": {"seq": max_id_doc["id"] if max_id_doc else 0}}
+    try:
+        counters_collection.update_one({"_id": "reports"}, update, upsert=True)
+    except pymongo.errors.DuplicateKeyError:
+        # Счетчик одновременно создал другой процесс: повторяем $max без upsert
+        counters_collection.update_one({"_id": "reports"}, update)
+
+def next_report_id():
+    """
+    Выдача следующего ID отчета.
+
+    ID резервируются блоками по ID_BLOCK_SIZE атомарным $inc на документе
+    счетчика, поэтому параллельные экземпляры бота никогда не получают
+    одинаковые ID, а прогретый процесс выдает ID без обращения к базе.
+    ID монотонны внутри процесса, но между процессами могут чередоваться,
+    а неиспользованный остаток блока после перезапуска пропускается.
+
+    Если счетчика еще нет (migrate не выполнялся), он создается от
+    максимального ID существующих отчетов, а не с нуля.
+    """
+    with _id_lock:
+        if _id_block["next"] >= _id_block["end"]:
+            counter = None
+            for _ in range(2):
+                counter = counters_collection.find_one_and_update(
+                    {"_id": "reports"},
+                    {"$inc": {"seq": ID_BLOCK_SIZE}},
+                    return_document=pymongo.ReturnDocument.AFTER
+                )
+                if counter is not None:
+                    break
+                _seed_report_counter()
+            if counter is None:
+                raise RuntimeError("Не удалось создать счетчик ID отчетов в MongoDB")
+            _id_block["end"] = counter["seq"] + 1
+            _id_block["next"] = _id_block["end"] - ID_BLOCK_SIZE
+        next_id = _id_block["next"]
+        _id_block["next"] += 1
+    return next_id
+
+def _geo_fields(location):
+    """
+    Поля координат отчета: lat, lon и GeoJSON-точка geo для индекса 2dsphere.
+    Если координаты не определены, поле geo не создается.
+    """
+    coords = location_coords(location)
+    if coords is None:
+        return {"lat": None, "lon": None}
+    lat, lon = coords
+    return {"lat": lat, "lon": lon, "geo": {"type": "Point", "coordinates": [lon, lat]}}
+
 def add_report(user_id, username, problem_type, description, location, photo_id=None):
     """Добавление нового отчета о проблеме"""
     # Создаем новый отчет
-    # Получаем максимальный ID из существующих отчетов
-    max_id_doc = reports_collection.find_one(sort=[("id", pymongo.DESCENDING)])
-    next_id = 1
-    if max_id_doc:
-        next_id = max_id_doc["id"] + 1
-    
+    next_id = next_report_id()
+
     report = {
         "id": next_id,
         "user_id": user_id,
@@ -47,76 +164,583 @@ def add_report(user_id, username, problem_type, description, location, photo_id=
         "problem_type": problem_type,
         "description": description,
         "location": location,
+        "city": resolve_city(location),
         "photo_id": photo_id,
         "timestamp": datetime.now().isoformat(),
         "status": "new"  # new, in-progress, resolved
     }
+    report.update(_geo_fields(location))
+
+    if _batch["enabled"]:
+        _buffer_report(report)
+        return next_id
 
     # Добавляем отчет в коллекцию
     reports_collection.insert_one(report)
 
-    # Обновляем информацию о пользователе
-    user = users_collection.find_one({"user_id": user_id})
-    if not user:
-        users_collection.insert_one({
-            "user_id": user_id,
-            "username": username,
-            "reports_count": 1,
-            "joined_at": datetime.now().isoformat()
-        })
-    else:
-        users_collection.update_one(
-            {"user_id": user_id},
-            {"$inc": {"reports_count": 1}}
+    # Обновляем информацию о пользователе за одно обращение к базе
+    users_collection.update_one(
+        {"user_id": user_id},
+        {
+            "$inc": {"reports_count": 1},
+            "$setOnInsert": {"username": username, "joined_at": report["timestamp"]}
+        },
+        upsert=True
+    )
+
+    # Обновляем счетчики города
+    if report["city"]:
+        city_stats_collection.update_one(
+            {"_id": report["city"]},
+            {"$inc": {"total": 1, f"by_type.{problem_type}": 1, "by_status.new": 1}},
+            upsert=True
         )
 
+    _bump_data_version()
     return next_id
 
+def _bump_data_version(count=1):
+    """Увеличение версии данных"""
+    counters_collection.update_one({"_id": "data_version"}, {"$inc": {"seq": count}}, upsert=True)
+
+def get_data_version():
+    """
+    Версия данных отчетов: увеличивается при каждом изменении.
+    Используется для инвалидации кешей, построенных по отчетам.
+    """
+    counter = counters_collection.find_one({"_id": "data_version"})
+    return counter["seq"] if counter else 0
+
+def enable_batching(max_size=100, max_delay=1.0):
+    """
+    Включение пакетной записи отчетов.
+
+    Отчеты накапливаются в памяти и записываются одним bulk_write, когда
+    их набирается max_size или с момента первого из них проходит
+    max_delay секунд. ID выдается сразу, но отчет становится виден
+    в запросах только после записи пакета.
+
+    Args:
+        max_size (int): Максимальный размер пакета
+        max_delay (float): Максимальная задержка записи в секундах
+    """
+    with _batch_lock:
+        _batch.update(enabled=True, max_size=max_size, max_delay=max_delay)
+
+def disable_batching():
+    """Выключение пакетной записи с записью накопленных отчетов"""
+    with _batch_lock:
+        _batch["enabled"] = False
+    flush_reports()
+
+def _buffer_report(report):
+    """Добавление отчета в пакет"""
+    with _batch_lock:
+        _batch["reports"].append(report)
+        full = len(_batch["reports"]) >= _batch["max_size"]
+        if not full and _batch["timer"] is None:
+            timer = threading.Timer(_batch["max_delay"], flush_reports)
+            timer.daemon = True
+            _batch["timer"] = timer
+            timer.start()
+    if full:
+        flush_reports()
+
+def flush_reports():
+    """
+    Запись накопленных отчетов одним bulk_write.
+
+    Returns:
+        int: Количество записанных отчетов
+    """
+    with _batch_lock:
+        reports = _batch["reports"]
+        _batch["reports"] = []
+        if _batch["timer"] is not None:
+            _batch["timer"].cancel()
+            _batch["timer"] = None
+    if not reports:
+        return 0
+
+    reports_collection.bulk_write([pymongo.InsertOne(report) for report in reports], ordered=False)
+
+    # Счетчики пользователей объединяем, чтобы на пользователя приходилась одна операция
+    users = {}
+    for report in reports:
+        user = users.setdefault(report["user_id"], {"count": 0, "report": report})
+        user["count"] += 1
+    users_collection.bulk_write([
+        pymongo.UpdateOne(
+            {"user_id": user_id},
+            {
+                "$inc": {"reports_count": user["count"]},
+                "$setOnInsert": {"username": user["report"]["username"], "joined_at": user["report"]["timestamp"]}
+            },
+            upsert=True
+        )
+        for user_id, user in users.items()
+    ], ordered=False)
+
+    # Счетчики городов также объединяем по городам
+    increments = {}
+    for report in reports:
+        if report["city"]:
+            inc = increments.setdefault(report["city"], {"total": 0, "by_status.new": 0})
+            inc["total"] += 1
+            inc["by_status.new"] += 1
+            key = f"by_type.{report['problem_type']}"
+            inc[key] = inc.get(key, 0) + 1
+    if increments:
+        city_stats_collection.bulk_write([
+            pymongo.UpdateOne({"_id": city}, {"$inc": inc}, upsert=True)
+            for city, inc in increments.items()
+        ], ordered=False)
+    _bump_data_version(len(reports))
+    return len(reports)
+
+# Накопленные отчеты записываются при завершении процесса
+atexit.register(flush_reports)
+
 def get_user_reports(user_id):
     """Получение отчетов пользователя"""
     return list(reports_collection.find({"user_id": user_id}, {'_id': 0}))
 
+def _report_filter(city=None, status=None, problem_type=None, date_from=None, date_to=None, after_id=None):
+    """Построение фильтра MongoDB по фильтрам отчетов"""
+    query = {}
+    for field, value in (("city", city), ("status", status), ("problem_type", problem_type)):
+        if value is not None:
+            query[field] = value
+    if date_from is not None or date_to is not None:
+        query["timestamp"] = {}
+        if date_from is not None:
+            query["timestamp"]["$gte"] = date_from if isinstance(date_from, str) else date_from.isoformat()
+        if date_to is not None:
+            query["timestamp"]["$lt"] = date_to if isinstance(date_to, str) else date_to.isoformat()
+    if after_id is not None:
+        query["id"] = {"$gt": after_id}
+    return query
+
+def iter_reports(fields=None, limit=None, batch_size=500, **filters):
+    """
+    Потоковый перебор отчетов по фильтрам в порядке возрастания id.
+
+    Args:
+        fields (list): Возвращаемые поля (по умолчанию все)
+        limit (int): Максимальное количество отчетов
+        batch_size (int): Размер пакета курсора
+        **filters: city, status, problem_type, date_from, date_to, after_id
+
+    Yields:
+        dict: Отчет (или его часть с полями fields)
+    """
+    projection = dict.fromkeys(fields, 1) if fields else {}
+    projection['_id'] = 0
+    cursor = reports_collection.find(_report_filter(**filters), projection, batch_size=batch_size)
+    cursor = cursor.sort("id", pymongo.ASCENDING)
+    if limit is not None:
+        cursor = cursor.limit(limit)
+    yield from cursor
+
+def query_reports(limit=50, fields=None, **filters):
+    """
+    Получение страницы отчетов.
+
+    Args:
+        limit (int): Размер страницы
+        fields (list): Возвращаемые поля (по умолчанию все)
+        **filters: Фильтры и курсор after_id, как у iter_reports
+
+    Returns:
+        dict: {"reports": [...], "next_cursor": id для следующей страницы или None}
+    """
+    page_fields = list(fields) + ["id"] if fields and "id" not in fields else fields
+    reports = list(iter_reports(fields=page_fields, limit=limit + 1, **filters))
+    next_cursor = reports[limit - 1]["id"] if len(reports) > limit else None
+    reports = reports[:limit]
+    if fields and "id" not in fields:
+        for report in reports:
+            del report["id"]
+    return {"reports": reports, "next_cursor": next_cursor}
+
+def count_reports(**filters):
+    """Подсчет отчетов по фильтрам без загрузки списка"""
+    return reports_collection.count_documents(_report_filter(**filters))
+
 def get_all_reports():
     """Получение всех отчетов"""
-    return list(reports_collection.find({}, {'_id': 0}))
+    return list(iter_reports())
 
 def get_report_by_id(report_id):
     """Получение отчета по ID"""
     return reports_collection.find_one({"id": report_id}, {'_id': 0})
 
+def _next_seq(name):
+    """Следующее значение счетчика ID (events, notifications)"""
+    counter = counters_collection.find_one_and_update(
+        {"_id": name},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=pymongo.ReturnDocument.AFTER
+    )
+    return counter["seq"]
+
+def _add_notification(kind, payload, user_id=None, city=None):
+    """Постановка задания рассылки в очередь (см. notifications.py)"""
+    notifications_collection.insert_one({
+        "id": _next_seq("notifications"),
+        "kind": kind,
+        "user_id": user_id,
+        "city": city,
+        "payload": payload,
+        "cursor": 0,
+        "sent": 0,
+        "failed": 0,
+        "created_at": datetime.now().isoformat(),
+        "done_at": None
+    })
+
 def update_report_status(report_id, new_status):
-    """Обновление статуса отчета"""
-    result = reports_collection.update_one(
-        {"id": report_id},
-        {"$set": {"status": new_status}}
+    """Обновление статуса отчета (автору отчета ставится в очередь уведомление)"""
+    # Прежний статус нужен для переноса счетчика города
+    old_report = reports_collection.find_one_and_update(
+        {"id": report_id, "status": {"$ne": new_status}},
+        {"$set": {"status": new_status}},
+        projection={"_id": 0, "city": 1, "status": 1, "user_id": 1, "problem_type": 1}
     )
-    return result.modified_count > 0
+    if old_report is None:
+        # Статус уже такой (как и в других бэкендах, это не ошибка, но без уведомления)
+        # или отчета нет
+        return reports_collection.count_documents({"id": report_id}, limit=1) > 0
+
+    if old_report.get("city"):
+        city_stats_collection.update_one(
+            {"_id": old_report["city"]},
+            {"$inc": {f"by_status.{old_report['status']}": -1, f"by_status.{new_status}": 1}},
+            upsert=True
+        )
+    _bump_data_version()
+    _add_notification("status",
+                      {"report_id": report_id, "status": new_status, "problem_type": old_report.get("problem_type")},
+                      user_id=old_report["user_id"])
+    return True
+
+def get_city_stats(city):
+    """
+    Получение счетчиков отчетов города.
+
+    Returns:
+        dict: {"total": n, "by_type": {...}, "by_status": {...}}
+    """
+    stats = city_stats_collection.find_one({"_id": city}, {"_id": 0})
+    if not stats:
+        return empty_stats()
+    # После $inc могут остаться нулевые счетчики
+    for field in ("by_type", "by_status"):
+        stats[field] = {key: value for key, value in stats.get(field, {}).items() if value}
+    return dict(empty_stats(), **stats)
+
+def backfill_locations():
+    """
+    Заполнение полей city, lat, lon и geo у отчетов, созданных до их появления.
+
+    Returns:
+        int: Количество обновленных отчетов
+    """
+    updated = 0
+    for report in reports_collection.find({"lat": {"$exists": False}}, {"_id": 1, "location": 1}):
+        fields = dict(_geo_fields(report.get("location")), city=resolve_city(report.get("location")))
+        reports_collection.update_one({"_id": report["_id"]}, {"$set": fields})
+        updated += 1
+    return updated
+
+def reports_near(lat, lon, radius_km, limit=None):
+    """
+    Отчеты в радиусе от точки, от ближайших к дальним.
+
+    Args:
+        lat (float): Широта
+        lon (float): Долгота
+        radius_km (float): Радиус поиска в километрах
+        limit (int): Максимальное количество отчетов
+
+    Returns:
+        list: Отчеты с дополнительным полем distance_km
+    """
+    pipeline = [
+        {"$geoNear": {
+            "near": {"type": "Point", "coordinates": [lon, lat]},
+            "key": "geo",
+            "distanceField": "distance_km",
+            "distanceMultiplier": 0.001,
+            "maxDistance": radius_km * 1000,
+            "spherical": True
+        }},
+        {"$project": {"_id": 0, "geo": 0}}
+    ]
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+    return list(reports_collection.aggregate(pipeline))
+
+def reports_in_bbox(min_lat, min_lon, max_lat, max_lon):
+    """Отчеты внутри прямоугольника координат"""
+    box = {"type": "Polygon", "coordinates": [[
+        [min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]
+    ]]}
+    return list(reports_collection.find(
+        {"geo": {"$geoWithin": {"$geometry": box}}},
+        {"_id": 0, "geo": 0}
+    ).sort("id", pymongo.ASCENDING))
+
+def rebuild_city_stats():
+    """
+    Пересчет счетчиков по городам с нуля и сверка с сохраненными.
+
+    Отчеты, созданные до появления полей city и lat/lon, предварительно
+    дополняются (см. backfill_locations).
+
+    Returns:
+        list: Найденные расхождения (пустой список, если счетчики верны)
+    """
+    backfill_locations()
+
+    expected = compute_city_stats(
+        reports_collection.find({"city": {"$ne": None}}, {"_id": 0, "city": 1, "problem_type": 1, "status": 1})
+    )
+    actual = {doc["_id"]: get_city_stats(doc["_id"]) for doc in city_stats_collection.find({}, {"_id": 1})}
+    problems = diff_city_stats(expected, actual)
+
+    city_stats_collection.delete_many({})
+    if expected:
+        city_stats_collection.insert_many([dict(stats, _id=city) for city, stats in expected.items()])
+    return problems
+
+def reclassify_cities():
+    """
+    Повторное определение города у отчетов с координатами из Telegram
+    по ближайшему центру города или района (для всех отчетов сразу).
+
+    Returns:
+        tuple: (количество отчетов с координатами, количество отчетов, у которых изменился город)
+    """
+    reports = list(reports_collection.find(
+        {"location": {"$regex": "Координаты:"}, "lat": {"$ne": None}},
+        {"_id": 1, "city": 1, "lat": 1, "lon": 1}
+    ))
+    cities = nearest_cities([(report["lat"], report["lon"]) for report in reports])
+    changes = [
+        pymongo.UpdateOne({"_id": report["_id"]}, {"$set": {"city": city}})
+        for report, city in zip(reports, cities) if report.get("city") != city
+    ]
+    if changes:
+        reports_collection.bulk_write(changes, ordered=False)
+        _bump_data_version()
+        rebuild_city_stats()
+    return len(reports), len(changes)
+
+def add_event(name, date, location, description, city=None):
+    """
+    Добавление мероприятия и объявления о нем подписчикам города.
+
+    Returns:
+        dict: Мероприятие
+    """
+    event = {"id": _next_seq("events"), "name": name, "date": date, "location": location,
+             "description": description, "city": city, "created_at": datetime.now().isoformat()}
+    events_collection.insert_one(dict(event))
+    if city:
+        _add_notification("event", event, city=city)
+    return event
+
+def get_events():
+    """Мероприятия, добавленные через add_event"""
+    return list(events_collection.find({}, {"_id": 0}).sort("id", pymongo.ASCENDING))
+
+def subscribe_events(user_id, city):
+    """
+    Подписка пользователя на новые мероприятия города.
+
+    Returns:
+        bool: True, если подписки еще не было
+    """
+    result = event_subscriptions_collection.update_one(
+        {"city": city, "user_id": user_id}, {"$setOnInsert": {"city": city, "user_id": user_id}}, upsert=True
+    )
+    return result.upserted_id is not None
+
+def unsubscribe_events(user_id, city=None):
+    """
+    Отмена подписки на мероприятия города (city=None — всех городов).
+
+    Returns:
+        int: Количество отмененных подписок
+    """
+    query = {"user_id": user_id}
+    if city is not None:
+        query["city"] = city
+    return event_subscriptions_collection.delete_many(query).deleted_count
+
+def get_event_subscriptions(user_id, city=None):
+    """Города, на мероприятия которых подписан пользователь"""
+    query = {"user_id": user_id}
+    if city is not None:
+        query["city"] = city
+    return sorted(doc["city"] for doc in event_subscriptions_collection.find(query, {"city": 1}))
+
+def get_event_subscribers(city, after=0, limit=1000):
+    """
+    Очередная порция подписчиков мероприятий города.
+
+    Args:
+        city (str): Город
+        after (int): Вернуть подписчиков с user_id больше этого
+        limit (int): Размер порции
+
+    Returns:
+        list: user_id по возрастанию
+    """
+    cursor = event_subscriptions_collection.find(
+        {"city": city, "user_id": {"$gt": after}}, {"_id": 0, "user_id": 1}
+    ).sort("user_id", pymongo.ASCENDING).limit(limit)
+    return [doc["user_id"] for doc in cursor]
+
+def subscribe_alerts(user_id, city, threshold):
+    """
+    Подписка на оповещения о превышении порога PM2.5 в городе
+    (прежний порог этого города заменяется).
+
+    Returns:
+        bool: True, если подписки на этот город еще не было
+    """
+    result = air_alerts_collection.update_one(
+        {"user_id": user_id, "city": city}, {"$set": {"threshold": threshold}}, upsert=True
+    )
+    return result.upserted_id is not None
+
+def unsubscribe_alerts(user_id, city=None):
+    """
+    Отмена оповещений о качестве воздуха города (city=None — всех городов).
+
+    Returns:
+        int: Количество отмененных подписок
+    """
+    query = {"user_id": user_id}
+    if city is not None:
+        query["city"] = city
+    return air_alerts_collection.delete_many(query).deleted_count
+
+def get_alert_subscriptions(user_id):
+    """Пороги оповещений пользователя: {город: порог PM2.5}"""
+    return {doc["city"]: doc["threshold"]
+            for doc in air_alerts_collection.find({"user_id": user_id}, {"_id": 0, "city": 1, "threshold": 1})}
+
+def get_alert_subscribers(city, low, high):
+    """
+    Подписчики оповещений города с порогом в интервале [low, high):
+    те, для кого PM2.5, поднявшись с low до high, превысил порог.
+
+    Returns:
+        list: user_id
+    """
+    cursor = air_alerts_collection.find(
+        {"city": city, "threshold": {"$gte": low, "$lt": high}}, {"_id": 0, "user_id": 1}
+    )
+    return [doc["user_id"] for doc in cursor]
+
+def add_alert_notification(city, payload):
+    """Постановка в очередь оповещения о качестве воздуха (адресаты — payload["recipients"])"""
+    _add_notification("air", payload, city=city)
+
+def get_pending_notifications(limit=100):
+    """Незавершенные задания рассылки в порядке создания"""
+    return list(notifications_collection.find({"done_at": None}, {"_id": 0})
+                .sort("id", pymongo.ASCENDING).limit(limit))
+
+def save_notification_progress(notification_id, cursor, sent, failed, done=False):
+    """
+    Сохранение прогресса задания рассылки (контрольная точка).
+
+    Args:
+        notification_id (int): ID задания
+        cursor (int): Наибольший user_id, до которого рассылка выполнена
+        sent (int): Отправлено сообщений
+        failed (int): Не доставлено сообщений
+        done (bool): Задание завершено
+    """
+    notifications_collection.update_one(
+        {"id": notification_id},
+        {"$set": {"cursor": cursor, "sent": sent, "failed": failed,
+                  "done_at": datetime.now().isoformat() if done else None}}
+    )
+
+def load_bot_state(kind, since=None):
+    """
+    Загрузка состояния бота (см. persistence.py).
+
+    Args:
+        kind (str): Вид состояния, например "user_data" или "conversation:report"
+        since (float): Не возвращать записи, измененные раньше (время Unix)
+
+    Returns:
+        dict: {ключ: значение}
+    """
+    query = {"kind": kind}
+    if since is not None:
+        query["updated_at"] = {"$gte": since}
+    return {doc["key"]: doc["value"] for doc in bot_state_collection.find(query, {"key": 1, "value": 1})}
+
+def get_bot_state(entries, since=None):
+    """
+    Загрузка отдельных записей состояния бота (обновление перед обработкой
+    обновления в вебхуке, см. persistence.py).
+
+    Args:
+        entries (list): Пары (вид, ключ)
+        since (float): Не возвращать записи, измененные раньше (время Unix)
+
+    Returns:
+        dict: {(вид, ключ): (значение, время изменения (Unix))} для найденных записей
+    """
+    query = {"_id": {"$in": [f"{kind}:{key}" for kind, key in entries]}}
+    if since is not None:
+        query["updated_at"] = {"$gte": since}
+    return {(doc["kind"], doc["key"]): (doc["value"], doc["updated_at"]) for doc in bot_state_collection.find(query)}
+
+def save_bot_state(changes):
+    """
+    Запись изменений состояния бота одним пакетом.
+
+    Args:
+        changes (list): Тройки (вид, ключ, значение); значение None удаляет запись
+
+    Returns:
+        float: Время изменения записанных записей (Unix)
+    """
+    now = time.time()
+    operations = []
+    for kind, key, value in changes:
+        if value is None:
+            operations.append(pymongo.DeleteOne({"_id": f"{kind}:{key}"}))
+        else:
+            operations.append(pymongo.ReplaceOne(
+                {"_id": f"{kind}:{key}"},
+                {"kind": kind, "key": key, "value": value, "updated_at": now},
+                upsert=True
+            ))
+    if operations:
+        bot_state_collection.bulk_write(operations, ordered=False)
+    return now
+
+def purge_bot_state(before):
+    """
+    Удаление записей состояния бота, измененных раньше указанного времени.
+
+    Returns:
+        int: Количество удаленных записей
+    """
+    return bot_state_collection.delete_many({"updated_at": {"$lt": before}}).deleted_count
 
 def get_user_stats(user_id):
     """Получение статистики пользователя"""
     user = users_collection.find_one({"user_id": user_id}, {'_id': 0})
     return user
-
-# Инициализация базы данных при импорте модуля
-try:
-    init_db()
-except Exception as e:
-    print(f"Ошибка инициализации базы данных: {e}")
-    # Если не удалось подключиться к MongoDB, используем заглушки для функций
-    def get_user_reports(user_id):
-        return []
-    
-    def get_all_reports():
-        return []
-    
-    def get_report_by_id(report_id):
-        return None
-    
-    def update_report_status(report_id, new_status):
-        return False
-    
-    def get_user_stats(user_id):
-        return None
-    
-    def add_report(*args, **kwargs):
-        return 0 
\ No newline at end of file
@@ -0,0 +1,741 @@
+"""
+Модуль для работы с базой данных EcoMap KZ на основе SQLite.
+Предоставляет те же функции, что и database.py, но хранит отчеты
+в индексированных таблицах вместо JSON-файла.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from city_stats import compute_city_stats, diff_city_stats, empty_stats
+from geo import location_coords, nearest_cities, resolve_city
+from spatial import cell_key, cell_ranges, haversine_km, radius_bbox
+
+# Путь к файлу базы данных
+DB_FILE = "user_reports.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    username TEXT,
+    problem_type TEXT,
+    description TEXT,
+    location TEXT,
+    city TEXT,
+    lat REAL,
+    lon REAL,
+    geo_cell INTEGER,
+    photo_id TEXT,
+    timestamp TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'new'
+);
+CREATE INDEX IF NOT EXISTS idx_reports_user_id ON reports(user_id);
+CREATE INDEX IF NOT EXISTS idx_reports_status ON reports(status);
+CREATE INDEX IF NOT EXISTS idx_reports_city ON reports(city);
+CREATE INDEX IF NOT EXISTS idx_reports_timestamp ON reports(timestamp);
+CREATE INDEX IF NOT EXISTS idx_reports_geo_cell ON reports(geo_cell);
+
+-- Счетчики отчетов по городам: field = 'total' | 'by_type' | 'by_status'
+CREATE TABLE IF NOT EXISTS city_stats (
+    city TEXT NOT NULL,
+    field TEXT NOT NULL,
+    key TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (city, field, key)
+);
+
+-- Служебные значения, например версия данных для инвалидации кешей
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT,
+    reports_count INTEGER NOT NULL DEFAULT 0,
+    joined_at TEXT
+);
+
+-- Состояние бота (разговоры и user_data, см. persistence.py); value — JSON
+CREATE TABLE IF NOT EXISTS bot_state (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+CREATE INDEX IF NOT EXISTS idx_bot_state_updated_at ON bot_state(updated_at);
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    date TEXT,
+    location TEXT,
+    description TEXT,
+    city TEXT,
+    created_at TEXT NOT NULL
+);
+
+-- Подписки на новые мероприятия города; порядок ключа позволяет читать
+-- подписчиков города порциями по user_id
+CREATE TABLE IF NOT EXISTS event_subscriptions (
+    city TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (city, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_event_subscriptions_user_id ON event_subscriptions(user_id);
+
+-- Оповещения о превышении порога PM2.5; индекс (city, threshold) позволяет
+-- выбрать только подписчиков, чей порог пересекло новое значение
+CREATE TABLE IF NOT EXISTS air_alerts (
+    user_id INTEGER NOT NULL,
+    city TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    PRIMARY KEY (user_id, city)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_air_alerts_city_threshold ON air_alerts(city, threshold);
+
+-- Задания рассылки (см. notifications.py): user_id — личное уведомление,
+-- city — объявление подписчикам города; payload — JSON, cursor — контрольная точка
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    user_id INTEGER,
+    city TEXT,
+    payload TEXT NOT NULL,
+    cursor INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    done_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_notifications_pending ON notifications(id) WHERE done_at IS NULL;
+"""
+
+REPORT_COLUMNS = "id, user_id, username, problem_type, description, location, city, lat, lon, photo_id, timestamp, status"
+
+# Максимальное количество диапазонов ячеек в одном пространственном запросе
+MAX_CELL_RANGES = 200
+
+# Столбцы, добавленные после первой версии схемы
+ADDED_COLUMNS = {"lat": "REAL", "lon": "REAL", "geo_cell": "INTEGER"}
+REPORT_FIELDS = set(REPORT_COLUMNS.split(", "))
+
+# Соединения кешируются по потокам: sqlite3.Connection нельзя
+# использовать из нескольких потоков одновременно
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+# Увеличивается в close_db: соединения других потоков после этого открываются заново
+_generation = 0
+
+# Схема создается при первом соединении процесса, а не при импорте модуля
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+def get_connection():
+    """Получение соединения с базой данных для текущего потока"""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "generation", None) != _generation:
+        # Скомпилированные запросы переиспользуются через кеш sqlite3
+        conn = sqlite3.connect(DB_FILE, cached_statements=256, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        _local.conn = conn
+        _local.generation = _generation
+        with _connections_lock:
+            _connections.append(conn)
+        if not _schema_ready:
+            _create_schema(conn)
+    return conn
+
+def init_db():
+    """Создание таблиц и индексов"""
+    _create_schema(get_connection())
+
+def _create_schema(conn):
+    """Создание таблиц и индексов на соединении (один раз за процесс)"""
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        # Базы, созданные со старой схемой, дополняем недостающими столбцами
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(reports)")}
+        if existing:
+            for column, column_type in ADDED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE reports ADD COLUMN {column} {column_type}")
+        conn.executescript(SCHEMA)
+        conn.commit()
+        _schema_ready = True
+
+def _geo_columns(location):
+    """Значения столбцов lat, lon и geo_cell для местоположения"""
+    coords = location_coords(location)
+    if coords is None:
+        return (None, None, None)
+    return (coords[0], coords[1], cell_key(*coords))
+
+def close_db():
+    """Закрытие всех открытых соединений"""
+    global _schema_ready, _generation
+    _schema_ready = False
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+        _generation += 1
+    _local.__dict__.clear()
+
+def _inc_city_stats(conn, city, changes):
+    """Изменение счетчиков города: changes — список (field, key, delta)"""
+    conn.executemany(
+        "INSERT INTO city_stats (city, field, key, count) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(city, field, key) DO UPDATE SET count = count + excluded.count",
+        [(city, field, key, delta) for field, key, delta in changes]
+    )
+
+def _bump_data_version(conn):
+    """Увеличение версии данных (вызывается внутри транзакции записи)"""
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES ('data_version', 1) "
+        "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+    )
+
+def get_data_version():
+    """
+    Версия данных отчетов: увеличивается при каждом изменении.
+    Используется для инвалидации кешей, построенных по отчетам.
+    """
+    row = get_connection().execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+    return row[0] if row else 0
+
+def add_report(user_id, username, problem_type, description, location, photo_id=None):
+    """Добавление нового отчета о проблеме"""
+    conn = get_connection()
+    now = datetime.now().isoformat()
+    city = resolve_city(location)
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO reports (user_id, username, problem_type, description, location, city, lat, lon, geo_cell, "
+            "photo_id, timestamp, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'new')",
+            (user_id, username, problem_type, description, location, city, *_geo_columns(location), photo_id, now)
+        )
+        if city:
+            _inc_city_stats(conn, city, [("total", "", 1), ("by_type", problem_type, 1), ("by_status", "new", 1)])
+        _bump_data_version(conn)
+        conn.execute(
+            "INSERT INTO users (user_id, username, reports_count, joined_at) VALUES (?, ?, 1, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET reports_count = reports_count + 1",
+            (user_id, username, now)
+        )
+    return cursor.lastrowid
+
+def get_user_reports(user_id):
+    """Получение отчетов пользователя"""
+    rows = get_connection().execute(
+        f"SELECT {REPORT_COLUMNS} FROM reports WHERE user_id = ? ORDER BY id", (user_id,)
+    )
+    return [dict(row) for row in rows]
+
+def _where(city=None, status=None, problem_type=None, date_from=None, date_to=None, after_id=None):
+    """Построение условия WHERE по фильтрам отчетов"""
+    conditions, params = [], []
+    for column, value in (("city", city), ("status", status), ("problem_type", problem_type)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if date_from is not None:
+        conditions.append("timestamp >= ?")
+        params.append(date_from if isinstance(date_from, str) else date_from.isoformat())
+    if date_to is not None:
+        conditions.append("timestamp < ?")
+        params.append(date_to if isinstance(date_to, str) else date_to.isoformat())
+    if after_id is not None:
+        conditions.append("id > ?")
+        params.append(after_id)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return where, params
+
+def iter_reports(fields=None, limit=None, batch_size=500, **filters):
+    """
+    Потоковый перебор отчетов по фильтрам в порядке возрастания id.
+
+    Args:
+        fields (list): Возвращаемые поля (по умолчанию все)
+        limit (int): Максимальное количество отчетов
+        batch_size (int): Количество строк, читаемых за раз
+        **filters: city, status, problem_type, date_from, date_to, after_id
+
+    Yields:
+        dict: Отчет (или его часть с полями fields)
+    """
+    if fields and not REPORT_FIELDS.issuperset(fields):
+        raise ValueError(f"Неизвестные поля: {set(fields) - REPORT_FIELDS}")
+    columns = ", ".join(fields) if fields else REPORT_COLUMNS
+    where, params = _where(**filters)
+    sql = f"SELECT {columns} FROM reports{where} ORDER BY id"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    cursor = get_connection().execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        for row in rows:
+            yield dict(row)
+
+def query_reports(limit=50, fields=None, **filters):
+    """
+    Получение страницы отчетов.
+
+    Args:
+        limit (int): Размер страницы
+        fields (list): Возвращаемые поля (по умолчанию все)
+        **filters: Фильтры и курсор after_id, как у iter_reports
+
+    Returns:
+        dict: {"reports": [...], "next_cursor": id для следующей страницы или None}
+    """
+    page_fields = list(fields) + ["id"] if fields and "id" not in fields else fields
+    reports = list(iter_reports(fields=page_fields, limit=limit + 1, **filters))
+    next_cursor = reports[limit - 1]["id"] if len(reports) > limit else None
+    reports = reports[:limit]
+    if fields and "id" not in fields:
+        for report in reports:
+            del report["id"]
+    return {"reports": reports, "next_cursor": next_cursor}
+
+def count_reports(**filters):
+    """Подсчет отчетов по фильтрам без загрузки списка"""
+    where, params = _where(**filters)
+    return get_connection().execute(f"SELECT COUNT(*) FROM reports{where}", params).fetchone()[0]
+
+def get_all_reports():
+    """Получение всех отчетов"""
+    return list(iter_reports())
+
+def get_report_by_id(report_id):
+    """Получение отчета по ID"""
+    row = get_connection().execute(
+        f"SELECT {REPORT_COLUMNS} FROM reports WHERE id = ?", (report_id,)
+    ).fetchone()
+    return dict(row) if row else None
+
+def _add_notification(conn, kind, payload, user_id=None, city=None):
+    """Постановка задания рассылки в очередь (внутри транзакции записи)"""
+    conn.execute(
+        "INSERT INTO notifications (kind, user_id, city, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+        (kind, user_id, city, json.dumps(payload, ensure_ascii=False), datetime.now().isoformat())
+    )
+
+def update_report_status(report_id, new_status):
+    """Обновление статуса отчета (автору отчета ставится в очередь уведомление)"""
+    conn = get_connection()
+    with conn:
+        row = conn.execute(
+            "SELECT user_id, problem_type, city, status FROM reports WHERE id = ?", (report_id,)
+        ).fetchone()
+        if row is None:
+            return False
+        cursor = conn.execute(
+            "UPDATE reports SET status = ? WHERE id = ? AND status = ?", (new_status, report_id, row["status"])
+        )
+        if cursor.rowcount and row["status"] != new_status:
+            if row["city"]:
+                _inc_city_stats(conn, row["city"], [("by_status", row["status"], -1), ("by_status", new_status, 1)])
+            _bump_data_version(conn)
+            # Уведомление фиксируется той же транзакцией, что и статус
+            _add_notification(conn, "status",
+                              {"report_id": report_id, "status": new_status, "problem_type": row["problem_type"]},
+                              user_id=row["user_id"])
+    return cursor.rowcount > 0
+
+def _read_city_stats(conn, city=None):
+    """Чтение счетчиков из таблицы city_stats в виде {city: stats}"""
+    if city is None:
+        rows = conn.execute("SELECT city, field, key, count FROM city_stats WHERE count != 0")
+    else:
+        rows = conn.execute("SELECT city, field, key, count FROM city_stats WHERE city = ? AND count != 0", (city,))
+    result = {}
+    for row in rows:
+        stats = result.setdefault(row["city"], empty_stats())
+        if row["field"] == "total":
+            stats["total"] = row["count"]
+        else:
+            stats[row["field"]][row["key"]] = row["count"]
+    return result
+
+def reports_in_bbox(min_lat, min_lon, max_lat, max_lon):
+    """Отчеты внутри прямоугольника координат"""
+    ranges = cell_ranges(min_lat, min_lon, max_lat, max_lon)
+    if len(ranges) <= MAX_CELL_RANGES:
+        # Каждая строка сетки — непрерывный диапазон ключей в индексе geo_cell
+        condition = "(" + " OR ".join("geo_cell BETWEEN ? AND ?" for _ in ranges) + ") AND "
+        params = [key for key_range in ranges for key in key_range]
+    else:
+        # Для очень больших областей индекс не дает выигрыша
+        condition, params = "", []
+    rows = get_connection().execute(
+        f"SELECT {REPORT_COLUMNS} FROM reports WHERE {condition}"
+        "lat BETWEEN ? AND ? AND lon BETWEEN ? AND ? ORDER BY id",
+        params + [min_lat, max_lat, min_lon, max_lon]
+    )
+    return [dict(row) for row in rows]
+
+def reports_near(lat, lon, radius_km, limit=None):
+    """
+    Отчеты в радиусе от точки, от ближайших к дальним.
+
+    Args:
+        lat (float): Широта
+        lon (float): Долгота
+        radius_km (float): Радиус поиска в километрах
+        limit (int): Максимальное количество отчетов
+
+    Returns:
+        list: Отчеты с дополнительным полем distance_km
+    """
+    found = []
+    for report in reports_in_bbox(*radius_bbox(lat, lon, radius_km)):
+        distance = haversine_km(lat, lon, report["lat"], report["lon"])
+        if distance <= radius_km:
+            report["distance_km"] = round(distance, 3)
+            found.append(report)
+    found.sort(key=lambda report: report["distance_km"])
+    return found[:limit]
+
+def get_city_stats(city):
+    """
+    Получение счетчиков отчетов города.
+
+    Returns:
+        dict: {"total": n, "by_type": {...}, "by_status": {...}}
+    """
+    return _read_city_stats(get_connection(), city).get(city, empty_stats())
+
+def rebuild_city_stats():
+    """
+    Пересчет счетчиков по городам с нуля и сверка с сохраненными.
+
+    Returns:
+        list: Найденные расхождения (пустой список, если счетчики верны)
+    """
+    conn = get_connection()
+    with conn:
+        expected = compute_city_stats(iter_reports(fields=["city", "problem_type", "status"]))
+        problems = diff_city_stats(expected, _read_city_stats(conn))
+        conn.execute("DELETE FROM city_stats")
+        for city, stats in expected.items():
+            _inc_city_stats(conn, city, [("total", "", stats["total"])]
+                            + [("by_type", key, count) for key, count in stats["by_type"].items()]
+                            + [("by_status", key, count) for key, count in stats["by_status"].items()])
+    return problems
+
+def reclassify_cities():
+    """
+    Повторное определение города у отчетов с координатами из Telegram
+    по ближайшему центру города или района (для всех отчетов сразу).
+
+    Returns:
+        tuple: (количество отчетов с координатами, количество отчетов, у которых изменился город)
+    """
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT id, city, lat, lon FROM reports WHERE location LIKE '%Координаты:%' AND lat IS NOT NULL"
+    ).fetchall()
+    cities = nearest_cities([(row["lat"], row["lon"]) for row in rows])
+    changes = [(city, row["id"]) for row, city in zip(rows, cities) if row["city"] != city]
+    if changes:
+        with conn:
+            conn.executemany("UPDATE reports SET city = ? WHERE id = ?", changes)
+            _bump_data_version(conn)
+        rebuild_city_stats()
+    return len(rows), len(changes)
+
+def add_event(name, date, location, description, city=None):
+    """
+    Добавление мероприятия и объявления о нем подписчикам города.
+
+    Returns:
+        dict: Мероприятие
+    """
+    conn = get_connection()
+    event = {"name": name, "date": date, "location": location, "description": description,
+             "city": city, "created_at": datetime.now().isoformat()}
+    with conn:
+        event["id"] = conn.execute(
+            "INSERT INTO events (name, date, location, description, city, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (name, date, location, description, city, event["created_at"])
+        ).lastrowid
+        if city:
+            _add_notification(conn, "event", event, city=city)
+    return event
+
+def get_events():
+    """Мероприятия, добавленные через add_event"""
+    rows = get_connection().execute(
+        "SELECT id, name, date, location, description, city, created_at FROM events ORDER BY id"
+    )
+    return [dict(row) for row in rows]
+
+def subscribe_events(user_id, city):
+    """
+    Подписка пользователя на новые мероприятия города.
+
+    Returns:
+        bool: True, если подписки еще не было
+    """
+    conn = get_connection()
+    with conn:
+        return conn.execute(
+            "INSERT OR IGNORE INTO event_subscriptions (city, user_id) VALUES (?, ?)", (city, user_id)
+        ).rowcount > 0
+
+def unsubscribe_events(user_id, city=None):
+    """
+    Отмена подписки на мероприятия города (city=None — всех городов).
+
+    Returns:
+        int: Количество отмененных подписок
+    """
+    conn = get_connection()
+    with conn:
+        if city is None:
+            return conn.execute("DELETE FROM event_subscriptions WHERE user_id = ?", (user_id,)).rowcount
+        return conn.execute(
+            "DELETE FROM event_subscriptions WHERE city = ? AND user_id = ?", (city, user_id)
+        ).rowcount
+
+def get_event_subscriptions(user_id, city=None):
+    """Города, на мероприятия которых подписан пользователь"""
+    rows = get_connection().execute(
+        "SELECT city FROM event_subscriptions WHERE user_id = ? ORDER BY city", (user_id,)
+    )
+    return [row["city"] for row in rows if city in (None, row["city"])]
+
+def get_event_subscribers(city, after=0, limit=1000):
+    """
+    Очередная порция подписчиков мероприятий города.
+
+    Args:
+        city (str): Город
+        after (int): Вернуть подписчиков с user_id больше этого
+        limit (int): Размер порции
+
+    Returns:
+        list: user_id по возрастанию
+    """
+    rows = get_connection().execute(
+        "SELECT user_id FROM event_subscriptions WHERE city = ? AND user_id > ? ORDER BY user_id LIMIT ?",
+        (city, after, limit)
+    )
+    return [row[0] for row in rows]
+
+def subscribe_alerts(user_id, city, threshold):
+    """
+    Подписка на оповещения о превышении порога PM2.5 в городе
+    (прежний порог этого города заменяется).
+
+    Returns:
+        bool: True, если подписки на этот город еще не было
+    """
+    conn = get_connection()
+    with conn:
+        updated = conn.execute(
+            "UPDATE air_alerts SET threshold = ? WHERE user_id = ? AND city = ?", (threshold, user_id, city)
+        ).rowcount
+        if not updated:
+            conn.execute("INSERT INTO air_alerts (user_id, city, threshold) VALUES (?, ?, ?)",
+                         (user_id, city, threshold))
+    return not updated
+
+def unsubscribe_alerts(user_id, city=None):
+    """
+    Отмена оповещений о качестве воздуха города (city=None — всех городов).
+
+    Returns:
+        int: Количество отмененных подписок
+    """
+    conn = get_connection()
+    with conn:
+        if city is None:
+            return conn.execute("DELETE FROM air_alerts WHERE user_id = ?", (user_id,)).rowcount
+        return conn.execute("DELETE FROM air_alerts WHERE user_id = ? AND city = ?", (user_id, city)).rowcount
+
+def get_alert_subscriptions(user_id):
+    """Пороги оповещений пользователя: {город: порог PM2.5}"""
+    rows = get_connection().execute("SELECT city, threshold FROM air_alerts WHERE user_id = ?", (user_id,))
+    return {row["city"]: row["threshold"] for row in rows}
+
+def get_alert_subscribers(city, low, high):
+    """
+    Подписчики оповещений города с порогом в интервале [low, high):
+    те, для кого PM2.5, поднявшись с low до high, превысил порог.
+
+    Returns:
+        list: user_id
+    """
+    rows = get_connection().execute(
+        "SELECT user_id FROM air_alerts WHERE city = ? AND threshold >= ? AND threshold < ?", (city, low, high)
+    )
+    return [row[0] for row in rows]
+
+def add_alert_notification(city, payload):
+    """Постановка в очередь оповещения о качестве воздуха (адресаты — payload["recipients"])"""
+    conn = get_connection()
+    with conn:
+        _add_notification(conn, "air", payload, city=city)
+
+def get_pending_notifications(limit=100):
+    """Незавершенные задания рассылки в порядке создания"""
+    rows = get_connection().execute(
+        "SELECT id, kind, user_id, city, payload, cursor, sent, failed, created_at, done_at "
+        "FROM notifications WHERE done_at IS NULL ORDER BY id LIMIT ?", (limit,)
+    )
+    return [dict(row, payload=json.loads(row["payload"])) for row in rows]
+
+def save_notification_progress(notification_id, cursor, sent, failed, done=False):
+    """
+    Сохранение прогресса задания рассылки (контрольная точка).
+
+    Args:
+        notification_id (int): ID задания
+        cursor (int): Наибольший user_id, до которого рассылка выполнена
+        sent (int): Отправлено сообщений
+        failed (int): Не доставлено сообщений
+        done (bool): Задание завершено
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "UPDATE notifications SET cursor = ?, sent = ?, failed = ?, done_at = ? WHERE id = ?",
+            (cursor, sent, failed, datetime.now().isoformat() if done else None, notification_id)
+        )
+
+def load_bot_state(kind, since=None):
+    """
+    Загрузка состояния бота (см. persistence.py).
+
+    Args:
+        kind (str): Вид состояния, например "user_data" или "conversation:report"
+        since (float): Не возвращать записи, измененные раньше (время Unix)
+
+    Returns:
+        dict: {ключ: значение}
+    """
+    rows = get_connection().execute(
+        "SELECT key, value FROM bot_state WHERE kind = ? AND updated_at >= ?", (kind, since or 0)
+    )
+    return {row["key"]: json.loads(row["value"]) for row in rows}
+
+def get_bot_state(entries, since=None):
+    """
+    Загрузка отдельных записей состояния бота (обновление перед обработкой
+    обновления в вебхуке, см. persistence.py).
+
+    Args:
+        entries (list): Пары (вид, ключ)
+        since (float): Не возвращать записи, измененные раньше (время Unix)
+
+    Returns:
+        dict: {(вид, ключ): (значение, время изменения (Unix))} для найденных записей
+    """
+    conn = get_connection()
+    result = {}
+    for kind, key in entries:
+        row = conn.execute(
+            "SELECT value, updated_at FROM bot_state WHERE kind = ? AND key = ? AND updated_at >= ?",
+            (kind, key, since or 0)
+        ).fetchone()
+        if row:
+            result[(kind, key)] = (json.loads(row["value"]), row["updated_at"])
+    return result
+
+def save_bot_state(changes):
+    """
+    Запись изменений состояния бота одной транзакцией.
+
+    Args:
+        changes (list): Тройки (вид, ключ, значение); значение None удаляет запись
+
+    Returns:
+        float: Время изменения записанных записей (Unix)
+    """
+    now = time.time()
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO bot_state (kind, key, value, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(kind, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            [(kind, key, json.dumps(value, ensure_ascii=False), now)
+             for kind, key, value in changes if value is not None]
+        )
+        conn.executemany(
+            "DELETE FROM bot_state WHERE kind = ? AND key = ?",
+            [(kind, key) for kind, key, value in changes if value is None]
+        )
+    return now
+
+def purge_bot_state(before):
+    """
+    Удаление записей состояния бота, измененных раньше указанного времени.
+
+    Returns:
+        int: Количество удаленных записей
+    """
+    conn = get_connection()
+    with conn:
+        return conn.execute("DELETE FROM bot_state WHERE updated_at < ?", (before,)).rowcount
+
+def get_user_stats(user_id):
+    """Получение статистики пользователя"""
+    row = get_connection().execute(
+        "SELECT username, reports_count, joined_at FROM users WHERE user_id = ?", (user_id,)
+    ).fetchone()
+    return dict(row) if row else None
+
+def migrate_from_json(data):
+    """
+    Импорт данных JSON-базы (см. database.py) в SQLite.
+
+    Идентификаторы отчетов сохраняются, поэтому повторный импорт
+    не создает дубликатов.
+
+    Args:
+        data (dict): Данные в формате database.get_data()
+
+    Returns:
+        int: Количество импортированных отчетов
+    """
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO reports (id, user_id, username, problem_type, description, location, city, "
+            "lat, lon, geo_cell, photo_id, timestamp, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (r["id"], r["user_id"], r.get("username"), r.get("problem_type"), r.get("description"),
+                 r.get("location"), resolve_city(r.get("location")), *_geo_columns(r.get("location")),
+                 r.get("photo_id"), r["timestamp"], r.get("status", "new"))
+                for r in data["reports"]
+            )
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO users (user_id, username, reports_count, joined_at) VALUES (?, ?, ?, ?)",
+            (
+                (int(user_id), u.get("username"), u.get("reports_count", 0), u.get("joined_at"))
+                for user_id, u in data["users"].items()
+            )
+        )
+        _bump_data_version(conn)
+    rebuild_city_stats()
+    return len(data["reports"])
@@ -0,0 +1,104 @@
+"""
+Асинхронный доступ к базе данных EcoMap KZ.
+
+Бэкенды базы данных (database.py, database_sqlite.py, database_mongo.py)
+синхронные. Чтобы обращение к файлу или к MongoDB Atlas не останавливало
+цикл событий бота, вызовы выполняются в отдельном пуле потоков.
+
+Бэкенд выбирается переменной окружения DB_BACKEND: json (по умолчанию),
+sqlite или mongo.
+"""
+
+import asyncio
+import importlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Модули бэкендов базы данных
+BACKENDS = {
+    "json": "database",
+    "sqlite": "database_sqlite",
+    "mongo": "database_mongo",
+}
+
+# Количество потоков для обращений к базе данных
+DB_THREADS = int(os.getenv("DB_THREADS", "8"))
+
+_backend = None
+_executor = None
+
+def get_backend():
+    """Модуль выбранного бэкенда базы данных (импортируется при первом обращении)"""
+    global _backend
+    if _backend is None:
+        _backend = importlib.import_module(BACKENDS[os.getenv("DB_BACKEND", "json")])
+    return _backend
+
+async def run(func, *args, **kwargs):
+    """Выполнение синхронной функции в пуле потоков базы данных"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+
+async def add_report(user_id, username, problem_type, description, location, photo_id=None):
+    """Добавление нового отчета о проблеме"""
+    return await run(get_backend().add_report, user_id, username, problem_type, description, location, photo_id)
+
+async def get_user_reports(user_id):
+    """Получение отчетов пользователя"""
+    return await run(get_backend().get_user_reports, user_id)
+
+async def get_report_by_id(report_id):
+    """Получение отчета по ID"""
+    return await run(get_backend().get_report_by_id, report_id)
+
+async def update_report_status(report_id, new_status):
+    """Обновление статуса отчета"""
+    return await run(get_backend().update_report_status, report_id, new_status)
+
+async def get_user_stats(user_id):
+    """Получение статистики пользователя"""
+    return await run(get_backend().get_user_stats, user_id)
+
+async def get_city_stats(city):
+    """Получение счетчиков отчетов города"""
+    return await run(get_backend().get_city_stats, city)
+
+async def get_data_version():
+    """Версия данных отчетов"""
+    return await run(get_backend().get_data_version)
+
+async def reports_near(lat, lon, radius_km, limit=None):
+    """Отчеты в радиусе от точки"""
+    return await run(get_backend().reports_near, lat, lon, radius_km, limit)
+
+async def get_events():
+    """Мероприятия, добавленные через add_event"""
+    return await run(get_backend().get_events)
+
+async def subscribe_events(user_id, city):
+    """Подписка пользователя на новые мероприятия города"""
+    return await run(get_backend().subscribe_events, user_id, city)
+
+async def unsubscribe_events(user_id, city=None):
+    """Отмена подписки на мероприятия города (None — всех городов)"""
+    return await run(get_backend().unsubscribe_events, user_id, city)
+
+async def get_event_subscriptions(user_id):
+    """Города, на мероприятия которых подписан пользователь"""
+    return await run(get_backend().get_event_subscriptions, user_id)
+
+async def subscribe_alerts(user_id, city, threshold):
+    """Подписка на оповещения о превышении порога PM2.5 в городе"""
+    return await run(get_backend().subscribe_alerts, user_id, city, threshold)
+
+async def unsubscribe_alerts(user_id, city=None):
+    """Отмена оповещений о качестве воздуха города (None — всех городов)"""
+    return await run(get_backend().unsubscribe_alerts, user_id, city)
+
+async def get_alert_subscriptions(user_id):
+    """Пороги оповещений пользователя: {город: порог PM2.5}"""
+    return await run(get_backend().get_alert_subscriptions, user_id)
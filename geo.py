@@ -0,0 +1,309 @@
+"""
+Утилиты для определения города и координат по текстовому описанию местоположения.
+
+Названия ищутся по офлайн-справочнику (газеттиру) населенных пунктов
+Казахстана (data/kz_cities.json) и достопримечательностей, районов
+и природных объектов (data/kz_landmarks.json). Все названия и их варианты
+собраны в словарный индекс по первому слову, поэтому текст просматривается
+за один проход, а многословные названия и падежные окончания
+("в Караганде", "Шымкенте") распознаются без перебора справочника.
+Результаты запоминаются для каждой строки местоположения.
+
+Геолокация из Telegram ("Координаты: lat, lon") относится к городу,
+центр которого (или центр одного из его районов) ближе всего к точке:
+поиск выполняется по KD-дереву центров (см. spatial.KDTree).
+"""
+
+import json
+import math
+import os
+import re
+import threading
+from collections import namedtuple
+from functools import lru_cache
+
+from spatial import KDTree
+
+# Файлы справочника
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CITIES_FILE = os.path.join(DATA_DIR, "kz_cities.json")
+LANDMARKS_FILE = os.path.join(DATA_DIR, "kz_landmarks.json")
+
+# Сколько букв падежного окончания допускается после основы названия
+MAX_SUFFIX = 3
+# Названия короче этого сравниваются только целиком ("Шу", "Абай")
+MIN_STEM_LENGTH = 5
+
+# Слова, после которых название относится к улице или микрорайону, а не к городу
+STREET_WORDS = {
+    "ул", "улица", "пр", "проспект", "мкр", "микрорайон", "пер", "переулок",
+    "бульвар", "шоссе", "наб", "набережная", "пл", "площадь",
+}
+
+# Максимальное расстояние от центра города или района, при котором точка
+# еще относится к городу (дальше — отчет остается без города)
+MAX_CITY_DISTANCE_KM = 30
+
+# Количество запоминаемых результатов
+CACHE_SIZE = 8192
+
+# Замена казахских букв и ё для сравнения названий
+_FOLD = str.maketrans({
+    "ё": "е", "ә": "а", "ғ": "г", "қ": "к", "ң": "н", "ө": "о",
+    "ұ": "у", "ү": "у", "һ": "х", "і": "и",
+})
+_TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+_STEM_ENDINGS = "аеиоуыэюяйь"
+
+# Найденное место: kind — "city", "district" (район города) или "landmark",
+# city — город, к которому относится место (для города — он сам,
+# для объекта вне городов — None)
+Place = namedtuple("Place", ["name", "kind", "city", "lat", "lon"])
+
+def fold(text):
+    """Нижний регистр с заменой казахских букв и ё"""
+    return text.lower().translate(_FOLD)
+
+def tokenize(text):
+    """Слова текста в форме для сравнения"""
+    return _TOKEN_RE.findall(fold(text))
+
+def _stem(token):
+    """Основа слова названия без окончания (None для коротких слов)"""
+    if len(token) < MIN_STEM_LENGTH:
+        return None
+    return token.rstrip(_STEM_ENDINGS) or token
+
+def _token_matches(pattern, token):
+    """Совпадает ли слово текста со словом названия с учетом окончания"""
+    word, stem = pattern
+    if token == word:
+        return True
+    return stem is not None and token.startswith(stem) and len(token) - len(stem) <= MAX_SUFFIX
+
+class Gazetteer:
+    """
+    Индекс названий мест.
+
+    Args:
+        cities (list): Города: словари с полями name, aliases, lat, lon
+        landmarks (list): Объекты и районы: словари с полями name, aliases,
+            city, lat, lon и необязательным kind ("district" для районов)
+    """
+
+    def __init__(self, cities, landmarks=()):
+        # Основа первого слова -> [(слова названия, место)]
+        self._index = {}
+        self.cities = {}
+        # Центры городов и относящихся к ним районов и объектов
+        centers = []
+        districts = []
+        for city in cities:
+            place = Place(city["name"], "city", city["name"], city["lat"], city["lon"])
+            self.cities[city["name"]] = place
+            self._add(place, [city["name"]] + city.get("aliases", []))
+            centers.append(place)
+            districts.append(place)
+        for landmark in landmarks:
+            place = Place(landmark["name"], landmark.get("kind", "landmark"), landmark.get("city"),
+                          landmark["lat"], landmark["lon"])
+            self._add(place, [landmark["name"]] + landmark.get("aliases", []))
+            if place.city:
+                centers.append(place)
+            if place.kind == "district":
+                districts.append(place)
+        self._centers = KDTree([(place.lat, place.lon) for place in centers], centers)
+        # Только города и районы: для разбиения территории на районы
+        self._districts = KDTree([(place.lat, place.lon) for place in districts], districts)
+
+    def _add(self, place, names):
+        for name in names:
+            patterns = tuple((word, _stem(word)) for word in tokenize(name))
+            if patterns:
+                word, stem = patterns[0]
+                self._index.setdefault(stem or word, []).append((patterns, place))
+
+    def find_all(self, text):
+        """
+        Все места, упомянутые в тексте.
+
+        Returns:
+            list: Кортежи (позиция слова, количество слов, место)
+        """
+        tokens = tokenize(text)
+        found = []
+        for i, token in enumerate(tokens):
+            if i > 0 and tokens[i - 1] in STREET_WORDS:
+                continue
+            # Кандидаты: названия, основа первого слова которых — начало слова текста
+            for cut in range(min(MAX_SUFFIX, len(token) - 1) + 1):
+                candidates = self._index.get(token[:len(token) - cut])
+                if not candidates:
+                    continue
+                for patterns, place in candidates:
+                    if i + len(patterns) > len(tokens):
+                        continue
+                    if all(_token_matches(p, t) for p, t in zip(patterns, tokens[i:i + len(patterns)])):
+                        found.append((i, len(patterns), place))
+        return found
+
+    def geocode(self, text):
+        """
+        Самое точное место, упомянутое в тексте: объект или район важнее города,
+        длинное название важнее короткого, раннее упоминание важнее позднего.
+
+        Returns:
+            Place: Найденное место или None
+        """
+        found = self.find_all(text)
+        if not found:
+            return None
+        _, _, place = max(found, key=lambda m: (m[2].kind != "city", m[1], -m[0]))
+        return place
+
+    def nearest(self, lat, lon, max_distance_km=MAX_CITY_DISTANCE_KM):
+        """
+        Город или район, центр которого ближе всего к точке.
+
+        Returns:
+            Place: Место (его город — place.city) или None, если ближайший
+            центр дальше max_distance_km
+        """
+        found = self._centers.nearest(lat, lon)
+        if found is None or found[0] > max_distance_km:
+            return None
+        return found[1]
+
+    def nearest_districts(self, points, max_distance_km=MAX_CITY_DISTANCE_KM):
+        """
+        Районы (или города без районов), центры которых ближе всего
+        к точкам (векторно, для многих точек сразу).
+
+        Args:
+            points (list): Пары (широта, долгота)
+
+        Returns:
+            list: Места (или None, если центр дальше max_distance_km) в порядке points
+        """
+        return [found[1] if found and found[0] <= max_distance_km else None
+                for found in self._districts.nearest_many(points)]
+
+    def nearest_cities(self, points, max_distance_km=MAX_CITY_DISTANCE_KM):
+        """
+        Города для многих точек сразу (векторно, для массовой переклассификации).
+
+        Args:
+            points (list): Пары (широта, долгота)
+
+        Returns:
+            list: Названия городов (или None) в порядке points
+        """
+        return [found[1].city if found and found[0] <= max_distance_km else None
+                for found in self._centers.nearest_many(points)]
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+def _load(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def get_gazetteer():
+    """Справочник мест (загружается при первом обращении)"""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer(_load(CITIES_FILE), _load(LANDMARKS_FILE))
+    return _gazetteer
+
+@lru_cache(maxsize=CACHE_SIZE)
+def geocode(location_text):
+    """
+    Место, упомянутое в описании местоположения (результат запоминается).
+
+    Args:
+        location_text (str): Текстовое описание местоположения
+
+    Returns:
+        Place: Найденное место или None
+    """
+    if not location_text:
+        return None
+    return get_gazetteer().geocode(location_text)
+
+def resolve_city(location_text):
+    """
+    Определяет город, упомянутый в описании местоположения,
+    а для координат из Telegram — ближайший город.
+
+    Args:
+        location_text (str): Текстовое описание местоположения
+
+    Returns:
+        str: Название города или None, если город не распознан
+    """
+    # Координаты из Telegram не содержат названий: город определяется по ближайшему центру
+    coords = parse_coordinates(location_text)
+    place = get_gazetteer().nearest(*coords) if coords else geocode(location_text)
+    return place.city if place else None
+
+def nearest_cities(points):
+    """
+    Города, к которым относятся точки (см. Gazetteer.nearest_cities).
+
+    Args:
+        points (list): Пары (широта, долгота)
+
+    Returns:
+        list: Названия городов (или None) в порядке points
+    """
+    return get_gazetteer().nearest_cities(points)
+
+def parse_coordinates(location_text):
+    """
+    Извлекает координаты из строки вида "Координаты: lat, lon".
+
+    Args:
+        location_text (str): Текстовое описание местоположения
+
+    Returns:
+        tuple: (lat, lon) или None, если строка не содержит координат
+    """
+    if not location_text:
+        return None
+    start = location_text.find("Координаты:")
+    if start < 0:
+        return None
+    lat, sep, lon = location_text[start + len("Координаты:"):].partition(",")
+    if not sep:
+        return None
+    try:
+        lat, lon = float(lat), float(lon)
+    except ValueError:
+        return None
+    # nan, inf и координаты вне диапазона считаются обычным текстом
+    if not (math.isfinite(lat) and math.isfinite(lon) and -90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return (lat, lon)
+
+def location_coords(location_text):
+    """
+    Определяет координаты местоположения: точные координаты, если они
+    указаны (геолокация из Telegram), иначе координаты упомянутого места.
+
+    Args:
+        location_text (str): Текстовое описание местоположения
+
+    Returns:
+        tuple: (lat, lon) или None, если не удалось определить
+    """
+    coords = parse_coordinates(location_text)
+    if coords:
+        return coords
+    place = geocode(location_text)
+    if place:
+        return (place.lat, place.lon)
+    return None
@@ -0,0 +1,181 @@
+"""
+Журналируемое хранилище для JSON-базы данных EcoMap KZ.
+
+Данные хранятся в двух файлах:
+- снимок (snapshot) — полный JSON с состоянием на момент последнего сжатия;
+- журнал (log) — построчный JSON, в конец которого дописываются операции,
+  выполненные после снимка.
+
+Каждая запись дописывает в журнал одну короткую строку, поэтому ее стоимость
+не зависит от общего количества отчетов. Когда журнал становится сопоставим
+по размеру со снимком, выполняется сжатие: состояние целиком записывается
+в новый снимок, а журнал очищается.
+"""
+
+import json
+import os
+
+class Journal:
+    """
+    Журнал операций со снимком состояния.
+
+    Args:
+        snapshot_path (str): Путь к файлу снимка
+        log_path (str): Путь к файлу журнала
+        compact_ratio (float): Сжатие выполняется, когда размер журнала
+            превышает размер снимка, умноженный на это значение
+        min_compact_bytes (int): Минимальный размер журнала для сжатия
+        fsync (bool): Вызывать ли fsync после каждой записи
+    """
+
+    def __init__(self, snapshot_path, log_path, compact_ratio=1.0,
+                 min_compact_bytes=1024 * 1024, fsync=True):
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path
+        self.compact_ratio = compact_ratio
+        self.min_compact_bytes = min_compact_bytes
+        self.fsync = fsync
+        self.seq = 0
+        self._log = None
+        self._log_bytes = 0
+        self._snapshot_bytes = 0
+
+    def load_snapshot(self, default):
+        """
+        Загружает снимок состояния.
+
+        Args:
+            default (dict): Данные, если снимок отсутствует или поврежден
+
+        Returns:
+            dict: Состояние на момент снимка
+        """
+        data = default
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self._snapshot_bytes = os.path.getsize(self.snapshot_path)
+            except json.JSONDecodeError:
+                print(f"Ошибка чтения файла {self.snapshot_path}. Создание новой структуры данных.")
+                data = default
+
+        # Номер последней операции, вошедшей в снимок
+        self.seq = data.pop("seq", 0)
+        return data
+
+    def replay(self, apply):
+        """
+        Применяет операции из журнала, выполненные после снимка,
+        и открывает журнал для дописывания.
+
+        Args:
+            apply (callable): Функция apply(op), применяющая операцию
+        """
+        valid_bytes = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'rb') as f:
+                for line in f:
+                    # Незавершенная последняя строка означает сбой во время записи
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        op = json.loads(line)
+                    except ValueError:
+                        break
+                    valid_bytes += len(line)
+                    # Операции, уже попавшие в снимок, пропускаем
+                    if op["seq"] <= self.seq:
+                        continue
+                    apply(op)
+                    self.seq = op["seq"]
+
+            # Отрезаем поврежденный хвост, чтобы новые записи не склеились с ним
+            if valid_bytes < os.path.getsize(self.log_path):
+                with open(self.log_path, 'r+b') as f:
+                    f.truncate(valid_bytes)
+
+        self._log_bytes = valid_bytes
+        self._log = open(self.log_path, 'ab')
+
+    def append(self, op):
+        """
+        Дописывает операцию в журнал.
+
+        Args:
+            op (dict): Операция (сериализуемый в JSON словарь)
+
+        Returns:
+            bool: True, если пора выполнить сжатие
+
+        Raises:
+            OSError: Запись не удалась; журнал остается в прежнем состоянии
+        """
+        line = (json.dumps(dict(op, seq=self.seq + 1), ensure_ascii=False) + "\n").encode('utf-8')
+        try:
+            self._log.write(line)
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+        except OSError:
+            self._discard_tail()
+            raise
+        self.seq += 1
+        op["seq"] = self.seq
+        self._log_bytes += len(line)
+        return self._log_bytes >= max(self.min_compact_bytes,
+                                      self._snapshot_bytes * self.compact_ratio)
+
+    def _discard_tail(self):
+        """Удаление недописанной строки после ошибки записи"""
+        try:
+            self._log.close()
+        except OSError:
+            pass  # Буфер с недописанной строкой не нужен
+        with open(self.log_path, 'r+b') as f:
+            f.truncate(self._log_bytes)
+        self._log = open(self.log_path, 'ab')
+
+    def compact(self, data):
+        """
+        Записывает полное состояние в новый снимок и очищает журнал.
+
+        Снимок сначала пишется во временный файл и атомарно подменяет старый,
+        поэтому при сбое на диске всегда остается целый снимок. Операции
+        из журнала, попавшие в снимок, при следующей загрузке пропускаются
+        по номеру seq.
+
+        Args:
+            data (dict): Текущее состояние
+        """
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(data, seq=self.seq), f, ensure_ascii=False, indent=2)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self._fsync_dir()
+        self._snapshot_bytes = os.path.getsize(self.snapshot_path)
+
+        self._log.truncate(0)
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+        self._log_bytes = 0
+
+    def close(self):
+        """Закрывает файл журнала"""
+        if self._log:
+            self._log.close()
+            self._log = None
+
+    def _fsync_dir(self):
+        """Сохраняет на диск запись каталога после переименования снимка"""
+        if not self.fsync or os.name == 'nt':
+            return
+        fd = os.open(os.path.dirname(os.path.abspath(self.snapshot_path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Служебные команды для обслуживания базы данных EcoMap KZ.
+
+Примеры:
+    python manage.py migrate --backend mongo
+    python manage.py migrate-json --json user_reports.json --sqlite user_reports.db
+    python manage.py rebuild-stats --backend sqlite
+    python manage.py reclassify --backend sqlite
+    python manage.py set-status 42 resolved --backend sqlite
+    python manage.py add-event --name "Субботник" --date "1 мая" --location "Парк Горького, Алматы"
+    python manage.py notify --backend sqlite
+"""
+
+import argparse
+import asyncio
+import importlib
+
+# Модули бэкендов базы данных
+BACKENDS = {
+    "json": "database",
+    "sqlite": "database_sqlite",
+    "mongo": "database_mongo",
+}
+
+def migrate(args):
+    """Создание таблиц и индексов базы данных (выполняется при развертывании)"""
+    backend = importlib.import_module(BACKENDS[args.backend])
+    backend.init_db()
+
+def migrate_json(args):
+    """Импорт JSON-базы в SQLite"""
+    import database
+    import database_sqlite
+
+    database.DATA_FILE = args.json
+    database.LOG_FILE = args.json.rsplit(".", 1)[0] + ".log"
+    database_sqlite.close_db()
+    database_sqlite.DB_FILE = args.sqlite
+    database_sqlite.init_db()
+
+    count = database_sqlite.migrate_from_json(database.get_data())
+    print(f"Импортировано отчетов: {count} ({args.json} -> {args.sqlite})")
+
+def rebuild_stats(args):
+    """Пересчет счетчиков отчетов по городам"""
+    backend = importlib.import_module(BACKENDS[args.backend])
+    problems = backend.rebuild_city_stats()
+    if problems:
+        print(f"Найдено расхождений в счетчиках: {len(problems)} (исправлены)")
+        for problem in problems:
+            print(f"  {problem}")
+    else:
+        print("Счетчики по городам совпадают с отчетами")
+
+def reclassify(args):
+    """Повторное определение города у отчетов с координатами из Telegram"""
+    backend = importlib.import_module(BACKENDS[args.backend])
+    total, changed = backend.reclassify_cities()
+    print(f"Отчетов с координатами: {total}, город изменен у {changed}")
+
+def set_status(args):
+    """Смена статуса отчета (автор получит уведомление при следующей рассылке)"""
+    backend = importlib.import_module(BACKENDS[args.backend])
+    if backend.update_report_status(args.report_id, args.status):
+        print(f"Статус отчета #{args.report_id}: {args.status}")
+    else:
+        print(f"Отчет #{args.report_id} не найден")
+
+def add_event(args):
+    """Добавление мероприятия с объявлением подписчикам города"""
+    import geo
+
+    backend = importlib.import_module(BACKENDS[args.backend])
+    city = (geo.resolve_city(args.city) or args.city) if args.city else geo.resolve_city(args.location)
+    event = backend.add_event(args.name, args.date, args.location, args.description, city)
+    if city:
+        print(f"Мероприятие #{event['id']} добавлено, объявление подписчикам города {city} поставлено в очередь")
+    else:
+        print(f"Мероприятие #{event['id']} добавлено; город не определен, объявление не рассылается (укажите --city)")
+
+def notify(args):
+    """Рассылка накопившихся уведомлений (для вебхука, где бот не работает постоянно)"""
+    import bot
+    import db_async
+    import notifications
+    import send_queue
+    from telegram.ext import ExtBot
+
+    db_async._backend = importlib.import_module(BACKENDS[args.backend])
+
+    async def run():
+        telegram_bot = ExtBot(bot.TOKEN, rate_limiter=send_queue.SendScheduler())
+        await telegram_bot.initialize()
+        engine = notifications.NotificationEngine(telegram_bot)
+        try:
+            count = await engine.run_pending()
+        finally:
+            await telegram_bot.shutdown()
+        print(f"Выполнено заданий: {count}, отправлено сообщений: {engine.stats['sent']}, "
+              f"не доставлено: {engine.stats['failed']}")
+
+    asyncio.run(run())
+
+def main():
+    parser = argparse.ArgumentParser(description="Служебные команды EcoMap KZ")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    schema_parser = subparsers.add_parser("migrate", help="создание таблиц и индексов")
+    schema_parser.add_argument("--backend", choices=BACKENDS, default="json", help="бэкенд базы данных")
+    schema_parser.set_defaults(func=migrate)
+
+    migrate_parser = subparsers.add_parser("migrate-json", help="импорт user_reports.json в SQLite")
+    migrate_parser.add_argument("--json", default="user_reports.json", help="путь к JSON-базе")
+    migrate_parser.add_argument("--sqlite", default="user_reports.db", help="путь к базе SQLite")
+    migrate_parser.set_defaults(func=migrate_json)
+
+    stats_parser = subparsers.add_parser("rebuild-stats", help="пересчет счетчиков отчетов по городам")
+    stats_parser.add_argument("--backend", choices=BACKENDS, default="json", help="бэкенд базы данных")
+    stats_parser.set_defaults(func=rebuild_stats)
+
+    reclassify_parser = subparsers.add_parser("reclassify", help="определение города по координатам отчетов")
+    reclassify_parser.add_argument("--backend", choices=BACKENDS, default="json", help="бэкенд базы данных")
+    reclassify_parser.set_defaults(func=reclassify)
+
+    status_parser = subparsers.add_parser("set-status", help="смена статуса отчета с уведомлением автора")
+    status_parser.add_argument("report_id", type=int, help="ID отчета")
+    status_parser.add_argument("status", choices=["new", "in-progress", "resolved"], help="новый статус")
+    status_parser.add_argument("--backend", choices=BACKENDS, default="json", help="бэкенд базы данных")
+    status_parser.set_defaults(func=set_status)
+
+    event_parser = subparsers.add_parser("add-event", help="добавление мероприятия с объявлением подписчикам")
+    event_parser.add_argument("--name", required=True, help="название")
+    event_parser.add_argument("--date", required=True, help="дата")
+    event_parser.add_argument("--location", required=True, help="место проведения")
+    event_parser.add_argument("--description", default="", help="описание")
+    event_parser.add_argument("--city", help="город подписчиков (по умолчанию определяется по месту)")
+    event_parser.add_argument("--backend", choices=BACKENDS, default="json", help="бэкенд базы данных")
+    event_parser.set_defaults(func=add_event)
+
+    notify_parser = subparsers.add_parser("notify", help="рассылка накопившихся уведомлений")
+    notify_parser.add_argument("--backend", choices=BACKENDS, default="json", help="бэкенд базы данных")
+    notify_parser.set_defaults(func=notify)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
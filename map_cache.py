@@ -0,0 +1,164 @@
+"""
+Кеш сгенерированных файлов карт.
+
+Генерация карты folium и запись HTML занимают заметное время, поэтому
+готовые файлы переиспользуются, пока не изменились данные, по которым
+они построены. Ключ записи — (город, версия данных); при появлении новой
+версии карты того же города старый файл удаляется. Размер кеша ограничен
+количеством записей и суммарным объемом файлов (вытесняются давно
+не использованные записи).
+
+Агрегаты, по которым строятся карты (например, сетки плотности отчетов),
+хранятся в памяти в AggregateCache с той же схемой ключей.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+def data_fingerprint(data):
+    """Короткий отпечаток данных (например, экологических данных города)"""
+    raw = json.dumps(data, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:12]
+
+class MapCache:
+    """
+    LRU-кеш файлов карт.
+
+    Args:
+        directory (str): Каталог для файлов (по умолчанию временный каталог,
+            который удаляется при завершении процесса)
+        max_entries (int): Максимальное количество файлов
+        max_bytes (int): Максимальный суммарный размер файлов
+        suffix (str): Расширение файлов
+    """
+
+    def __init__(self, directory=None, max_entries=32, max_bytes=64 * 1024 * 1024, suffix=".html"):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # (city, version) -> (path, size)
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def _new_path(self):
+        """Путь для нового файла кеша"""
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="ecomap_maps_")
+            atexit.register(shutil.rmtree, self.directory, True)
+        os.makedirs(self.directory, exist_ok=True)
+        self._counter += 1
+        return os.path.join(self.directory, f"map_{os.getpid()}_{self._counter}{self.suffix}")
+
+    def get(self, key):
+        """Путь к файлу для ключа (city, version) или None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def get_or_create(self, key, render):
+        """
+        Возвращает файл карты из кеша или создает его.
+
+        Args:
+            key (tuple): (город, версия данных)
+            render (callable): Функция render(path), записывающая карту в path
+
+        Returns:
+            str: Путь к файлу карты
+        """
+        path = self.get(key)
+        if path is not None:
+            return path
+
+        with self._lock:
+            path = self._new_path()
+        render(path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            # Карты того же города с другой версией данных больше не нужны
+            for old_key in [k for k in self._entries if k[0] == key[0] and k != key]:
+                self._remove(old_key)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (path, size)
+            self.total_bytes += size
+            # Только что созданный файл не вытесняется, даже если он превышает лимит
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+        return path
+
+    def invalidate(self, city=None):
+        """Удаление карт города (или всех карт, если город не указан)"""
+        with self._lock:
+            for key in [k for k in self._entries if city is None or k[0] == city]:
+                self._remove(key)
+
+    def _remove(self, key):
+        """Удаление записи и ее файла"""
+        path, size = self._entries.pop(key)
+        self.total_bytes -= size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+# Общий кеш HTML-карт городов
+city_maps = MapCache()
+
+class AggregateCache:
+    """
+    LRU-кеш агрегатов в памяти с ключами (город, версия данных), как у MapCache.
+
+    Args:
+        max_entries (int): Максимальное количество записей
+    """
+
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key, build):
+        """
+        Возвращает агрегат из кеша или строит его.
+
+        Args:
+            key (tuple): (город, версия данных)
+            build (callable): Функция без аргументов, возвращающая агрегат
+
+        Returns:
+            Агрегат, построенный build
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = build()
+        with self._lock:
+            for old_key in [k for k in self._entries if k[0] == key[0] and k != key]:
+                del self._entries[old_key]
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, city=None):
+        """Удаление агрегатов города (или всех, если город не указан)"""
+        with self._lock:
+            for key in [k for k in self._entries if city is None or k[0] == city]:
+                del self._entries[key]
+
+# Сетки плотности отчетов по городам (см. map_utils.get_density_grid)
+density_grids = AggregateCache()
@@ -0,0 +1,189 @@
+"""
+Отрисовка карт городов в PNG для отправки в Telegram.
+
+Карта собирается из локально сохраненных тайлов OpenStreetMap
+(каталог MAP_TILE_DIR со структурой {z}/{x}/{y}.png), поверх которых
+рисуются маркер города и маркеры отчетов о проблемах. Сеть не используется:
+если тайла нет, на его месте остается однотонный фон.
+
+Готовые изображения кешируются в памяти, а после первой отправки
+в Telegram запоминается file_id фотографии, и повторные просмотры
+отправляются по нему без повторной загрузки файла.
+"""
+
+import math
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont
+
+import map_utils
+
+# Каталог с локальными тайлами
+TILE_DIR = os.getenv("MAP_TILE_DIR", "tiles")
+TILE_SIZE = 256
+
+# Размер изображения и масштаб по умолчанию
+DEFAULT_WIDTH = 800
+DEFAULT_HEIGHT = 600
+DEFAULT_ZOOM = 12
+
+BACKGROUND_COLOR = (232, 232, 228)
+
+# Цвета маркеров (названия цветов folium -> RGB)
+MARKER_COLORS = {
+    "green": (114, 176, 38),
+    "orange": (246, 151, 48),
+    "red": (214, 62, 42),
+    "black": (48, 48, 48),
+    "blue": (56, 170, 221),
+    "purple": (208, 80, 182),
+    "darkred": (162, 51, 54),
+    "gray": (87, 87, 87),
+}
+
+# Кеш PNG: ключ карты -> байты изображения
+MAX_CACHED_IMAGES = 64
+_images = OrderedDict()
+# Ключ карты -> file_id фотографии, уже загруженной в Telegram
+_file_ids = {}
+_lock = threading.Lock()
+
+def lonlat_to_pixel(lat, lon, zoom):
+    """Глобальные пиксельные координаты точки в проекции Web Mercator"""
+    scale = TILE_SIZE * (2 ** zoom)
+    x = (lon + 180.0) / 360.0 * scale
+    lat_rad = math.radians(max(-85.0511, min(85.0511, lat)))
+    y = (1.0 - math.log(math.tan(lat_rad) + 1.0 / math.cos(lat_rad)) / math.pi) / 2.0 * scale
+    return x, y
+
+@lru_cache(maxsize=256)
+def _load_tile(tile_dir, zoom, x, y):
+    """Загрузка тайла из локального каталога (None, если тайла нет)"""
+    path = os.path.join(tile_dir, str(zoom), str(x), f"{y}.png")
+    if not os.path.exists(path):
+        return None
+    with Image.open(path) as tile:
+        return tile.convert("RGB")
+
+def _draw_marker(draw, x, y, color, radius):
+    """Круглый маркер с белой обводкой"""
+    draw.ellipse((x - radius - 2, y - radius - 2, x + radius + 2, y + radius + 2), fill=(255, 255, 255))
+    draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+
+def render_city_png(city_name, data, reports, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT,
+                    zoom=DEFAULT_ZOOM, tile_dir=None):
+    """
+    Рисует карту города с маркерами в PNG.
+
+    Args:
+        city_name (str): Название города
+        data (dict): Экологические данные города (как в config.ECO_DATA)
+        reports (list): Отчеты о проблемах для отображения на карте
+        width (int): Ширина изображения
+        height (int): Высота изображения
+        zoom (int): Масштаб карты
+        tile_dir (str): Каталог с тайлами (по умолчанию TILE_DIR)
+
+    Returns:
+        bytes: Изображение в формате PNG
+    """
+    tile_dir = tile_dir or TILE_DIR
+    center_x, center_y = lonlat_to_pixel(data['lat'], data['lon'], zoom)
+    left = center_x - width / 2
+    top = center_y - height / 2
+
+    image = Image.new("RGB", (width, height), BACKGROUND_COLOR)
+
+    # Собираем мозаику из тайлов, покрывающих изображение
+    max_tile = 2 ** zoom
+    for tile_x in range(int(left // TILE_SIZE), int((left + width) // TILE_SIZE) + 1):
+        for tile_y in range(int(top // TILE_SIZE), int((top + height) // TILE_SIZE) + 1):
+            if not 0 <= tile_y < max_tile:
+                continue
+            tile = _load_tile(tile_dir, zoom, tile_x % max_tile, tile_y)
+            if tile is not None:
+                image.paste(tile, (int(tile_x * TILE_SIZE - left), int(tile_y * TILE_SIZE - top)))
+
+    draw = ImageDraw.Draw(image)
+
+    # Маркеры отчетов о проблемах
+    for report in reports:
+        coords = map_utils.get_report_coords(report)
+        if not coords:
+            continue
+        x, y = lonlat_to_pixel(coords[0], coords[1], zoom)
+        x, y = x - left, y - top
+        if 0 <= x < width and 0 <= y < height:
+            color, _ = map_utils.get_problem_marker_style(report['problem_type'])
+            _draw_marker(draw, x, y, MARKER_COLORS[color], 5)
+
+    # Маркер города с цветом по качеству воздуха
+    if data['air_quality'] is None:
+        city_color = "gray"
+    elif data['air_quality'] == "Хороший":
+        city_color = "green"
+    elif data['air_quality'] == "Средний":
+        city_color = "orange"
+    else:
+        city_color = "red"
+    _draw_marker(draw, width / 2, height / 2, MARKER_COLORS[city_color], 10)
+
+    font = ImageFont.load_default()
+    pm25 = data['pm25'] if data['pm25'] is not None else "нет данных"
+    draw.text((10, 10), f"PM2.5: {pm25}", fill=(0, 0, 0), font=font)
+    draw.text((width - 150, height - 18), "© OpenStreetMap", fill=(60, 60, 60), font=font)
+
+    buffer = BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+def get_city_photo(city_name, data, reports_version, load_reports):
+    """
+    Возвращает фотографию карты города для отправки в Telegram.
+
+    Args:
+        city_name (str): Название города
+        data (dict): Экологические данные города
+        reports_version: Версия данных отчетов (см. database.get_data_version)
+        load_reports (callable): Функция, возвращающая отчеты для карты;
+            вызывается только если изображения нет в кеше
+
+    Returns:
+        tuple: (key, photo), где photo — file_id уже загруженной фотографии
+            или BytesIO с PNG, а key нужен для remember_file_id
+    """
+    key = map_utils.city_map_key(city_name, data, reports_version)
+    with _lock:
+        if key in _file_ids:
+            return key, _file_ids[key]
+        png = _images.get(key)
+        if png is not None:
+            _images.move_to_end(key)
+
+    if png is None:
+        png = render_city_png(city_name, data, load_reports())
+        with _lock:
+            _images[key] = png
+            while len(_images) > MAX_CACHED_IMAGES:
+                old_key, _ = _images.popitem(last=False)
+                _file_ids.pop(old_key, None)
+
+    photo = BytesIO(png)
+    photo.name = "map.png"
+    return key, photo
+
+def remember_file_id(key, file_id):
+    """
+    Запоминает file_id фотографии после первой отправки.
+    Файл больше не нужен: дальше фотография отправляется по file_id.
+    """
+    with _lock:
+        # Карты того же города с устаревшими данными больше не понадобятся
+        for old_key in [k for k in _file_ids if k[0] == key[0]]:
+            del _file_ids[old_key]
+        _file_ids[key] = file_id
+        _images.pop(key, None)
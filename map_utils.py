@@ -1,34 +1,120 @@
 """
 Утилиты для работы с картами и геоданными.
+
+folium импортируется только при построении HTML-карты: остальные функции
+модуля используются при отрисовке PNG и не должны замедлять запуск.
+
+Отчеты на HTML-карте кластеризуются на сервере: для нескольких масштабов
+заранее строятся кластеры по сетке с количеством отчетов, а отдельные
+маркеры показываются только при крупном масштабе. Все уровни передаются
+на страницу одним массивом данных, и небольшой скрипт показывает уровень,
+соответствующий текущему масштабу карты.
+
+Для оценки плотности жалоб отчеты раскладываются по сетке вокруг города
+(NumPy, bincount) с разбивкой по типу проблемы и временному окну.
+Сетка кешируется в памяти (map_cache.density_grids) и используется
+для тепловой карты и картограммы по районам без повторного перебора отчетов.
 """
 
-import folium
+import json
+import math
 import tempfile
-import os
-from PIL import Image
-from io import BytesIO
-import base64
-import requests
+from datetime import date, datetime
+from html import escape
+
+import geo
+import map_cache
+
+# Размер ячейки сетки кластеров в пикселях карты
+CLUSTER_CELL_PX = 60
+
+# Масштабы, для которых строятся кластеры (уровень виден до следующего масштаба)
+CLUSTER_ZOOMS = (6, 8, 10, 12, 14)
+
+# Масштаб, с которого показываются отдельные маркеры отчетов
+DETAIL_ZOOM = 16
+
+# Наибольший масштаб карты
+MAX_ZOOM = 18
+
+# Размер ячейки сетки плотности в градусах (~1 км по широте)
+DENSITY_CELL_DEG = 0.01
+
+# Половина стороны квадрата сетки плотности вокруг центра города в градусах
+DENSITY_RADIUS_DEG = 0.3
+
+# Временные окна сетки плотности в днях (None — за все время)
+DENSITY_WINDOWS = (7, 30, None)
+
+# Ограничения общего количества маркеров всех уровней и размера их данных
+# в JSON (байт). Уровни, не уместившиеся в ограничения, не строятся, и при
+# увеличении остается предыдущий уровень; самый мелкий уровень кластеров
+# показывается всегда.
+MAX_MAP_MARKERS = 5000
+MAX_MAP_BYTES = 1024 * 1024
+
+# Максимальная длина описания отчета во всплывающем окне маркера (символов)
+MAX_POPUP_DESCRIPTION = 200
+
+_MARKERS_TEMPLATE = """
+{% macro header(this, kwargs) %}
+<style>
+.report-cluster {border-radius: 50%; text-align: center; font: bold 12px sans-serif;
+                 line-height: 32px; color: #fff; opacity: 0.85;}
+.report-cluster-small {background: #43a047;}
+.report-cluster-medium {background: #fb8c00;}
+.report-cluster-large {background: #e53935;}
+</style>
+{% endmacro %}
+{% macro script(this, kwargs) %}
+(function() {
+    var map = {{ this._parent.get_name() }};
+    var levels = {{ this.levels }};
+    var layers = levels.map(function(level) {
+        var group = L.layerGroup();
+        level.markers.forEach(function(m) {
+            var marker;
+            if (m[2] === 1) {
+                marker = L.marker([m[0], m[1]], {
+                    icon: L.AwesomeMarkers.icon({markerColor: m[3], icon: m[4], prefix: 'fa'})
+                });
+                marker.bindPopup(m[5], {maxWidth: 300});
+            } else {
+                var size = m[2] < 10 ? 'small' : (m[2] < 100 ? 'medium' : 'large');
+                marker = L.marker([m[0], m[1]], {icon: L.divIcon({
+                    html: String(m[2]), className: 'report-cluster report-cluster-' + size, iconSize: [32, 32]
+                })});
+                marker.on('click', function() {
+                    map.setView(marker.getLatLng(), Math.min(level.max_zoom + 1, map.getMaxZoom()));
+                });
+            }
+            group.addLayer(marker);
+        });
+        return group;
+    });
+    function update() {
+        var zoom = map.getZoom();
+        levels.forEach(function(level, i) {
+            if (zoom >= level.min_zoom && zoom <= level.max_zoom) {
+                map.addLayer(layers[i]);
+            } else {
+                map.removeLayer(layers[i]);
+            }
+        });
+    }
+    map.on('zoomend', update);
+    update();
+})();
+{% endmacro %}
+"""
+
+def _build_eco_map(city_name, lat, lon, air_quality, pm25, temperature, humidity):
+    """Создает объект карты folium с маркером экологических данных города"""
+    import folium
 
-def create_eco_map(city_name, lat, lon, air_quality, pm25, temperature, humidity):
-    """
-    Создает карту с экологическими данными для указанного города.
-    
-    Args:
-        city_name (str): Название города
-        lat (float): Широта
-        lon (float): Долгота
-        air_quality (str): Качество воздуха (текстовое описание)
-        pm25 (int): Значение PM2.5
-        temperature (int): Температура
-        humidity (int): Влажность
-        
-    Returns:
-        str: Путь к созданному HTML-файлу карты
-    """
     # Создаем карту
     map_center = [lat, lon]
-    m = folium.Map(location=map_center, zoom_start=12)
+    m = folium.Map(location=map_center, zoom_start=12, max_zoom=MAX_ZOOM)
     
     # Добавляем маркер с информацией о качестве воздуха
     popup_text = f"""
@@ -53,13 +139,81 @@ def create_eco_map(city_name, lat, lon, air_quality, pm25, temperature, humidity
         icon=folium.Icon(color=color)
     ).add_to(m)
     
-    # Сохраняем карту во временный файл
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.html') as tmp:
-        map_path = tmp.name
-        m.save(map_path)
+    return m
+
+def create_eco_map(city_name, lat, lon, air_quality, pm25, temperature, humidity, map_path=None):
+    """
+    Создает карту с экологическими данными для указанного города.
+    
+    Args:
+        city_name (str): Название города
+        lat (float): Широта
+        lon (float): Долгота
+        air_quality (str): Качество воздуха (текстовое описание)
+        pm25 (int): Значение PM2.5
+        temperature (int): Температура
+        humidity (int): Влажность
+        map_path (str): Путь для сохранения карты; если не указан, карта
+            сохраняется во временный файл, который должен удалить вызывающий код
+        
+    Returns:
+        str: Путь к созданному HTML-файлу карты
+    """
+    m = _build_eco_map(city_name, lat, lon, air_quality, pm25, temperature, humidity)
+    
+    if map_path is None:
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.html') as tmp:
+            map_path = tmp.name
+    m.save(map_path)
     
     return map_path
 
+def create_city_map(city_name, data, reports, map_path):
+    """
+    Создает карту города с экологическими данными и отчетами о проблемах.
+    
+    Args:
+        city_name (str): Название города
+        data (dict): Экологические данные города (как в config.ECO_DATA)
+        reports (list): Отчеты о проблемах для отображения на карте
+        map_path (str): Путь для сохранения HTML-файла карты
+        
+    Returns:
+        str: Путь к созданному HTML-файлу карты
+    """
+    m = _build_eco_map(city_name, data['lat'], data['lon'], data['air_quality'],
+                       data['pm25'], data['temperature'], data['humidity'])
+    add_problem_markers_to_map(m, reports)
+    m.save(map_path)
+    
+    return map_path
+
+def city_map_key(city_name, data, reports_version):
+    """
+    Ключ кеша карты города: меняется при изменении экологических данных
+    города или отчетов.
+    """
+    return (city_name, (map_cache.data_fingerprint(data), reports_version))
+
+def get_city_map(city_name, data, reports_version, load_reports):
+    """
+    Возвращает HTML-карту города из кеша, создавая ее при необходимости.
+    
+    Args:
+        city_name (str): Название города
+        data (dict): Экологические данные города
+        reports_version: Версия данных отчетов (см. database.get_data_version)
+        load_reports (callable): Функция, возвращающая отчеты для карты;
+            вызывается только если карты нет в кеше
+        
+    Returns:
+        str: Путь к HTML-файлу карты
+    """
+    key = city_map_key(city_name, data, reports_version)
+    return map_cache.city_maps.get_or_create(
+        key, lambda path: create_city_map(city_name, data, load_reports(), path)
+    )
+
 def get_air_quality_icon(air_quality):
     """
     Возвращает иконку для качества воздуха.
@@ -79,8 +233,8 @@ def get_air_quality_icon(air_quality):
 
 def get_location_coords(location_text):
     """
-    Функция для преобразования текстового описания местоположения в координаты.
-    В реальном проекте здесь будет обращение к геокодеру API.
+    Функция для преобразования текстового описания местоположения в координаты
+    по офлайн-справочнику мест (см. geo.py).
     
     Args:
         location_text (str): Текстовое описание местоположения
@@ -88,26 +242,162 @@ def get_location_coords(location_text):
     Returns:
         tuple: (lat, lon) или None, если не удалось определить
     """
-    # Примитивная реализация для демонстрации
-    if "Алматы" in location_text:
-        return (43.238949, 76.889709)
-    elif "Нур-Султан" in location_text or "Астана" in location_text:
-        return (51.169392, 71.449074)
-    elif "Шымкент" in location_text:
-        return (42.315514, 69.586907)
-    elif "Координаты:" in location_text:
-        # Парсим строку с координатами
-        try:
-            coords = location_text.replace("Координаты:", "").strip().split(",")
-            return (float(coords[0]), float(coords[1]))
-        except:
-            return None
-    
-    return None
+    return geo.location_coords(location_text)
+
+def get_report_coords(report):
+    """
+    Возвращает координаты отчета.
+    
+    Args:
+        report (dict): Отчет о проблеме
+        
+    Returns:
+        tuple: (lat, lon) или None, если не удалось определить
+    """
+    # Координаты определяются при сохранении отчета; для старых отчетов вычисляем их
+    if report.get("lat") is not None:
+        return (report["lat"], report["lon"])
+    return get_location_coords(report.get("location", ""))
+
+def get_problem_marker_style(problem_type):
+    """
+    Возвращает цвет и иконку маркера для типа проблемы.
+    
+    Args:
+        problem_type (str): Тип проблемы
+        
+    Returns:
+        tuple: (цвет, иконка Font Awesome)
+    """
+    problem_type = problem_type.lower()
+    if "свалка" in problem_type:
+        return ("black", "trash")
+    elif "вода" in problem_type:
+        return ("blue", "tint")
+    elif "выброс" in problem_type:
+        return ("purple", "industry")
+    elif "транспорт" in problem_type:
+        return ("darkred", "car")
+    else:
+        return ("gray", "exclamation-circle")
+
+def _cell_size(zoom):
+    """Размер ячейки сетки кластеров в градусах для масштаба"""
+    return CLUSTER_CELL_PX * 360.0 / (256 * 2 ** zoom)
+
+def _report_marker(lat, lon, report):
+    """Маркер отдельного отчета: [lat, lon, 1, цвет, иконка, всплывающее окно]"""
+    color, icon_name = get_problem_marker_style(report['problem_type'])
+    description = str(report['description'])
+    if len(description) > MAX_POPUP_DESCRIPTION:
+        description = description[:MAX_POPUP_DESCRIPTION - 1] + "…"
+    popup_text = (
+        f"<b>Проблема: {escape(str(report['problem_type']))}</b><br>"
+        f"Описание: {escape(description)}<br>"
+        f"Статус: {escape(str(report['status']))}<br>"
+    )
+    return [round(lat, 5), round(lon, 5), 1, color, icon_name, popup_text]
+
+def _cell_markers(cells):
+    """Маркеры уровня: кластер с количеством отчетов или отдельный отчет"""
+    markers = []
+    for count, sum_lat, sum_lon, report in cells.values():
+        if count == 1:
+            markers.append(_report_marker(sum_lat, sum_lon, report))
+        else:
+            markers.append([round(sum_lat / count, 5), round(sum_lon / count, 5), count])
+    return markers
+
+def _markers_size(markers):
+    """Размер маркеров уровня в JSON, байт"""
+    return len(json.dumps(markers, ensure_ascii=False).encode("utf-8"))
+
+def cluster_reports(reports, max_markers=MAX_MAP_MARKERS, max_bytes=MAX_MAP_BYTES):
+    """
+    Уровни детализации маркеров отчетов для HTML-карты.
+
+    Отчеты раскладываются по сетке самого крупного масштаба из CLUSTER_ZOOMS,
+    а кластеры более мелких масштабов собираются из ее ячеек. Уровни
+    добавляются от мелкого масштаба к крупному, пока общее количество
+    маркеров не превысит max_markers, а их размер в JSON — max_bytes.
+    Самый мелкий уровень добавляется всегда, даже если он сам превышает
+    ограничения.
+
+    Args:
+        reports (list): Список отчетов о проблемах
+        max_markers (int): Ограничение общего количества маркеров
+        max_bytes (int): Ограничение размера маркеров в JSON, байт
+
+    Returns:
+        list: Уровни {"min_zoom", "max_zoom", "markers"}; маркер кластера —
+        [lat, lon, количество], маркер отчета — см. _report_marker
+    """
+    points = []
+    for report in reports:
+        coords = get_report_coords(report)
+        if coords:
+            points.append((coords[0], coords[1], report))
+    if not points:
+        return []
+
+    # Ячейка -> [количество, сумма широт, сумма долгот, отчет (для одиночной ячейки)]
+    zoom = CLUSTER_ZOOMS[-1]
+    size = _cell_size(zoom)
+    cells = {}
+    for lat, lon, report in points:
+        key = (math.floor(lat / size), math.floor(lon / size))
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = [1, lat, lon, report]
+        else:
+            cell[0] += 1
+            cell[1] += lat
+            cell[2] += lon
+    cells_by_zoom = {zoom: cells}
+    for coarser in reversed(CLUSTER_ZOOMS[:-1]):
+        # Ячейки соседних масштабов вложены друг в друга
+        factor = 2 ** (zoom - coarser)
+        merged = {}
+        for (row, col), (count, sum_lat, sum_lon, report) in cells.items():
+            key = (row // factor, col // factor)
+            cell = merged.get(key)
+            if cell is None:
+                merged[key] = [count, sum_lat, sum_lon, report]
+            else:
+                cell[0] += count
+                cell[1] += sum_lat
+                cell[2] += sum_lon
+        cells_by_zoom[coarser] = cells = merged
+        zoom = coarser
+
+    levels = []
+    budget, bytes_budget = max_markers, max_bytes
+    # Последний уровень — отдельные маркеры всех отчетов
+    for zoom in CLUSTER_ZOOMS + (DETAIL_ZOOM,):
+        cells = cells_by_zoom.get(zoom)
+        if levels and (len(cells) if cells is not None else len(points)) > budget:
+            break
+        if cells is not None:
+            markers = _cell_markers(cells)
+        else:
+            markers = [_report_marker(lat, lon, report) for lat, lon, report in points]
+        size = _markers_size(markers)
+        if levels and size > bytes_budget:
+            break
+        levels.append({"min_zoom": zoom, "markers": markers})
+        budget -= len(markers)
+        bytes_budget -= size
+
+    for i, level in enumerate(levels):
+        level["max_zoom"] = levels[i + 1]["min_zoom"] - 1 if i + 1 < len(levels) else MAX_ZOOM
+    if levels:
+        levels[0]["min_zoom"] = 0
+    return levels
 
 def add_problem_markers_to_map(m, reports):
     """
-    Добавляет маркеры с проблемами на карту.
+    Добавляет маркеры с проблемами на карту (кластеры и отдельные
+    маркеры по уровням масштаба, см. cluster_reports).
     
     Args:
         m (folium.Map): Объект карты folium
@@ -116,36 +406,275 @@ def add_problem_markers_to_map(m, reports):
     Returns:
         folium.Map: Обновленная карта с маркерами
     """
-    for report in reports:
-        # Получаем координаты
-        coords = get_location_coords(report.get("location", ""))
-        if not coords:
-            continue
-        
-        # Создаем всплывающее окно
-        popup_text = f"""
-        <b>Проблема: {report['problem_type']}</b><br>
-        Описание: {report['description']}<br>
-        Статус: {report['status']}<br>
+    from branca.element import MacroElement
+    from jinja2 import Template
+
+    levels = cluster_reports(reports)
+    if not levels:
+        return m
+
+    layer = MacroElement()
+    layer._name = "ReportMarkers"
+    layer._template = Template(_MARKERS_TEMPLATE)
+    # "</" экранируется, чтобы текст отчетов не мог закрыть тег <script>
+    layer.levels = json.dumps(levels, ensure_ascii=False).replace("</", "<\\/")
+    layer.add_to(m)
+    
+    return m
+
+class DensityGrid:
+    """
+    Количество отчетов по ячейкам сетки вокруг города с разбивкой
+    по типу проблемы и временному окну.
+
+    counts[t, w] — массив (строки по широте, столбцы по долготе) для типа
+    problem_types[t] и окна DENSITY_WINDOWS[w]. Окна вложены: отчеты
+    за последние 7 дней входят и в окно 30 дней. Окна отсчитываются
+    от момента построения сетки.
+
+    Args:
+        lat (float): Широта центра сетки
+        lon (float): Долгота центра сетки
+        reports (list): Отчеты о проблемах
+        now (datetime): Момент, от которого отсчитываются окна
+    """
+
+    def __init__(self, lat, lon, reports, now=None):
+        import numpy as np
+
+        size = int(round(2 * DENSITY_RADIUS_DEG / DENSITY_CELL_DEG))
+        self.lat_edges = np.linspace(lat - DENSITY_RADIUS_DEG, lat + DENSITY_RADIUS_DEG, size + 1)
+        self.lon_edges = np.linspace(lon - DENSITY_RADIUS_DEG, lon + DENSITY_RADIUS_DEG, size + 1)
+
+        lats, lons, types, timestamps = [], [], [], []
+        type_numbers = {}
+        for report in reports:
+            coords = get_report_coords(report)
+            if coords:
+                lats.append(coords[0])
+                lons.append(coords[1])
+                types.append(type_numbers.setdefault(report['problem_type'], len(type_numbers)))
+                timestamps.append(report['timestamp'])
+        self.problem_types = list(type_numbers)
+
+        # Номера ячейки по широте и долготе, типа проблемы и наименьшего окна, в которое попадает отчет
+        rows = np.floor((np.array(lats) - self.lat_edges[0]) / DENSITY_CELL_DEG).astype(np.int64)
+        cols = np.floor((np.array(lons) - self.lon_edges[0]) / DENSITY_CELL_DEG).astype(np.int64)
+        now = np.datetime64(now or datetime.now(), 'us')
+        age_days = (now - np.array(timestamps, dtype='datetime64[us]')) / np.timedelta64(1, 'D')
+        limits = [days for days in DENSITY_WINDOWS if days is not None]
+        windows = np.searchsorted(limits, age_days, side='left')
+        inside = (rows >= 0) & (rows < size) & (cols >= 0) & (cols < size)
+
+        # Гистограмма по всем четырем измерениям одним вызовом bincount по номеру ячейки
+        shape = (len(self.problem_types), len(DENSITY_WINDOWS), size, size)
+        flat = np.ravel_multi_index((np.array(types, dtype=np.int64)[inside], windows[inside],
+                                     rows[inside], cols[inside]), shape)
+        counts = np.bincount(flat, minlength=math.prod(shape)).reshape(shape)
+        # Накопление по окнам: окно 30 дней включает отчеты окна 7 дней
+        self.counts = counts.cumsum(axis=1).astype(np.int32)
+        self._districts = None
+
+    def window_counts(self, problem_type=None, window=None):
         """
-        
-        # Выбираем цвет в зависимости от типа проблемы
-        if "свалка" in report['problem_type'].lower():
-            icon = folium.Icon(color="black", icon="trash", prefix='fa')
-        elif "вода" in report['problem_type'].lower():
-            icon = folium.Icon(color="blue", icon="tint", prefix='fa')
-        elif "выброс" in report['problem_type'].lower():
-            icon = folium.Icon(color="purple", icon="industry", prefix='fa')
-        elif "транспорт" in report['problem_type'].lower():
-            icon = folium.Icon(color="darkred", icon="car", prefix='fa')
-        else:
-            icon = folium.Icon(color="gray", icon="exclamation-circle", prefix='fa')
-        
-        # Добавляем маркер
-        folium.Marker(
-            location=coords,
-            popup=folium.Popup(popup_text, max_width=300),
-            icon=icon
-        ).add_to(m)
-    
-    return m 
\ No newline at end of file
+        Сетка количества отчетов для типа проблемы и окна.
+
+        Args:
+            problem_type (str): Тип проблемы (по умолчанию все типы)
+            window (int): Окно в днях из DENSITY_WINDOWS (по умолчанию все время)
+
+        Returns:
+            numpy.ndarray: Количество отчетов по ячейкам
+        """
+        counts = self.counts[:, DENSITY_WINDOWS.index(window)]
+        if problem_type is None:
+            return counts.sum(axis=0)
+        if problem_type not in self.problem_types:
+            return counts.sum(axis=0) * 0
+        return counts[self.problem_types.index(problem_type)]
+
+    def cell_centers(self):
+        """Центры ячеек: массивы широт (по строкам) и долгот (по столбцам)"""
+        return ((self.lat_edges[:-1] + self.lat_edges[1:]) / 2,
+                (self.lon_edges[:-1] + self.lon_edges[1:]) / 2)
+
+    def districts(self):
+        """
+        Район каждой ячейки: ближайший центр района или города без районов (см. geo.py).
+
+        Returns:
+            tuple: (названия районов, массив номеров района по ячейкам; -1 — вне районов)
+        """
+        import numpy as np
+
+        if self._districts is None:
+            lats, lons = self.cell_centers()
+            grid_lat, grid_lon = np.meshgrid(lats, lons, indexing='ij')
+            places = geo.get_gazetteer().nearest_districts(list(zip(grid_lat.ravel().tolist(),
+                                                                 grid_lon.ravel().tolist())))
+            names = sorted({place.name for place in places if place})
+            position = {name: i for i, name in enumerate(names)}
+            index = np.array([position[place.name] if place else -1 for place in places])
+            self._districts = (names, index.reshape(grid_lat.shape))
+        return self._districts
+
+def get_density_grid(city_name, data, reports_version, load_reports):
+    """
+    Сетка плотности отчетов города из кеша (строится при необходимости).
+
+    Args:
+        city_name (str): Название города
+        data (dict): Данные города с полями lat и lon
+        reports_version: Версия данных отчетов (см. database.get_data_version)
+        load_reports (callable): Функция, возвращающая отчеты; вызывается
+            только если сетки нет в кеше
+
+    Returns:
+        DensityGrid: Сетка плотности
+    """
+    # Дата в ключе: окна сдвигаются не реже раза в сутки
+    key = (city_name, (reports_version, date.today()))
+    return map_cache.density_grids.get_or_create(
+        key, lambda: DensityGrid(data['lat'], data['lon'], load_reports())
+    )
+
+def add_heatmap_layer(m, grid, problem_type=None, window=None):
+    """
+    Добавляет на карту тепловую карту плотности отчетов по ячейкам сетки.
+
+    Args:
+        m (folium.Map): Объект карты folium
+        grid (DensityGrid): Сетка плотности
+        problem_type (str): Тип проблемы (по умолчанию все типы)
+        window (int): Окно в днях из DENSITY_WINDOWS (по умолчанию все время)
+
+    Returns:
+        folium.Map: Обновленная карта
+    """
+    import numpy as np
+    from folium.plugins import HeatMap
+
+    counts = grid.window_counts(problem_type, window)
+    rows, cols = np.nonzero(counts)
+    if not len(rows):
+        return m
+    lats, lons = grid.cell_centers()
+    weights = counts[rows, cols] / counts.max()
+    HeatMap(
+        np.column_stack((lats[rows], lons[cols], weights)).round(5).tolist(),
+        name="Плотность отчетов", min_opacity=0.3, radius=20, blur=15
+    ).add_to(m)
+    return m
+
+def add_choropleth_layer(m, grid, problem_type=None, window=None):
+    """
+    Добавляет на карту картограмму: районы окрашиваются по количеству
+    отчетов на ячейку сетки (~1 км²). Границы районов — ячейки, ближайшие
+    к центру района.
+
+    Args:
+        m (folium.Map): Объект карты folium
+        grid (DensityGrid): Сетка плотности
+        problem_type (str): Тип проблемы (по умолчанию все типы)
+        window (int): Окно в днях из DENSITY_WINDOWS (по умолчанию все время)
+
+    Returns:
+        folium.Map: Обновленная карта
+    """
+    import branca.colormap
+    import folium
+    import numpy as np
+
+    names, index = grid.districts()
+    if not names:
+        return m
+    counts = grid.window_counts(problem_type, window)
+    inside = index >= 0
+    totals = np.bincount(index[inside], weights=counts[inside], minlength=len(names))
+    density = totals / np.maximum(np.bincount(index[inside], minlength=len(names)), 1)
+    colormap = branca.colormap.linear.YlOrRd_09.scale(0, max(float(density.max()), 1.0))
+    colormap.caption = "Отчетов на ячейку"
+
+    # Ячейки одной строки с одинаковым районом объединяются в прямоугольники
+    features = []
+    for row in range(index.shape[0]):
+        start = 0
+        for col in range(1, index.shape[1] + 1):
+            if col < index.shape[1] and index[row, col] == index[row, start]:
+                continue
+            district = int(index[row, start])
+            if district >= 0:
+                south, north = grid.lat_edges[row], grid.lat_edges[row + 1]
+                west, east = grid.lon_edges[start], grid.lon_edges[col]
+                features.append({
+                    "type": "Feature",
+                    "geometry": {"type": "Polygon", "coordinates": [[
+                        [west, south], [east, south], [east, north], [west, north], [west, south]
+                    ]]},
+                    "properties": {"district": names[district], "reports": int(totals[district]),
+                                   "color": colormap(float(density[district]))},
+                })
+            start = col
+
+    folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        name="Отчеты по районам",
+        style_function=lambda feature: {"fillColor": feature["properties"]["color"],
+                                        "fillOpacity": 0.5, "weight": 0},
+        tooltip=folium.GeoJsonTooltip(fields=["district", "reports"], aliases=["Район", "Отчетов"]),
+    ).add_to(m)
+    colormap.add_to(m)
+    return m
+
+def create_density_map(city_name, data, grid, map_path, kind="heatmap", problem_type=None, window=None):
+    """
+    Создает карту плотности отчетов города.
+
+    Args:
+        city_name (str): Название города
+        data (dict): Экологические данные города (как в config.ECO_DATA)
+        grid (DensityGrid): Сетка плотности
+        map_path (str): Путь для сохранения HTML-файла карты
+        kind (str): "heatmap" — тепловая карта, "choropleth" — картограмма по районам
+        problem_type (str): Тип проблемы (по умолчанию все типы)
+        window (int): Окно в днях из DENSITY_WINDOWS (по умолчанию все время)
+
+    Returns:
+        str: Путь к созданному HTML-файлу карты
+    """
+    m = _build_eco_map(city_name, data['lat'], data['lon'], data['air_quality'],
+                       data['pm25'], data['temperature'], data['humidity'])
+    if kind == "choropleth":
+        add_choropleth_layer(m, grid, problem_type, window)
+    else:
+        add_heatmap_layer(m, grid, problem_type, window)
+    m.save(map_path)
+    return map_path
+
+def get_density_map(city_name, data, reports_version, load_reports, kind="heatmap",
+                    problem_type=None, window=None):
+    """
+    Возвращает HTML-карту плотности отчетов из кеша, создавая ее при
+    необходимости. Сетка плотности общая для всех типов карт, типов
+    проблем и окон, поэтому отчеты перебираются один раз на версию данных.
+
+    Args:
+        city_name (str): Название города
+        data (dict): Экологические данные города
+        reports_version: Версия данных отчетов (см. database.get_data_version)
+        load_reports (callable): Функция, возвращающая отчеты для сетки
+        kind (str): "heatmap" или "choropleth"
+        problem_type (str): Тип проблемы (по умолчанию все типы)
+        window (int): Окно в днях из DENSITY_WINDOWS (по умолчанию все время)
+
+    Returns:
+        str: Путь к HTML-файлу карты
+    """
+    key = (f"{city_name}:{kind}:{problem_type}:{window}",
+           (map_cache.data_fingerprint(data), reports_version, date.today()))
+    return map_cache.city_maps.get_or_create(
+        key, lambda path: create_density_map(
+            city_name, data, get_density_grid(city_name, data, reports_version, load_reports),
+            path, kind, problem_type, window
+        )
+    )
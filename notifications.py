@@ -0,0 +1,317 @@
+"""
+Рассылка уведомлений: смена статуса отчета, новые мероприятия
+и оповещения о качестве воздуха.
+
+Задания рассылки ставятся в очередь базой данных той же записью, что
+и вызвавшее их изменение (update_report_status, add_event), поэтому
+уведомление не теряется, даже если бот в этот момент не запущен.
+Личное уведомление адресовано автору отчета, объявление о мероприятии —
+подписчикам города (/events_subscribe), оповещение о превышении порога
+PM2.5 — списку адресатов из задания (см. alerts.py).
+
+NotificationEngine выполняет задания по порядку. Подписчики читаются
+из базы порциями по user_id, а сообщения отправляются через очередь
+send_queue с приоритетом рассылки, то есть с наибольшей частотой,
+которую допускает Telegram, и без задержки ответов пользователям.
+Прогресс (наибольший user_id, до которого все сообщения отправлены)
+периодически сохраняется в задании: после перезапуска рассылка
+продолжается с этого места. При остановке бота контрольная точка
+сохраняется сразу; после аварийного завершения сообщение могут получить
+повторно только адресаты, отправленные после последней контрольной точки.
+"""
+
+import asyncio
+import bisect
+import html
+import logging
+import time
+from collections import deque
+
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, Forbidden, InvalidToken, NetworkError, RetryAfter, TelegramError
+
+import db_async
+import send_queue
+
+logger = logging.getLogger(__name__)
+
+# Подписчиков в одной порции чтения из базы
+BATCH_SIZE = 1000
+
+# Сообщений, одновременно ожидающих отправки (в очереди send_queue)
+SEND_WINDOW = 64
+
+# Контрольная точка сохраняется каждые CHECKPOINT_EVERY сообщений
+# или CHECKPOINT_INTERVAL секунд
+CHECKPOINT_EVERY = 500
+CHECKPOINT_INTERVAL = 2.0
+
+# Как часто проверять новые задания, с
+POLL_INTERVAL = 10
+
+# Повторы отправки одному адресату после ошибки сети и задержка перед первым повтором, с
+SEND_RETRIES = 3
+SEND_RETRY_DELAY = 1.0
+
+# Сколько адресатов подряд может не получить сообщение из-за ошибки сети,
+# прежде чем задание будет прервано (сеть или Bot API недоступны для всего бота)
+MAX_NETWORK_FAILURES = 20
+
+# Названия статусов отчета (как в /my_reports)
+STATUS_LABELS = {
+    "new": "🆕 Новый",
+    "in-progress": "⏳ В обработке",
+    "resolved": "✅ Решено",
+}
+
+# Отмена подписки адресата, заблокировавшего бота, по виду задания
+UNSUBSCRIBE = {"event": "unsubscribe_events", "air": "unsubscribe_alerts"}
+
+def format_notification(notification):
+    """
+    Текст сообщения задания рассылки (HTML).
+
+    Args:
+        notification (dict): Задание из get_pending_notifications
+
+    Returns:
+        str: Текст сообщения
+    """
+    payload = notification["payload"]
+    if notification["kind"] == "status":
+        status = STATUS_LABELS.get(payload["status"], payload["status"])
+        return (
+            f"<b>🔔 Статус вашего отчета #{payload['report_id']} изменен</b>\n\n"
+            f"Тип: {html.escape(payload.get('problem_type') or '')}\n"
+            f"Статус: {status}"
+        )
+    if notification["kind"] == "air":
+        quality = f" ({payload['air_quality']})" if payload.get("air_quality") else ""
+        return (
+            f"<b>⚠️ Качество воздуха: {html.escape(notification['city'])}</b>\n\n"
+            f"PM2.5 поднялся до {payload['pm25']} мкг/м³{quality} "
+            f"и превысил заданный вами порог.\n\n"
+            "Подписки: /subscribe. Отписаться: /unsubscribe"
+        )
+    return (
+        f"<b>📅 Новое мероприятие: {html.escape(notification['city'])}</b>\n\n"
+        f"<b>{html.escape(payload['name'])}</b>\n"
+        f"📆 {html.escape(payload.get('date') or '')}\n"
+        f"📍 {html.escape(payload.get('location') or '')}\n"
+        f"ℹ️ {html.escape(payload.get('description') or '')}\n\n"
+        "Все мероприятия: /events. Отписаться: /events_unsubscribe"
+    )
+
+class NotificationEngine:
+    """
+    Выполнение заданий рассылки.
+
+    Args:
+        bot: Бот python-telegram-bot (желательно с send_queue.SendScheduler)
+        backend: Модуль бэкенда базы данных (по умолчанию выбранный в db_async)
+        batch_size (int): Подписчиков в одной порции чтения
+        window (int): Сообщений, одновременно ожидающих отправки
+        checkpoint_every (int): Сообщений между контрольными точками
+    """
+
+    def __init__(self, bot, backend=None, batch_size=BATCH_SIZE, window=SEND_WINDOW,
+                 checkpoint_every=CHECKPOINT_EVERY):
+        self.bot = bot
+        self.backend = backend
+        self.batch_size = batch_size
+        self.window = window
+        self.checkpoint_every = checkpoint_every
+        self.stats = {"jobs": 0, "sent": 0, "failed": 0, "checkpoints": 0}
+        # Адресатов подряд, не получивших сообщение из-за ошибки сети
+        self._network_failures = 0
+
+    def _backend(self):
+        return self.backend or db_async.get_backend()
+
+    async def _recipients(self, notification):
+        """Адресаты задания после контрольной точки, по возрастанию user_id"""
+        if notification["user_id"] is not None:
+            if notification["user_id"] > notification["cursor"]:
+                yield notification["user_id"]
+            return
+        recipients = notification["payload"].get("recipients")
+        if recipients is not None:
+            # Адресаты перечислены в задании по возрастанию user_id
+            for user_id in recipients[bisect.bisect_right(recipients, notification["cursor"]):]:
+                yield user_id
+            return
+        after = notification["cursor"]
+        while True:
+            batch = await db_async.run(self._backend().get_event_subscribers,
+                                       notification["city"], after, self.batch_size)
+            for user_id in batch:
+                yield user_id
+            if len(batch) < self.batch_size:
+                return
+            after = batch[-1]
+
+    async def _send(self, notification, user_id, text):
+        """
+        Отправка одного сообщения.
+
+        Ошибки, касающиеся одного адресата (в том числе ошибка сети,
+        не исчезнувшая после SEND_RETRIES повторов), считаются недоставкой.
+        Задание прерывается только ошибками, касающимися всего бота:
+        InvalidToken и ошибками сети у MAX_NETWORK_FAILURES адресатов подряд.
+
+        Returns:
+            bool: Доставлено ли сообщение
+        """
+        options = {"parse_mode": ParseMode.HTML}
+        if self.bot.rate_limiter is not None and notification["city"] is not None:
+            options["rate_limit_args"] = {"priority": send_queue.BROADCAST}
+        attempt = 0
+        while True:
+            try:
+                await self.bot.send_message(user_id, text, **options)
+                self._network_failures = 0
+                return True
+            except RetryAfter as exc:
+                # Очередь send_queue исчерпала повторы или бот работает без нее
+                await asyncio.sleep(send_queue.retry_delay(exc))
+            except Forbidden:
+                # Пользователь заблокировал бота: отменяем его подписки этого вида
+                if notification["kind"] in UNSUBSCRIBE:
+                    await db_async.run(getattr(self._backend(), UNSUBSCRIBE[notification["kind"]]), user_id)
+                return False
+            except BadRequest as exc:
+                return self._failed(notification, user_id, exc)
+            except NetworkError as exc:
+                if attempt < SEND_RETRIES:
+                    await asyncio.sleep(SEND_RETRY_DELAY * 2 ** attempt)
+                    attempt += 1
+                    continue
+                self._network_failures += 1
+                if self._network_failures >= MAX_NETWORK_FAILURES:
+                    raise
+                return self._failed(notification, user_id, exc)
+            except InvalidToken:
+                raise
+            except TelegramError as exc:
+                # ChatMigrated и другие ошибки отдельного чата
+                return self._failed(notification, user_id, exc)
+
+    def _failed(self, notification, user_id, error):
+        """Запись в лог недоставленного сообщения"""
+        logger.warning("Уведомление %s пользователю %s не отправлено: %s", notification["id"], user_id, error)
+        return False
+
+    async def _checkpoint(self, notification, done=False):
+        await db_async.run(self._backend().save_notification_progress, notification["id"],
+                           notification["cursor"], notification["sent"], notification["failed"], done)
+        self.stats["checkpoints"] += 1
+
+    async def deliver(self, notification):
+        """
+        Выполнение задания рассылки с контрольными точками.
+
+        Сообщения отправляются одновременно (не больше window), а результаты
+        принимаются по порядку user_id, поэтому контрольная точка всегда
+        означает, что все адресаты до нее обработаны.
+
+        Args:
+            notification (dict): Задание из get_pending_notifications
+        """
+        text = format_notification(notification)
+        in_flight = deque()
+        since_checkpoint = 0
+        checkpoint_at = time.monotonic()
+
+        def accept(user_id, delivered):
+            nonlocal since_checkpoint
+            notification["cursor"] = user_id
+            notification["sent" if delivered else "failed"] += 1
+            self.stats["sent" if delivered else "failed"] += 1
+            since_checkpoint += 1
+
+        async def settle():
+            """Прием результата самой ранней отправки"""
+            user_id, task = in_flight.popleft()
+            accept(user_id, await task)
+
+        try:
+            async for user_id in self._recipients(notification):
+                in_flight.append((user_id, asyncio.ensure_future(self._send(notification, user_id, text))))
+                while len(in_flight) >= self.window or (in_flight and in_flight[0][1].done()):
+                    await settle()
+                if since_checkpoint >= self.checkpoint_every or (
+                        since_checkpoint and time.monotonic() - checkpoint_at >= CHECKPOINT_INTERVAL):
+                    await self._checkpoint(notification)
+                    since_checkpoint, checkpoint_at = 0, time.monotonic()
+            while in_flight:
+                await settle()
+        except BaseException:
+            # Остановка бота или ошибка сети: уже завершенные отправки учитываем,
+            # а неотправленное будет отправлено после перезапуска
+            while in_flight and in_flight[0][1].done() and not in_flight[0][1].cancelled() \
+                    and in_flight[0][1].exception() is None:
+                user_id, task = in_flight.popleft()
+                accept(user_id, task.result())
+            for _, task in in_flight:
+                task.cancel()
+            if since_checkpoint:
+                await self._checkpoint(notification)
+            raise
+        await self._checkpoint(notification, done=True)
+        self.stats["jobs"] += 1
+
+    async def run_pending(self):
+        """
+        Выполнение всех накопившихся заданий.
+
+        Returns:
+            int: Количество выполненных заданий
+        """
+        count = 0
+        while True:
+            pending = await db_async.run(self._backend().get_pending_notifications)
+            if not pending:
+                return count
+            for notification in pending:
+                await self.deliver(notification)
+                count += 1
+
+    async def run_forever(self, poll_interval=POLL_INTERVAL):
+        """Выполнение заданий по мере появления (фоновая задача бота)"""
+        while True:
+            try:
+                await self.run_pending()
+            except Exception:
+                logger.exception("Ошибка рассылки уведомлений, повтор через %s с", poll_interval)
+            await asyncio.sleep(poll_interval)
+
+def attach(application, poll_interval=POLL_INTERVAL):
+    """
+    Запуск рассылки в фоне вместе с ботом (long polling).
+
+    Задача запускается после Application.initialize и отменяется при
+    остановке бота; прогресс прерванного задания сохраняется.
+
+    Args:
+        application: Приложение бота
+        poll_interval (float): Как часто проверять новые задания, с
+
+    Returns:
+        NotificationEngine: Движок рассылки
+    """
+    engine = NotificationEngine(application.bot)
+    task = None
+
+    async def start(app):
+        nonlocal task
+        # Не через Application.create_task: его задачи Application.stop ждет до завершения
+        task = asyncio.ensure_future(engine.run_forever(poll_interval))
+
+    async def stop(app):
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    application.post_init = start
+    application.post_stop = stop
+    return engine
@@ -0,0 +1,229 @@
+"""
+Хранение состояния бота (разговоров и context.user_data) в базе данных.
+
+Обработчики читают и изменяют состояние в памяти приложения: оно
+загружается из базы один раз при запуске (Application.initialize),
+а измененные записи сохраняются пакетом раз в PERSISTENCE_INTERVAL
+секунд, при остановке бота и (в режиме вебхука) после каждого обновления.
+Поэтому незавершенный отчет не теряется при перезапуске.
+
+В вебхуке обновления одного пользователя могут попадать в разные
+экземпляры (shared=True). Тогда user_data пользователя перечитывается из
+базы через refresh_user_data, но заменяется, только если запись в базе
+новее версии (updated_at), известной этому экземпляру. Шаг разговора
+отчета хранится в user_data (см. bot.REPORT_STATE), поэтому отчет
+продолжается на другом экземпляре бота. В режиме long polling состояние
+в памяти актуально и база при обработке обновлений не читается.
+
+Черновики отчетов, к которым пользователь не возвращался дольше
+DRAFT_TTL секунд, не загружаются и удаляются из базы.
+"""
+
+import asyncio
+import contextvars
+import copy
+import json
+import os
+import time
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import db_async
+
+# Хранить ли состояние бота в базе данных (BOT_PERSISTENCE=0 — только в памяти)
+PERSISTENCE_ENABLED = os.getenv("BOT_PERSISTENCE", "1") != "0"
+
+# Время жизни незавершенного отчета, с
+DRAFT_TTL = float(os.getenv("DRAFT_TTL", str(24 * 3600)))
+
+# Интервал записи измененного состояния в базу, с
+PERSISTENCE_INTERVAL = float(os.getenv("PERSISTENCE_INTERVAL", "5"))
+
+# Как часто удалять из базы устаревшие записи, с
+PURGE_INTERVAL = 3600
+
+# Вид состояния для user_data (разговоры хранятся как "conversation:<имя>")
+USER_DATA = "user_data"
+
+# Пользователь, чьи данные уже перечитаны при обработке текущего обновления (см. refresh)
+_refreshed_user = contextvars.ContextVar("refreshed_user", default=None)
+
+class DatabasePersistence(BasePersistence):
+    """
+    Хранение разговоров и user_data в базе данных.
+
+    Args:
+        backend: Модуль бэкенда с функциями load_bot_state, save_bot_state
+            и purge_bot_state (по умолчанию выбранный в db_async)
+        ttl (float): Время жизни незавершенного отчета, с
+        update_interval (float): Интервал записи изменений, с
+        shared (bool): Состояние изменяют несколько экземпляров бота (вебхук)
+    """
+
+    def __init__(self, backend=None, ttl=DRAFT_TTL, update_interval=PERSISTENCE_INTERVAL, shared=False):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False),
+            update_interval=update_interval
+        )
+        self.backend = backend
+        self.ttl = ttl
+        self.shared = shared
+        # Изменения, ожидающие записи: (вид, ключ) -> значение (None — удалить)
+        self._pending = {}
+        self._batch = None
+        # Последние записанные значения: неизмененные записи повторно не сохраняются
+        self._saved = {}
+        # Версии записей (updated_at), известные этому экземпляру
+        self._versions = {}
+        self._purged_at = 0.0
+        self.stats = {"batches": 0, "entries": 0, "refreshes": 0, "reloaded": 0}
+
+    def _backend(self):
+        return self.backend or db_async.get_backend()
+
+    async def _load(self, kind):
+        """Записи вида, измененные не раньше чем ttl секунд назад"""
+        loaded_at = time.time()
+        entries = await db_async.run(self._backend().load_bot_state, kind, loaded_at - self.ttl)
+        for key, value in entries.items():
+            # Значения становятся состоянием приложения и изменяются обработчиками
+            self._saved[(kind, key)] = copy.deepcopy(value)
+            self._versions[(kind, key)] = loaded_at
+        return entries
+
+    async def _save(self, kind, key, value):
+        """Добавление изменения в пакет и ожидание записи пакета"""
+        if self._saved.get((kind, key)) == value and (kind, key) not in self._pending:
+            return
+        self._pending[(kind, key)] = value
+        if self._batch is None:
+            self._batch = asyncio.ensure_future(self._write_batch())
+        await asyncio.shield(self._batch)
+
+    async def _write_batch(self):
+        """Запись всех накопленных изменений одним обращением к базе"""
+        # Application.update_persistence вызывает update_* для всех измененных
+        # записей одновременно: даем им добавить свои изменения в пакет
+        await asyncio.sleep(0)
+        pending, self._pending, self._batch = self._pending, {}, None
+        backend = self._backend()
+        updated_at = await db_async.run(backend.save_bot_state,
+                                        [(kind, key, value) for (kind, key), value in pending.items()])
+        for entry, value in pending.items():
+            if value is None:
+                self._saved.pop(entry, None)
+                self._versions.pop(entry, None)
+            else:
+                self._saved[entry] = value
+                self._versions[entry] = updated_at
+        self.stats["batches"] += 1
+        self.stats["entries"] += len(pending)
+        if time.time() - self._purged_at > PURGE_INTERVAL:
+            await self._purge()
+
+    async def _purge(self):
+        """Удаление из базы записей старше ttl"""
+        self._purged_at = time.time()
+        await db_async.run(self._backend().purge_bot_state, self._purged_at - self.ttl)
+
+    async def get_user_data(self):
+        return {int(key): value for key, value in (await self._load(USER_DATA)).items()}
+
+    async def update_user_data(self, user_id, data):
+        # Пустые user_data не храним
+        await self._save(USER_DATA, str(user_id), data or None)
+
+    async def drop_user_data(self, user_id):
+        await self._save(USER_DATA, str(user_id), None)
+
+    async def refresh_user_data(self, user_id, user_data):
+        # Без shared состояние в памяти актуально: обновления пользователя обрабатывает этот процесс
+        if self.shared and _refreshed_user.get() != user_id:
+            await self._refresh_user(user_id, user_data)
+
+    async def _refresh_user(self, user_id, user_data):
+        """Замена user_data записью из базы, если она новее известной версии"""
+        entry = (USER_DATA, str(user_id))
+        # Изменения этого экземпляра, еще не записанные в базу, не перезаписываем
+        if entry in self._pending:
+            return
+        self.stats["refreshes"] += 1
+        stored = await db_async.run(self._backend().get_bot_state, [entry], time.time() - self.ttl)
+        if entry in self._pending:
+            return
+        if entry in stored:
+            value, updated_at = stored[entry]
+            if updated_at <= self._versions.get(entry, 0):
+                return
+            self._saved[entry] = copy.deepcopy(value)
+            self._versions[entry] = updated_at
+        elif entry in self._versions:
+            # Отчет завершен на другом экземпляре или черновик устарел
+            value = {}
+            self._saved.pop(entry, None)
+            self._versions.pop(entry, None)
+        else:
+            return
+        user_data.clear()
+        user_data.update(value)
+        self.stats["reloaded"] += 1
+
+    async def get_conversations(self, name):
+        return {tuple(json.loads(key)): state for key, state in (await self._load(f"conversation:{name}")).items()}
+
+    async def update_conversation(self, name, key, new_state):
+        await self._save(f"conversation:{name}", json.dumps(list(key)), new_state)
+
+    async def get_chat_data(self):
+        return {}
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def get_bot_data(self):
+        return {}
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def refresh(self, application, update):
+        """
+        Загрузка из базы user_data отправителя сообщения перед его обработкой.
+
+        Обработчик продолжения отчета выбирается по шагу, сохраненному
+        в user_data, еще до того, как Application вызовет refresh_user_data,
+        поэтому в вебхуке данные перечитываются заранее. Повторно при
+        обработке того же обновления база не читается. Остальные обновления
+        перечитываются через refresh_user_data, только если их принял
+        какой-либо обработчик.
+
+        Args:
+            application: Приложение бота
+            update: Входящее обновление
+        """
+        user = update.effective_user
+        if not self.shared or user is None or update.message is None:
+            return
+        await self._refresh_user(user.id, application.user_data[user.id])
+        _refreshed_user.set(user.id)
+
+    async def flush(self):
+        """Запись оставшихся изменений и очистка устаревших записей (при остановке бота)"""
+        if self._batch is not None:
+            await asyncio.shield(self._batch)
+        await self._purge()
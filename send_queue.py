@@ -0,0 +1,338 @@
+"""
+Очередь исходящих запросов к Telegram Bot API с учетом ограничений частоты.
+
+SendScheduler подключается к приложению как rate limiter python-telegram-bot
+(ApplicationBuilder.rate_limiter), поэтому через него проходят все
+reply_text/send_message/send_photo обработчиков и рассылок без изменений
+в их коде.
+
+Ограничения Telegram соблюдаются корзинами токенов: своя корзина у каждого
+чата (около одного сообщения в секунду с коротким всплеском, в группах
+20 в минуту) и общая на бота (около 30 сообщений в секунду). Запросы
+одного чата отправляются по порядку. Общую корзину запросы получают по
+приоритету: ответы пользователям (INTERACTIVE) раньше рассылок (BROADCAST),
+который передается через rate_limit_args={"priority": BROADCAST}.
+
+Текстовые сообщения одному чату с тем же приоритетом, накопившиеся
+в очереди, пока чат ждал своей очереди, объединяются в одно сообщение.
+Все объединенные вызовы возвращают один и тот же Message (объединенное
+сообщение); вызов, которому нужно собственное сообщение (например, чтобы
+потом его изменить), передает rate_limit_args={"merge": False}.
+
+После ответа RetryAfter отправка приостанавливается на указанное Telegram
+время и запрос повторяется (не больше MAX_RETRIES раз).
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: меньшее значение отправляется раньше
+INTERACTIVE = 0
+BROADCAST = 1
+
+# Общее ограничение бота и ограничение личного чата (сообщений в секунду)
+GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+
+# Сколько сообщений подряд можно отправить в личный чат без ожидания
+# (обработчик обычно отвечает двумя-тремя сообщениями)
+CHAT_BURST = 3
+
+# Ограничение группового чата: 20 сообщений в минуту
+GROUP_RATE = 20 / 60
+GROUP_BURST = 3
+
+# Повторы запроса после RetryAfter
+MAX_RETRIES = 3
+
+# Максимальная длина текстового сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+# Параметры sendMessage, при которых сообщения можно объединить;
+# значения из MERGE_MATCH должны совпадать у всех объединяемых сообщений
+MERGE_MATCH = ("parse_mode", "disable_notification", "protect_content",
+               "disable_web_page_preview", "message_thread_id")
+MERGE_KEYS = {"chat_id", "text", "reply_markup", *MERGE_MATCH}
+MERGE_SEPARATOR = "\n\n"
+
+# Сколько чатов хранить без очистки простаивающих
+MAX_IDLE_CHATS = 10000
+
+class TokenBucket:
+    """
+    Корзина токенов.
+
+    Args:
+        rate (float): Скорость пополнения, токенов в секунду
+        capacity (float): Емкость (допустимый всплеск)
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        # До этого момента (time.monotonic) токены не выдаются (после RetryAfter)
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Сколько секунд ждать следующего токена"""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now):
+        """Расход токена (после того, как delay вернул 0)"""
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+class _Job:
+    """Запрос, ожидающий отправки"""
+
+    __slots__ = ("callback", "args", "kwargs", "endpoint", "data", "priority", "merge", "future")
+
+    def __init__(self, callback, args, kwargs, endpoint, data, priority, merge, future):
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.endpoint = endpoint
+        self.data = data
+        self.priority = priority
+        self.merge = merge
+        self.future = future
+
+class _ChatQueue:
+    """Очередь и корзина токенов одного чата"""
+
+    __slots__ = ("bucket", "jobs", "worker")
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.jobs = deque()
+        self.worker = None
+
+def _is_group(chat_id):
+    """Группы и каналы: отрицательный ID или @username"""
+    return isinstance(chat_id, str) or chat_id < 0
+
+def retry_delay(error):
+    """Пауза из RetryAfter в секундах (int или timedelta в зависимости от версии)"""
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+class SendScheduler(BaseRateLimiter):
+    """
+    Планировщик исходящих запросов Bot API.
+
+    Args:
+        global_rate (float): Общее ограничение, сообщений в секунду
+        chat_rate (float): Ограничение личного чата, сообщений в секунду
+        chat_burst (int): Допустимый всплеск в личном чате
+        max_retries (int): Повторов после RetryAfter
+        merge (bool): Объединять ли накопившиеся текстовые сообщения чату
+    """
+
+    def __init__(self, global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE, chat_burst=CHAT_BURST,
+                 max_retries=MAX_RETRIES, merge=True):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.merge = merge
+        self._global = TokenBucket(global_rate, max(1, global_rate))
+        self._chats = {}
+        # Ожидающие общего токена: (приоритет, порядковый номер, future)
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._dispatcher = None
+        self.stats = {"requests": 0, "sent": 0, "merged": 0, "retries": 0}
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        """Отмена еще не отправленных запросов"""
+        tasks = [chat.worker for chat in self._chats.values() if chat.worker] + [self._dispatcher]
+        for task in tasks:
+            if task:
+                task.cancel()
+        for chat in self._chats.values():
+            for job in chat.jobs:
+                job.future.cancel()
+        for _, _, future in self._waiters:
+            future.cancel()
+        self._chats.clear()
+        self._waiters.clear()
+        self._dispatcher = None
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        self.stats["requests"] += 1
+        priority, merge = INTERACTIVE, True
+        if isinstance(rate_limit_args, dict):
+            priority = rate_limit_args.get("priority", INTERACTIVE)
+            merge = rate_limit_args.get("merge", True)
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            # answerCallbackQuery, answerInlineQuery и т. п. не привязаны к чату
+            # и ограничениям на сообщения не подчиняются (но ждут паузы после RetryAfter)
+            pause = self._global.blocked_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            return await self._call(callback, args, kwargs, priority)
+
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if len(self._chats) >= MAX_IDLE_CHATS:
+                self._prune_chats()
+            rate, burst = (GROUP_RATE, GROUP_BURST) if _is_group(chat_id) else (self.chat_rate, self.chat_burst)
+            chat = self._chats[chat_id] = _ChatQueue(TokenBucket(rate, burst))
+        job = _Job(callback, args, kwargs, endpoint, data, priority, merge, asyncio.get_running_loop().create_future())
+        chat.jobs.append(job)
+        if chat.worker is None:
+            chat.worker = asyncio.ensure_future(self._drain(chat))
+        return await job.future
+
+    def _prune_chats(self):
+        """Удаление простаивающих чатов с полной корзиной"""
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, chat in self._chats.items()
+                        if chat.worker is None and chat.bucket.is_full(now)]:
+            del self._chats[chat_id]
+
+    async def _drain(self, chat):
+        """Отправка запросов одного чата по порядку"""
+        try:
+            while chat.jobs:
+                job = chat.jobs.popleft()
+                if job.future.done():
+                    continue
+                while True:
+                    delay = chat.bucket.delay(time.monotonic())
+                    if delay <= 0:
+                        break
+                    await asyncio.sleep(delay)
+                chat.bucket.take(time.monotonic())
+                # Ответ пользователю не должен ждать рассылку, стоящую перед ним в очереди чата
+                await self._acquire(min([job.priority] + [queued.priority for queued in chat.jobs]))
+
+                # Пока чат ждал, за этим сообщением могли накопиться другие
+                merged = self._take_mergeable(chat, job)
+                jobs = [job] + merged
+                args = self._merged_args(job, merged) if merged else job.args
+                try:
+                    result = await self._call(job.callback, args, job.kwargs, job.priority, chat.bucket)
+                except Exception as exc:
+                    for merged in jobs:
+                        if not merged.future.done():
+                            merged.future.set_exception(exc)
+                else:
+                    for merged in jobs:
+                        if not merged.future.done():
+                            merged.future.set_result(result)
+        finally:
+            chat.worker = None
+
+    def _take_mergeable(self, chat, job):
+        """Следующие в очереди текстовые сообщения с тем же приоритетом, которые можно дописать к job"""
+        if not self.merge or not self._can_merge(job) or "reply_markup" in job.data:
+            return []
+        merged = []
+        length = len(job.data["text"])
+        while chat.jobs:
+            candidate = chat.jobs[0]
+            if candidate.future.done():
+                chat.jobs.popleft()
+                continue
+            if (not self._can_merge(candidate) or candidate.priority != job.priority
+                    or any(candidate.data.get(key) != job.data.get(key) for key in MERGE_MATCH)):
+                break
+            length += len(MERGE_SEPARATOR) + len(candidate.data["text"])
+            if length > MAX_MESSAGE_LENGTH:
+                break
+            chat.jobs.popleft()
+            merged.append(candidate)
+            # Клавиатура может быть только у последнего объединенного сообщения
+            if "reply_markup" in candidate.data:
+                break
+        if merged:
+            self.stats["merged"] += len(merged)
+        return merged
+
+    @staticmethod
+    def _merged_args(job, merged):
+        """Аргументы вызова Bot API для объединенного сообщения (данные вызывающих не изменяются)"""
+        data = dict(job.data)
+        data["text"] = MERGE_SEPARATOR.join([job.data["text"]] + [other.data["text"] for other in merged])
+        if "reply_markup" in merged[-1].data:
+            data["reply_markup"] = merged[-1].data["reply_markup"]
+        # job.args содержит словарь data, который передается в Bot API
+        return tuple(data if arg is job.data else arg for arg in job.args)
+
+    @staticmethod
+    def _can_merge(job):
+        return (job.merge and job.endpoint == "sendMessage" and "text" in job.data
+                and MERGE_KEYS.issuperset(job.data))
+
+    async def _acquire(self, priority):
+        """Ожидание токена общей корзины в порядке приоритета"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        await future
+
+    async def _dispatch(self):
+        """Выдача токенов общей корзины ожидающим с наивысшим приоритетом"""
+        try:
+            while self._waiters:
+                delay = self._global.delay(time.monotonic())
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                _, _, future = heapq.heappop(self._waiters)
+                if future.done():
+                    continue
+                self._global.take(time.monotonic())
+                future.set_result(None)
+        finally:
+            self._dispatcher = None
+
+    async def _call(self, callback, args, kwargs, priority, bucket=None):
+        """Вызов Bot API с повтором после RetryAfter"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await callback(*args, **kwargs)
+                self.stats["sent"] += 1
+                return result
+            except RetryAfter as exc:
+                if attempt == self.max_retries:
+                    raise
+                delay = retry_delay(exc)
+                logger.warning("Telegram ограничил частоту запросов, повтор через %.1f с", delay)
+                self.stats["retries"] += 1
+                # Пауза касается всех запросов бота: Telegram не сообщает, какое
+                # ограничение превышено
+                until = time.monotonic() + delay
+                self._global.blocked_until = max(self._global.blocked_until, until)
+                if bucket is not None:
+                    bucket.blocked_until = max(bucket.blocked_until, until)
+                await asyncio.sleep(delay)
+                await self._acquire(priority)
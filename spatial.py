@@ -0,0 +1,221 @@
+"""
+Пространственный индекс отчетов по сетке широта/долгота.
+
+Плоскость разбивается на ячейки размером CELL_DEG градусов. Ключ ячейки —
+целое число row * COLS + col, поэтому ячейки одной строки сетки идут подряд,
+и прямоугольник покрывается несколькими непрерывными диапазонами ключей
+(по одному на строку). Это позволяет использовать одну и ту же схему и для
+словаря в памяти, и для обычного B-tree индекса в SQLite.
+
+Для поиска ближайшей из небольшого набора опорных точек (центров городов)
+используется KD-дерево (KDTree).
+"""
+
+import math
+
+# Размер ячейки в градусах (~5 км по широте)
+CELL_DEG = 0.05
+
+# Количество столбцов сетки (долгота от -180 до 180)
+COLS = int(360 / CELL_DEG) + 1
+
+# Средний радиус Земли в километрах
+EARTH_RADIUS_KM = 6371.0
+
+# Количество точек, обрабатываемых за один шаг в KDTree.nearest_many
+BATCH_SIZE = 8192
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Расстояние между двумя точками по поверхности Земли в километрах"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def unit_vector(lat, lon):
+    """
+    Точка на единичной сфере. Расстояние по прямой (хорда) между такими
+    точками растет вместе с расстоянием по поверхности Земли.
+    """
+    lat, lon = math.radians(lat), math.radians(lon)
+    cos_lat = math.cos(lat)
+    return (cos_lat * math.cos(lon), cos_lat * math.sin(lon), math.sin(lat))
+
+def chord_to_km(chord):
+    """Расстояние по поверхности Земли для хорды единичной сферы"""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+def radius_bbox(lat, lon, radius_km):
+    """
+    Прямоугольник, описанный вокруг круга заданного радиуса.
+
+    Returns:
+        tuple: (min_lat, min_lon, max_lat, max_lon)
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(lat))
+    dlon = 180.0 if cos_lat < 1e-6 else min(180.0, dlat / cos_lat)
+    return (max(-90.0, lat - dlat), max(-180.0, lon - dlon),
+            min(90.0, lat + dlat), min(180.0, lon + dlon))
+
+def _row(lat):
+    return int(math.floor((lat + 90.0) / CELL_DEG))
+
+def _col(lon):
+    return int(math.floor((lon + 180.0) / CELL_DEG))
+
+def cell_key(lat, lon):
+    """Ключ ячейки сетки для точки"""
+    return _row(lat) * COLS + _col(lon)
+
+def cell_ranges(min_lat, min_lon, max_lat, max_lon):
+    """
+    Диапазоны ключей ячеек, покрывающих прямоугольник.
+
+    Returns:
+        list: Список пар (первый ключ, последний ключ) включительно
+    """
+    col_min, col_max = _col(min_lon), _col(max_lon)
+    return [(row * COLS + col_min, row * COLS + col_max)
+            for row in range(_row(min_lat), _row(max_lat) + 1)]
+
+def in_bbox(lat, lon, min_lat, min_lon, max_lat, max_lon):
+    """Проверка попадания точки в прямоугольник"""
+    return min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+
+class GridIndex:
+    """
+    Индекс объектов с координатами в памяти.
+
+    Объекты — словари с полями lat и lon (например, отчеты).
+    """
+
+    def __init__(self):
+        self.cells = {}
+        self.size = 0
+
+    def add(self, item):
+        """Добавление объекта в индекс"""
+        self.cells.setdefault(cell_key(item["lat"], item["lon"]), []).append(item)
+        self.size += 1
+
+    def in_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Объекты внутри прямоугольника"""
+        ranges = cell_ranges(min_lat, min_lon, max_lat, max_lon)
+        cell_count = sum(hi - lo + 1 for lo, hi in ranges)
+        if cell_count > len(self.cells):
+            # Прямоугольник покрывает больше ячеек, чем заполнено: проще обойти заполненные
+            candidates = (item for items in self.cells.values() for item in items)
+        else:
+            candidates = (item for lo, hi in ranges for key in range(lo, hi + 1)
+                          for item in self.cells.get(key, ()))
+        return [item for item in candidates
+                if in_bbox(item["lat"], item["lon"], min_lat, min_lon, max_lat, max_lon)]
+
+    def near(self, lat, lon, radius_km):
+        """
+        Объекты в радиусе от точки, отсортированные по расстоянию.
+
+        Returns:
+            list: Пары (расстояние в км, объект)
+        """
+        found = []
+        for item in self.in_bbox(*radius_bbox(lat, lon, radius_km)):
+            distance = haversine_km(lat, lon, item["lat"], item["lon"])
+            if distance <= radius_km:
+                found.append((distance, item))
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+class KDTree:
+    """
+    KD-дерево для поиска ближайшей опорной точки.
+
+    Точки хранятся как векторы на единичной сфере (см. unit_vector), поэтому
+    ближайшая по хорде точка совпадает с ближайшей по поверхности Земли,
+    в том числе у полюсов и 180-го меридиана.
+
+    Args:
+        points (list): Пары (широта, долгота)
+        values (list): Значения, соответствующие точкам
+    """
+
+    def __init__(self, points, values):
+        self.values = list(values)
+        self.vectors = [unit_vector(lat, lon) for lat, lon in points]
+        self._root = self._build(list(range(len(self.vectors))), 0)
+
+    def __len__(self):
+        return len(self.values)
+
+    def _build(self, indices, depth):
+        """Узел (индекс точки, ось, левое поддерево, правое поддерево)"""
+        if not indices:
+            return None
+        axis = depth % 3
+        indices.sort(key=lambda i: self.vectors[i][axis])
+        mid = len(indices) // 2
+        return (indices[mid], axis,
+                self._build(indices[:mid], depth + 1), self._build(indices[mid + 1:], depth + 1))
+
+    def _search(self, node, target, best):
+        index, axis, left, right = node
+        vector = self.vectors[index]
+        distance = ((vector[0] - target[0]) ** 2 + (vector[1] - target[1]) ** 2
+                    + (vector[2] - target[2]) ** 2)
+        if distance < best[0]:
+            best[0], best[1] = distance, index
+        diff = target[axis] - vector[axis]
+        near, far = (left, right) if diff < 0 else (right, left)
+        if near is not None:
+            self._search(near, target, best)
+        # Дальнее поддерево проверяется, только если его граница ближе найденной точки
+        if far is not None and diff * diff < best[0]:
+            self._search(far, target, best)
+
+    def nearest(self, lat, lon):
+        """
+        Ближайшая опорная точка.
+
+        Returns:
+            tuple: (расстояние в км, значение) или None, если дерево пустое
+        """
+        if self._root is None:
+            return None
+        best = [float("inf"), None]
+        self._search(self._root, unit_vector(lat, lon), best)
+        return chord_to_km(math.sqrt(best[0])), self.values[best[1]]
+
+    def nearest_many(self, points):
+        """
+        Ближайшие опорные точки для многих точек сразу (векторно, NumPy).
+
+        Опорных точек немного (сотни), поэтому для пакета точек матрица
+        скалярных произведений со всеми опорными точками считается быстрее,
+        чем обход дерева для каждой точки. Результат совпадает с nearest.
+
+        Args:
+            points (list): Пары (широта, долгота)
+
+        Returns:
+            list: Пары (расстояние в км, значение) в порядке points
+        """
+        import numpy as np
+
+        if not points or not self.values:
+            return [None] * len(points)
+        anchors = np.array(self.vectors)
+        coords = np.radians(np.asarray(points, dtype=float))
+        result = []
+        for start in range(0, len(coords), BATCH_SIZE):
+            lat, lon = coords[start:start + BATCH_SIZE].T
+            cos_lat = np.cos(lat)
+            vectors = np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+            # Ближайшая точка на сфере — с наибольшим скалярным произведением
+            dots = vectors @ anchors.T
+            nearest = dots.argmax(axis=1)
+            best = np.clip(dots[np.arange(len(nearest)), nearest], -1.0, 1.0)
+            chords = np.sqrt(np.maximum(0.0, 2.0 - 2.0 * best))
+            distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, chords / 2))
+            result.extend(zip(distances.tolist(), (self.values[i] for i in nearest.tolist())))
+        return result
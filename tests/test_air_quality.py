@@ -0,0 +1,30 @@
+"""Тесты кеша данных OpenWeather (air_quality.py) с заглушкой API."""
+
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import config
+from air_quality import AirQualityProvider
+from mock_openweather import MockOpenWeather
+
+def test_get_fetches_on_demand_without_scheduler():
+    server = MockOpenWeather(latency=0).start()
+    provider = AirQualityProvider("test", base_url=server.url, rate_limit=0)
+    try:
+        city = "Алматы"
+        base = config.ECO_DATA[city]
+        assert provider.get(city, base) == base
+        deadline = time.monotonic() + 5
+        while "updated_at" not in provider.get(city, base) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert "updated_at" in provider.get(city, base)
+        # Фоновый поток запускает только watch (long polling)
+        assert provider._scheduler is None
+    finally:
+        provider.stop()
+        server.shutdown()
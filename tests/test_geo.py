@@ -0,0 +1,46 @@
+"""Тесты разбора координат и добавления отчетов с координатами (geo.py)."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import database
+import geo
+
+@pytest.mark.parametrize("text, expected", [
+    ("Координаты: 43.2389, 76.8897", (43.2389, 76.8897)),
+    ("Координаты: -90, 180", (-90.0, 180.0)),
+    ("ул. Абая, Алматы", None),
+    ("Координаты: 43.2", None),
+])
+def test_parse_coordinates(text, expected):
+    assert geo.parse_coordinates(text) == expected
+
+@pytest.mark.parametrize("text", [
+    "Координаты: nan, 1",
+    "Координаты: 1, inf",
+    "Координаты: -inf, 1",
+    "Координаты: 1e308, 1e308",
+    "Координаты: 91, 10",
+    "Координаты: 10, -180.5",
+])
+def test_parse_coordinates_rejects_invalid(text):
+    assert geo.parse_coordinates(text) is None
+
+@pytest.fixture
+def json_store(tmp_path, monkeypatch):
+    database.close_db()
+    monkeypatch.setattr(database, "DATA_FILE", str(tmp_path / "reports.json"))
+    monkeypatch.setattr(database, "LOG_FILE", str(tmp_path / "reports.log"))
+    yield database
+    database.close_db()
+
+@pytest.mark.parametrize("location", ["Координаты: nan, 1", "Координаты: 1e308, 1e308"])
+def test_add_report_with_invalid_coordinates(json_store, location):
+    report_id = json_store.add_report(1, "user", "Незаконная свалка", "описание", location)
+    report = json_store.get_report_by_id(report_id)
+    assert report["location"] == location
+    assert report["lat"] is None
@@ -0,0 +1,39 @@
+"""Тесты журнала JSON-базы (journal.py, database.py)."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import database
+import journal
+
+@pytest.fixture
+def json_store(tmp_path, monkeypatch):
+    database.close_db()
+    monkeypatch.setattr(database, "DATA_FILE", str(tmp_path / "reports.json"))
+    monkeypatch.setattr(database, "LOG_FILE", str(tmp_path / "reports.log"))
+    yield database
+    database.close_db()
+
+def test_failed_journal_write_leaves_memory_unchanged(json_store, monkeypatch):
+    first = json_store.add_report(1, "user", "Незаконная свалка", "Мусор", "Алматы")
+
+    def fail(fd):
+        raise OSError(28, "No space left on device")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(journal.os, "fsync", fail)
+        with pytest.raises(OSError):
+            json_store.add_report(2, "user", "Загрязнение воды", "Пятно", "Алматы")
+
+    assert json_store.get_user_reports(2) == []
+    second = json_store.add_report(3, "user", "Загрязнение воды", "Пятно", "Алматы")
+    assert second == first + 1
+
+    # После перезапуска состояние совпадает с тем, что было в памяти
+    json_store.close_db()
+    assert json_store.get_user_reports(2) == []
+    assert [report["id"] for report in json_store.get_all_reports()] == [first, second]
@@ -0,0 +1,35 @@
+"""Тесты бэкенда MongoDB (database_mongo.py) на mongomock."""
+
+import os
+import sys
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import database_mongo
+
+@pytest.fixture
+def mongo(monkeypatch):
+    monkeypatch.setattr(database_mongo, "_db", mongomock.MongoClient().ecomap_kz)
+    for name in dir(database_mongo):
+        collection = getattr(database_mongo, name)
+        if isinstance(collection, database_mongo.LazyCollection):
+            monkeypatch.setattr(collection, "_collection", None)
+    monkeypatch.setattr(database_mongo, "_id_block", {"next": 0, "end": 0})
+    yield database_mongo
+
+def test_report_ids_continue_after_existing_reports_without_migrate(mongo):
+    mongo.reports_collection.insert_many([{"id": report_id} for report_id in (1, 2, 57)])
+    assert mongo.next_report_id() == 58
+    assert mongo.next_report_id() == 59
+
+def test_unchanged_status_is_not_an_error(mongo):
+    report_id = mongo.add_report(1, "user", "Незаконная свалка", "Мусор", "Алматы")
+    assert mongo.update_report_status(report_id, "new") is True
+    assert mongo.notifications_collection.count_documents({}) == 0
+    assert mongo.update_report_status(report_id, "resolved") is True
+    assert mongo.notifications_collection.count_documents({}) == 1
+    assert mongo.update_report_status(report_id + 100, "resolved") is False
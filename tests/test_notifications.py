@@ -0,0 +1,62 @@
+"""Тесты рассылки уведомлений (notifications.py) с бэкендом JSON."""
+
+import asyncio
+import os
+import sys
+
+import pytest
+from telegram.error import ChatMigrated, InvalidToken, TimedOut
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import database
+import notifications
+
+class FakeBot:
+    """Бот, для некоторых адресатов вызывающий ошибку"""
+
+    rate_limiter = None
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **options):
+        error = self.errors.get(chat_id)
+        if error is not None:
+            raise error
+        self.sent.append(chat_id)
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    database.close_db()
+    monkeypatch.setattr(database, "DATA_FILE", str(tmp_path / "reports.json"))
+    monkeypatch.setattr(database, "LOG_FILE", str(tmp_path / "reports.log"))
+    monkeypatch.setattr(notifications, "SEND_RETRY_DELAY", 0)
+    for user_id in range(1, 6):
+        database.subscribe_events(user_id, "Алматы")
+    database.add_event("Субботник", "1 мая", "Парк", "Уборка", "Алматы")
+    database.add_event("Посадка деревьев", "2 мая", "Парк", "Посадка", "Алматы")
+    yield database
+    database.close_db()
+
+def test_recipient_errors_do_not_block_queue(store):
+    bot = FakeBot({2: TimedOut(), 4: ChatMigrated(-100)})
+    engine = notifications.NotificationEngine(bot, backend=store)
+    assert asyncio.run(engine.run_pending()) == 2
+    assert bot.sent == [1, 3, 5, 1, 3, 5]
+    assert engine.stats["failed"] == 4
+    assert store.get_pending_notifications() == []
+
+def test_bot_wide_errors_abort_job(store, monkeypatch):
+    monkeypatch.setattr(notifications, "MAX_NETWORK_FAILURES", 3)
+    bot = FakeBot({user_id: TimedOut() for user_id in range(1, 6)})
+    engine = notifications.NotificationEngine(bot, backend=store, window=1)
+    with pytest.raises(TimedOut):
+        asyncio.run(engine.run_pending())
+    assert len(store.get_pending_notifications()) == 2
+
+    bot = FakeBot({1: InvalidToken()})
+    engine = notifications.NotificationEngine(bot, backend=store)
+    with pytest.raises(InvalidToken):
+        asyncio.run(engine.run_pending())
@@ -0,0 +1,81 @@
+"""Тесты хранения состояния бота (persistence.py) с бэкендом JSON."""
+
+import asyncio
+import os
+import sys
+
+import pytest
+from telegram import Update
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import bot
+import database
+import db_async
+import persistence
+from api.index import _process_update
+from stub_bot_api import StubRequest, message_update
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    database.close_db()
+    monkeypatch.setattr(database, "DATA_FILE", str(tmp_path / "reports.json"))
+    monkeypatch.setattr(database, "LOG_FILE", str(tmp_path / "reports.log"))
+    monkeypatch.setattr(db_async, "_backend", database)
+    yield database
+    database.close_db()
+
+async def instances(count):
+    """Экземпляры бота в режиме вебхука с общей базой"""
+    applications = []
+    for _ in range(count):
+        application = bot.build_application(
+            "123456:TEST", updater=None, job_queue=None, request=StubRequest(0), rate_limiter=None,
+            persistence=persistence.DatabasePersistence(backend=database, shared=True)
+        )
+        await application.initialize()
+        applications.append(application)
+    return applications
+
+async def send(application, data):
+    await _process_update(application, Update.de_json(data, application.bot))
+
+def test_report_continues_on_another_instance(store):
+    async def scenario():
+        first, second = await instances(2)
+        user_id = 42
+        await send(first, message_update(user_id, "/report"))
+        await send(second, message_update(user_id, "🗑️ Незаконная свалка"))
+        await send(first, message_update(user_id, "/skip"))
+        await send(second, message_update(user_id, "Мусор на берегу реки"))
+        await send(first, message_update(user_id, location=(43.25, 76.92)))
+        for application in (first, second):
+            await application.shutdown()
+
+    asyncio.run(scenario())
+    reports = database.get_user_reports(42)
+    assert len(reports) == 1
+    assert reports[0]["problem_type"] == "Незаконная свалка"
+    assert reports[0]["description"] == "Мусор на берегу реки"
+    assert database.load_bot_state(persistence.USER_DATA) == {}
+
+def test_polling_mode_does_not_read_database(store):
+    async def scenario():
+        application = bot.build_application(
+            "123456:TEST", updater=None, job_queue=None, request=StubRequest(0), rate_limiter=None,
+            persistence=persistence.DatabasePersistence(backend=database)
+        )
+        await application.initialize()
+        for text in ("/report", "🗑️ Незаконная свалка", "/skip"):
+            update = Update.de_json(message_update(7, text), application.bot)
+            await application.persistence.refresh(application, update)
+            await application.process_update(update)
+        await application.update_persistence()
+        await application.shutdown()
+        return application
+
+    application = asyncio.run(scenario())
+    assert application.persistence.stats["refreshes"] == 0
+    assert database.load_bot_state(persistence.USER_DATA)["7"][bot.REPORT_STATE] == bot.LOCATION
@@ -0,0 +1,42 @@
+"""Тесты объединения сообщений в очереди отправки (send_queue.py)."""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import send_queue
+
+def test_merge_keeps_caller_data_and_priority():
+    sent = []
+
+    async def do_post(endpoint, data):
+        sent.append(dict(data))
+        return {"message_id": len(sent)}
+
+    async def scenario():
+        scheduler = send_queue.SendScheduler(chat_rate=1000)
+        requests = [
+            ({"chat_id": 5, "text": "первое"}, None),
+            ({"chat_id": 5, "text": "второе"}, None),
+            ({"chat_id": 5, "text": "третье", "reply_markup": "{}"}, None),
+            ({"chat_id": 5, "text": "рассылка"}, {"priority": send_queue.BROADCAST}),
+            ({"chat_id": 5, "text": "отдельно"}, {"merge": False}),
+        ]
+        tasks = [asyncio.ensure_future(scheduler.process_request(
+            do_post, ("sendMessage", data), {}, "sendMessage", data, rate_limit_args))
+            for data, rate_limit_args in requests]
+        results = await asyncio.gather(*tasks)
+        await scheduler.shutdown()
+        return requests, results
+
+    requests, results = asyncio.run(scenario())
+    # Рассылка и сообщение без объединения отправляются отдельно
+    assert [message["text"] for message in sent] == [
+        "первое\n\nвторое\n\nтретье", "рассылка", "отдельно"]
+    assert sent[0]["reply_markup"] == "{}"
+    assert results[0] is results[1] is results[2]
+    # Данные вызывающих не изменяются
+    assert [data["text"] for data, _ in requests] == ["первое", "второе", "третье", "рассылка", "отдельно"]
+    assert "reply_markup" not in requests[0][0]
@@ -0,0 +1,349 @@
+"""
+История PM2.5 по городам с агрегатами за минуту, час и день.
+
+Значения хранятся не в списках объектов, а в массивах array
+(2–8 байт на значение). Каждый уровень агрегации (Tier) — набор столбцов,
+в котором слот i соответствует интервалу [first + i, first + i + 1) в
+единицах шага уровня, поэтому время слота не хранится. Новое значение
+за O(1) обновляет текущий слот каждого уровня (количество, сумма, минимум,
+максимум), а запрос читает только нужный уровень: «последние 7 дней по
+часам» — это 168 слотов часового уровня без чтения минутных данных.
+
+Минутный уровень хранит только количество и сумму (среднее за минуту)
+и ограничен MINUTE_RETENTION днями, часовой — HOUR_RETENTION днями,
+дневной хранится без ограничения. Границы часов и дней считаются по
+времени UTC_OFFSET (по умолчанию UTC+5, Казахстан).
+
+Значения поступают из AirQualityProvider при каждом обновлении данных
+(см. attach), а история сохраняется в файл HISTORY_FILE и загружается из
+него при запуске.
+"""
+
+import atexit
+import logging
+import os
+import pickle
+import threading
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# Файл, в котором сохраняется история, и как часто его перезаписывать (с)
+HISTORY_FILE = os.getenv("PM25_HISTORY_FILE", "pm25_history.bin")
+SAVE_INTERVAL = int(os.getenv("PM25_HISTORY_SAVE_INTERVAL", "300"))
+
+# Сколько дней хранить минутные и часовые агрегаты (дневные хранятся всегда)
+MINUTE_RETENTION = int(os.getenv("PM25_MINUTE_RETENTION", "7"))
+HOUR_RETENTION = int(os.getenv("PM25_HOUR_RETENTION", "366"))
+
+# Смещение местного времени от UTC для границ часов и дней, с
+UTC_OFFSET = int(os.getenv("PM25_HISTORY_UTC_OFFSET", str(5 * 3600)))
+
+# Уровни агрегации: название -> длительность слота, с
+RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+
+# Символы мини-графика (sparkline) от минимума к максимуму
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+class Tier:
+    """
+    Агрегаты одного уровня в массивах (по слоту на шаг).
+
+    Args:
+        step (int): Длительность слота, с
+        retention (int): Сколько слотов хранить (None — без ограничения)
+        extremes (bool): Хранить ли минимум и максимум слота
+        count_type (str): Тип массива количества значений (код array)
+        sum_type (str): Тип массива суммы значений (код array)
+    """
+
+    __slots__ = ("step", "retention", "first", "count", "sum", "min", "max", "_count_max")
+
+    def __init__(self, step, retention=None, extremes=True, count_type="H", sum_type="d"):
+        self.step = step
+        self.retention = retention
+        # Номер первого хранимого слота: (время + UTC_OFFSET) // step
+        self.first = None
+        self.count = array(count_type)
+        self.sum = array(sum_type)
+        self.min = array("f") if extremes else None
+        self.max = array("f") if extremes else None
+        self._count_max = 2 ** (8 * self.count.itemsize) - 1
+
+    def _columns(self):
+        return [column for column in (self.count, self.sum, self.min, self.max) if column is not None]
+
+    def __len__(self):
+        return len(self.count)
+
+    def _grow(self, size):
+        """Добавление пустых слотов до размера size (и удаление слотов старше retention)"""
+        missing = size - len(self.count)
+        for column in self._columns():
+            if missing == 1:
+                column.append(0)
+            else:
+                column.frombytes(bytes(missing * column.itemsize))
+        if self.retention:
+            # Порциями, чтобы не сдвигать массивы при каждом новом слоте
+            extra = size - self.retention
+            if extra > max(1, self.retention // 8):
+                for column in self._columns():
+                    del column[:extra]
+                self.first += extra
+
+    def add(self, slot, value):
+        """
+        Учет значения в слоте.
+
+        Returns:
+            bool: False, если слот старше хранимых
+        """
+        first = self.first
+        if first is None or (self.retention and slot - first >= len(self.count) + self.retention):
+            # Первое значение или перерыв дольше retention: прежние слоты уже не нужны
+            for column in self._columns():
+                del column[:]
+            first = self.first = slot
+        index = slot - first
+        if index < 0:
+            return False
+        if index >= len(self.count):
+            self._grow(index + 1)
+            index = slot - self.first
+        count = self.count[index]
+        if count == self._count_max:
+            return False
+        self.count[index] = count + 1
+        self.sum[index] += value
+        if self.min is not None:
+            if count == 0:
+                self.min[index] = self.max[index] = value
+            elif value < self.min[index]:
+                self.min[index] = value
+            elif value > self.max[index]:
+                self.max[index] = value
+        return True
+
+    def read(self, start, end):
+        """
+        Непустые слоты в интервале номеров [start, end).
+
+        Returns:
+            list: (номер слота, среднее, минимум, максимум)
+        """
+        if self.first is None:
+            return []
+        lo = max(start - self.first, 0)
+        hi = min(end - self.first, len(self.count))
+        if lo >= hi:
+            return []
+        counts = self.count[lo:hi]
+        sums = self.sum[lo:hi]
+        mins = self.min[lo:hi] if self.min is not None else None
+        maxs = self.max[lo:hi] if self.max is not None else None
+        points = []
+        for i, count in enumerate(counts):
+            if count:
+                mean = sums[i] / count
+                points.append((self.first + lo + i, mean,
+                               mins[i] if mins is not None else mean, maxs[i] if maxs is not None else mean))
+        return points
+
+    def nbytes(self):
+        """Объем данных массивов в байтах"""
+        return sum(column.buffer_info()[1] * column.itemsize for column in self._columns())
+
+class TimeSeriesStore:
+    """
+    История значений по городам.
+
+    Args:
+        minute_retention (float): Сколько дней хранить минутные агрегаты
+        hour_retention (float): Сколько дней хранить часовые агрегаты
+        utc_offset (int): Смещение местного времени от UTC для границ слотов, с
+    """
+
+    def __init__(self, minute_retention=MINUTE_RETENTION, hour_retention=HOUR_RETENTION, utc_offset=UTC_OFFSET):
+        self.minute_retention = minute_retention
+        self.hour_retention = hour_retention
+        self.utc_offset = utc_offset
+        self._cities = {}  # город -> {уровень: Tier}
+        self._lock = threading.Lock()
+
+    def _new_tiers(self):
+        return {
+            # Минутный уровень: только среднее (без минимума и максимума), сумма в float32
+            "minute": Tier(60, int(self.minute_retention * 1440) or None, extremes=False, sum_type="f"),
+            "hour": Tier(3600, int(self.hour_retention * 24) or None),
+            "day": Tier(86400, None, count_type="I"),
+        }
+
+    def add(self, city, timestamp, value):
+        """
+        Добавление значения.
+
+        Args:
+            city (str): Город
+            timestamp (float): Время измерения (Unix)
+            value (float): Значение PM2.5
+        """
+        local = timestamp + self.utc_offset
+        with self._lock:
+            tiers = self._cities.get(city)
+            if tiers is None:
+                tiers = self._cities[city] = self._new_tiers()
+            for tier in tiers.values():
+                tier.add(int(local // tier.step), value)
+
+    def series(self, city, start, end, resolution="hour"):
+        """
+        Агрегаты за период с заданным шагом.
+
+        Args:
+            city (str): Город
+            start (float): Начало периода (Unix)
+            end (float): Конец периода (Unix, не включается)
+            resolution (str): "minute", "hour" или "day"
+
+        Returns:
+            list: (начало слота (Unix), среднее, минимум, максимум) для слотов со значениями
+        """
+        step = RESOLUTIONS[resolution]
+        with self._lock:
+            tiers = self._cities.get(city)
+            if tiers is None:
+                return []
+            points = tiers[resolution].read(int((start + self.utc_offset) // step),
+                                            -int(-(end + self.utc_offset) // step))
+        return [(slot * step - self.utc_offset, mean, low, high) for slot, mean, low, high in points]
+
+    def last(self, city, duration, resolution="hour", now=None):
+        """Агрегаты за последние duration секунд (см. series)"""
+        now = time.time() if now is None else now
+        return self.series(city, now - duration, now + 1, resolution)
+
+    def cities(self):
+        """Города, для которых есть история"""
+        with self._lock:
+            return list(self._cities)
+
+    def memory_usage(self):
+        """
+        Объем данных массивов по уровням.
+
+        Returns:
+            dict: {уровень: байт}
+        """
+        usage = dict.fromkeys(RESOLUTIONS, 0)
+        with self._lock:
+            for tiers in self._cities.values():
+                for name, tier in tiers.items():
+                    usage[name] += tier.nbytes()
+        return usage
+
+    def save(self, path):
+        """Сохранение истории в файл (атомарно, через временный файл)"""
+        with self._lock:
+            data = pickle.dumps(self._cities, protocol=pickle.HIGHEST_PROTOCOL)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def load(self, path):
+        """Загрузка истории из файла, сохраненного save (если он есть)"""
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            cities = pickle.load(f)
+        with self._lock:
+            self._cities = cities
+
+def sparkline(values):
+    """Мини-график из символов ▁..█ для ряда значений"""
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    scale = (len(SPARK_CHARS) - 1) / (high - low) if high > low else 0
+    return "".join(SPARK_CHARS[round((value - low) * scale)] for value in values)
+
+def trend(city, hours=24, store=None, now=None):
+    """
+    Тренд PM2.5 за последние часы по часовым агрегатам.
+
+    Returns:
+        dict: sparkline, change (изменение от первого часа к последнему),
+            min, max, mean; None, если истории меньше двух часов
+    """
+    store = store or get_store()
+    points = store.last(city, hours * 3600, "hour", now)
+    if len(points) < 2:
+        return None
+    means = [mean for _, mean, _, _ in points]
+    return {
+        "sparkline": sparkline(means),
+        "change": means[-1] - means[0],
+        "min": min(low for _, _, low, _ in points),
+        "max": max(high for _, _, _, high in points),
+        "mean": sum(means) / len(means),
+    }
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Общая история PM2.5 (загружается из HISTORY_FILE при первом обращении)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = TimeSeriesStore()
+                try:
+                    store.load(HISTORY_FILE)
+                except Exception as e:
+                    logger.warning("Не удалось загрузить историю PM2.5 из %s: %s", HISTORY_FILE, e)
+                _store = store
+    return _store
+
+def attach(provider, store=None, path=HISTORY_FILE, save_interval=SAVE_INTERVAL):
+    """
+    Запись значений PM2.5 при каждом обновлении данных провайдера.
+
+    История сохраняется в файл не чаще раза в save_interval секунд
+    и при завершении процесса.
+
+    Args:
+        provider (air_quality.AirQualityProvider): Провайдер данных OpenWeather
+        store (TimeSeriesStore): История (по умолчанию общая)
+        path (str): Файл истории
+        save_interval (float): Минимальный интервал между сохранениями, с
+
+    Returns:
+        TimeSeriesStore: История
+    """
+    store = store or get_store()
+    saved_at = [time.monotonic()]
+    save_lock = threading.Lock()
+
+    def save():
+        try:
+            store.save(path)
+        except OSError as e:
+            logger.warning("Не удалось сохранить историю PM2.5 в %s: %s", path, e)
+
+    def record(city, values, previous):
+        if values.get("pm25") is None:
+            return
+        store.add(city, values.get("updated_at", time.time()), values["pm25"])
+        if time.monotonic() - saved_at[0] >= save_interval and save_lock.acquire(blocking=False):
+            try:
+                saved_at[0] = time.monotonic()
+                save()
+            finally:
+                save_lock.release()
+
+    provider.add_listener(record)
+    atexit.register(save)
+    return store